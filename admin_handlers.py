@@ -2,14 +2,11 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 from config import ADMIN_IDS, AGUARDANDO_BROADCAST, AGUARDANDO_CONFIRMACAO_BROADCAST, AGUARDANDO_BUSCA_USER, AGUARDANDO_ENQUETE, AGUARDANDO_CONFIRMACAO_ENQUETE, AGUARDANDO_ID_TECNICO_AJUSTE, AGUARDANDO_DATA_AJUSTE, TZ
 from database import db
-from utils import parse_data, format_data
+from utils import format_data
 from datetime import datetime
 import io
 import csv
-import asyncio
-from asyncio import Semaphore
-import time
-from telegram.error import RetryAfter
+from limitador_envios import PRIORIDADE_LOTE
 from collections import defaultdict
 import logging
 
@@ -271,14 +268,13 @@ async def admin_callback_handler(update: Update, context: ContextTypes.DEFAULT_T
         por_regiao = defaultdict(int)
         
         for inst in insts:
-            data_inst = parse_data(inst.get('data', ''))
-            if data_inst is None:
+            if inst.dia is None:
                 continue
-            if data_inst.month == mes_atual and data_inst.year == ano_atual:
+            if inst.dia.month == mes_atual and inst.dia.year == ano_atual:
                 inst_mes_atual += 1
-            elif data_inst.month == mes_anterior and data_inst.year == ano_anterior:
+            elif inst.dia.month == mes_anterior and inst.dia.year == ano_anterior:
                 inst_mes_anterior += 1
-            regiao = inst.get('tecnico_regiao') or 'Não informada'
+            regiao = inst.tecnico_regiao or 'Não informada'
             por_regiao[regiao] += 1
         
         crescimento = 0
@@ -314,7 +310,7 @@ async def admin_callback_handler(update: Update, context: ContextTypes.DEFAULT_T
         
         instalacoes_por_tecnico = defaultdict(int)
         for inst in insts:
-            tid = str(inst.get('tecnico_id', ''))
+            tid = str(inst.tecnico_id) if inst.tecnico_id is not None else ''
             if tid:
                 instalacoes_por_tecnico[tid] += 1
                 
@@ -352,10 +348,10 @@ async def admin_callback_handler(update: Update, context: ContextTypes.DEFAULT_T
         
         msg = f'📋 *Últimas Instalações ({len(insts)})*\n\n'
         for inst in insts:
-            msg += f'📅 {inst.get("data")}\n'
-            msg += f'SA: `{inst.get("sa")}` | GPON: `{inst.get("gpon")}`\n'
-            msg += f'👤 {inst.get("tecnico_nome")}\n'
-            msg += f'🧩 {inst.get("tipo", "instalacao")}\n\n'
+            msg += f'📅 {inst.data}\n'
+            msg += f'SA: `{inst.sa}` | GPON: `{inst.gpon}`\n'
+            msg += f'👤 {inst.tecnico_nome}\n'
+            msg += f'🧩 {inst.tipo}\n\n'
         
         await query.edit_message_text(msg, parse_mode='Markdown')
         
@@ -369,8 +365,8 @@ async def admin_callback_handler(update: Update, context: ContextTypes.DEFAULT_T
         
         for i in insts:
             writer.writerow([
-                i.get('data'), i.get('sa'), i.get('gpon'), 
-                i.get('tipo'), i.get('tecnico_nome'), i.get('tecnico_regiao')
+                i.data, i.sa, i.gpon, 
+                i.tipo, i.tecnico_nome, i.tecnico_regiao
             ])
             
         output.seek(0)
@@ -863,119 +859,90 @@ async def confirmar_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE
     sucessos_detalhados = []
     nunca_iniciaram = 0
     
-    # Rate Limiter: máximo 30 mensagens por segundo
-    semaphore = Semaphore(30)
-    last_send_time = time.time()
+    # O ritmo (e os RetryAfter) fica a cargo do limitador de envios do Application;
+    # PRIORIDADE_LOTE deixa as respostas interativas passarem na frente do broadcast
     
     for idx, uid in enumerate(target_users, 1):
         try:
-            # Controle de taxa com semaphore
-            async with semaphore:
-                current_time = time.time()
-                elapsed = current_time - last_send_time
-                
-                # Garantir mínimo de 0.05s entre mensagens (20/segundo)
-                if elapsed < 0.05:
-                    await asyncio.sleep(0.05 - elapsed)
-                
-                message_sent = None
-                user_data = users.get(uid, {})
-                user_name = f"{user_data.get('nome', '')} {user_data.get('sobrenome', '')}".strip() or f"ID {uid}"
-                
-                if broadcast_data['type'] == 'text':
-                    msg = header + broadcast_data['text'] + footer
-                    message_sent = await context.bot.send_message(
-                        chat_id=int(uid),
-                        text=msg,
-                        parse_mode='Markdown',
-                        disable_notification=silent_notification
-                    )
-                elif broadcast_data['type'] == 'photo':
-                    caption = header + broadcast_data['caption'] + footer if broadcast_data['caption'] else header.strip()
-                    message_sent = await context.bot.send_photo(
-                        chat_id=int(uid),
-                        photo=broadcast_data['file_id'],
-                        caption=caption,
-                        parse_mode='Markdown',
-                        disable_notification=silent_notification
-                    )
-                elif broadcast_data['type'] == 'video':
-                    caption = header + broadcast_data['caption'] + footer if broadcast_data['caption'] else header.strip()
-                    message_sent = await context.bot.send_video(
-                        chat_id=int(uid),
-                        video=broadcast_data['file_id'],
-                        caption=caption,
-                        parse_mode='Markdown',
-                        disable_notification=silent_notification
-                    )
-                elif broadcast_data['type'] == 'document':
-                    caption = header + broadcast_data['caption'] + footer if broadcast_data['caption'] else header.strip()
-                    message_sent = await context.bot.send_document(
-                        chat_id=int(uid),
-                        document=broadcast_data['file_id'],
-                        caption=caption,
-                        parse_mode='Markdown',
-                        disable_notification=silent_notification
-                    )
-                elif broadcast_data['type'] == 'audio':
-                    caption = header + broadcast_data['caption'] + footer if broadcast_data['caption'] else header.strip()
-                    message_sent = await context.bot.send_audio(
-                        chat_id=int(uid),
-                        audio=broadcast_data['file_id'],
-                        caption=caption,
-                        parse_mode='Markdown',
-                        disable_notification=silent_notification
-                    )
-                elif broadcast_data['type'] == 'voice':
-                    message_sent = await context.bot.send_voice(
+            message_sent = None
+            user_data = users.get(uid, {})
+            user_name = f"{user_data.get('nome', '')} {user_data.get('sobrenome', '')}".strip() or f"ID {uid}"
+            
+            if broadcast_data['type'] == 'text':
+                msg = header + broadcast_data['text'] + footer
+                message_sent = await context.bot.send_message(
+                    chat_id=int(uid),
+                    text=msg,
+                    parse_mode='Markdown',
+                    disable_notification=silent_notification,
+                    rate_limit_args=PRIORIDADE_LOTE
+                )
+            elif broadcast_data['type'] == 'photo':
+                caption = header + broadcast_data['caption'] + footer if broadcast_data['caption'] else header.strip()
+                message_sent = await context.bot.send_photo(
+                    chat_id=int(uid),
+                    photo=broadcast_data['file_id'],
+                    caption=caption,
+                    parse_mode='Markdown',
+                    disable_notification=silent_notification,
+                    rate_limit_args=PRIORIDADE_LOTE
+                )
+            elif broadcast_data['type'] == 'video':
+                caption = header + broadcast_data['caption'] + footer if broadcast_data['caption'] else header.strip()
+                message_sent = await context.bot.send_video(
+                    chat_id=int(uid),
+                    video=broadcast_data['file_id'],
+                    caption=caption,
+                    parse_mode='Markdown',
+                    disable_notification=silent_notification,
+                    rate_limit_args=PRIORIDADE_LOTE
+                )
+            elif broadcast_data['type'] == 'document':
+                caption = header + broadcast_data['caption'] + footer if broadcast_data['caption'] else header.strip()
+                message_sent = await context.bot.send_document(
+                    chat_id=int(uid),
+                    document=broadcast_data['file_id'],
+                    caption=caption,
+                    parse_mode='Markdown',
+                    disable_notification=silent_notification,
+                    rate_limit_args=PRIORIDADE_LOTE
+                )
+            elif broadcast_data['type'] == 'audio':
+                caption = header + broadcast_data['caption'] + footer if broadcast_data['caption'] else header.strip()
+                message_sent = await context.bot.send_audio(
+                    chat_id=int(uid),
+                    audio=broadcast_data['file_id'],
+                    caption=caption,
+                    parse_mode='Markdown',
+                    disable_notification=silent_notification,
+                    rate_limit_args=PRIORIDADE_LOTE
+                )
+            elif broadcast_data['type'] == 'voice':
+                message_sent = await context.bot.send_voice(
+                    chat_id=int(uid),
+                    voice=broadcast_data['file_id'],
+                    caption=broadcast_data.get('caption', ''),
+                    parse_mode='Markdown',
+                    disable_notification=silent_notification,
+                    rate_limit_args=PRIORIDADE_LOTE
+                )
+            
+            enviados += 1
+            sucessos_detalhados.append(user_name)
+            
+            if pin_message and message_sent:
+                try:
+                    await context.bot.pin_chat_message(
                         chat_id=int(uid),
-                        voice=broadcast_data['file_id'],
-                        caption=broadcast_data.get('caption', ''),
-                        parse_mode='Markdown',
-                        disable_notification=silent_notification
+                        message_id=message_sent.message_id,
+                        disable_notification=True,
+                        rate_limit_args=PRIORIDADE_LOTE
                     )
+                    fixados += 1
+                except Exception as pin_error:
+                    logger.warning(f"Não foi possível fixar mensagem para {uid}: {pin_error}")
+
                 
-                enviados += 1
-                sucessos_detalhados.append(user_name)
-                
-                if pin_message and message_sent:
-                    try:
-                        await context.bot.pin_chat_message(
-                            chat_id=int(uid),
-                            message_id=message_sent.message_id,
-                            disable_notification=True
-                        )
-                        fixados += 1
-                    except Exception as pin_error:
-                        logger.warning(f"Não foi possível fixar mensagem para {uid}: {pin_error}")
-                
-                last_send_time = time.time()
-                    
-        except RetryAfter as e:
-            # Telegram pediu para esperar
-            logger.warning(f"Rate limit atingido! Aguardando {e.retry_after}s")
-            await asyncio.sleep(e.retry_after)
-            # Tentar reenviar
-            try:
-                async with semaphore:
-                    if broadcast_data['type'] == 'text':
-                        msg = header + broadcast_data['text'] + footer
-                        await context.bot.send_message(
-                            chat_id=int(uid), 
-                            text=msg, 
-                            parse_mode='Markdown',
-                            disable_notification=silent_notification
-                        )
-                    enviados += 1
-                    sucessos_detalhados.append(user_name)
-            except Exception as retry_error:
-                falhas += 1
-                error_msg = str(retry_error).lower()
-                if "chat not found" in error_msg:
-                    nunca_iniciaram += 1
-                    falhas_detalhadas.append(f"{user_name}: Nunca iniciou o bot")
-                else:
-                    falhas_detalhadas.append(f"{user_name}: {str(retry_error)[:50]}")
         except Exception as e:
             falhas += 1
             error_msg = str(e).lower()
@@ -1122,24 +1089,10 @@ async def confirmar_enquete(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 options=poll_data['options'],
                 is_anonymous=poll_data['is_anonymous'],
                 allows_multiple_answers=poll_data['allows_multiple_answers'],
-                type=poll_data['type']
+                type=poll_data['type'],
+                rate_limit_args=PRIORIDADE_LOTE
             )
             enviados += 1
-            await asyncio.sleep(0.05) # Evitar flood
-        except RetryAfter as e:
-            await asyncio.sleep(e.retry_after)
-            try:
-                await context.bot.send_poll(
-                    chat_id=int(uid),
-                    question=poll_data['question'],
-                    options=poll_data['options'],
-                    is_anonymous=poll_data['is_anonymous'],
-                    allows_multiple_answers=poll_data['allows_multiple_answers'],
-                    type=poll_data['type']
-                )
-                enviados += 1
-            except:
-                falhas += 1
         except:
             falhas += 1
             
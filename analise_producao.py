@@ -0,0 +1,125 @@
+"""
+Agregações de produção por técnico em colunas (NumPy).
+
+O período é carregado uma vez em arrays (código do técnico, dia ordinal, pontos) e
+pontos, dias distintos, turbo e faixa da TABELA_FAIXAS saem de group-bys vetorizados
+(bincount/unique/searchsorted) em vez de laços por linha. Sem NumPy instalado, o
+mesmo resultado é calculado em Python puro.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+from config import CICLO_DIAS_TURBO, TABELA_FAIXAS
+from utils import obter_faixa_valor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Faixas em ordem crescente de mínimo, para o searchsorted
+_FAIXAS_CRESCENTES = sorted(TABELA_FAIXAS, key=lambda t: t['min'])
+# Separa técnico e dia numa chave só (ordinal de datetime.date < 1_000_000)
+_BASE_DIA = 1_000_000
+
+
+@dataclass(slots=True)
+class ResumoTecnico:
+    nome: str
+    quantidade: int
+    pontos: float
+    dias: int
+    turbo: bool
+    faixa: Dict[str, Any]
+    valor_unit: float
+    valor: float
+
+
+def _resumo_numpy(instalacoes: list) -> List[ResumoTecnico]:
+    codigos: Dict[str, int] = {}
+    n = len(instalacoes)
+    tecnico = np.fromiter((codigos.setdefault(inst.tecnico_nome, len(codigos)) for inst in instalacoes), dtype=np.int64, count=n)
+    dia = np.fromiter((inst.dia.toordinal() if inst.dia else -1 for inst in instalacoes), dtype=np.int64, count=n)
+    pontos = np.fromiter((inst.pontos for inst in instalacoes), dtype=np.float64, count=n)
+
+    k = len(codigos)
+    quantidade = np.bincount(tecnico, minlength=k)
+    pontos_tec = np.bincount(tecnico, weights=pontos, minlength=k)
+    com_dia = dia >= 0
+    pares = np.unique(tecnico[com_dia] * _BASE_DIA + dia[com_dia])
+    dias = np.bincount(pares // _BASE_DIA, minlength=k)
+
+    mins = np.array([t['min'] for t in _FAIXAS_CRESCENTES])
+    idx_faixa = np.clip(np.searchsorted(mins, pontos_tec, side='right') - 1, 0, None)
+    turbo = dias >= CICLO_DIAS_TURBO
+    valor_unit = np.where(
+        turbo,
+        np.array([t['valor_turbo'] for t in _FAIXAS_CRESCENTES])[idx_faixa],
+        np.array([t['valor'] for t in _FAIXAS_CRESCENTES])[idx_faixa],
+    )
+    valor = pontos_tec * valor_unit
+
+    # Estável: empate em pontos mantém a ordem de aparição (igual ao sorted do Python)
+    ordem = np.argsort(-pontos_tec, kind='stable')
+    nomes = list(codigos)
+    return [
+        ResumoTecnico(
+            nome=nomes[j],
+            quantidade=int(quantidade[j]),
+            pontos=float(pontos_tec[j]),
+            dias=int(dias[j]),
+            turbo=bool(turbo[j]),
+            faixa=_FAIXAS_CRESCENTES[idx_faixa[j]],
+            valor_unit=float(valor_unit[j]),
+            valor=float(valor[j]),
+        )
+        for j in ordem
+    ]
+
+
+def _resumo_python(instalacoes: list) -> List[ResumoTecnico]:
+    grupos: Dict[str, list] = {}
+    for inst in instalacoes:
+        grupo = grupos.setdefault(inst.tecnico_nome, [0, 0.0, set()])
+        grupo[0] += 1
+        grupo[1] += inst.pontos
+        if inst.dia:
+            grupo[2].add(inst.dia)
+
+    resumos = []
+    for nome, (quantidade, pontos, dias) in grupos.items():
+        turbo = len(dias) >= CICLO_DIAS_TURBO
+        faixa = obter_faixa_valor(pontos)
+        valor_unit = faixa['valor_turbo'] if turbo else faixa['valor']
+        resumos.append(ResumoTecnico(nome, quantidade, pontos, len(dias), turbo, faixa, valor_unit, pontos * valor_unit))
+    return sorted(resumos, key=lambda r: r.pontos, reverse=True)
+
+
+def resumo_por_tecnico(instalacoes: list) -> List[ResumoTecnico]:
+    """Pontos, dias produtivos, turbo e faixa por técnico (lista de Instalacao), do maior para o menor."""
+    if not instalacoes:
+        return []
+    if np is None:
+        return _resumo_python(instalacoes)
+    return _resumo_numpy(instalacoes)
+
+
+def contagem_por_tecnico(instalacoes: list) -> List[Tuple[str, int]]:
+    """(técnico, quantidade) do maior para o menor."""
+    if not instalacoes:
+        return []
+    if np is None:
+        contagem: Dict[str, int] = {}
+        for inst in instalacoes:
+            contagem[inst.tecnico_nome] = contagem.get(inst.tecnico_nome, 0) + 1
+        return sorted(contagem.items(), key=lambda x: x[1], reverse=True)
+
+    codigos: Dict[str, int] = {}
+    tecnico = np.fromiter(
+        (codigos.setdefault(inst.tecnico_nome, len(codigos)) for inst in instalacoes),
+        dtype=np.int64, count=len(instalacoes)
+    )
+    quantidade = np.bincount(tecnico, minlength=len(codigos))
+    ordem = np.argsort(-quantidade, kind='stable')
+    nomes = list(codigos)
+    return [(nomes[j], int(quantidade[j])) for j in ordem]
@@ -0,0 +1,163 @@
+"""
+Armazém das imagens das sessões em andamento (prints do autofill, fotos das máscaras).
+
+Os handlers guardam aqui os bytes baixados e mantêm no user_data só a referência
+(string), então a memória do processo não cresce com o número de técnicos no meio
+de um fluxo. As imagens ficam em arquivos no tmp do sistema (em disco: o /dev/shm de
+container costuma ter 64 MB e conta no limite de memória) com orçamento de bytes em
+LRU e expiração por inatividade; sessões abandonadas somem sozinhas. Como a
+referência é uma string, ela sobrevive à persistência do user_data e, com o
+diretório em disco, as imagens sobrevivem a um reinício.
+"""
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from config import IMAGENS_DIR, IMAGENS_LIMITE_MB, IMAGENS_TTL
+
+logger = logging.getLogger(__name__)
+
+_REF_VALIDA = re.compile(r'^[0-9a-z_-]+$')
+
+
+def _diretorio_padrao() -> str:
+    return os.path.join(tempfile.gettempdir(), 'bot_imagens')
+
+
+class ArmazemImagens:
+    def __init__(self, diretorio: str = None, limite_bytes: int = 200 * 1024 * 1024, ttl: float = 1800):
+        self.diretorio = diretorio or _diretorio_padrao()
+        self.limite_bytes = limite_bytes
+        self.ttl = ttl
+        # ref → (tamanho, último acesso), do menos para o mais recentemente usado
+        self._indice: 'OrderedDict[str, Tuple[int, float]]' = OrderedDict()
+        self._total = 0
+        self._descartadas = 0
+        # Handlers no loop e tarefas de OCR em thread podem ler ao mesmo tempo
+        self._lock = threading.Lock()
+        os.makedirs(self.diretorio, exist_ok=True)
+        self._reindexar()
+
+    def _caminho(self, ref: str) -> str:
+        if not _REF_VALIDA.match(ref):
+            raise ValueError(f"Referência de imagem inválida: {ref!r}")
+        return os.path.join(self.diretorio, ref)
+
+    def _reindexar(self):
+        """Recupera as imagens que já estavam no diretório (reinício do bot)."""
+        arquivos = []
+        for nome in os.listdir(self.diretorio):
+            if not _REF_VALIDA.match(nome):
+                continue
+            try:
+                st = os.stat(os.path.join(self.diretorio, nome))
+            except OSError:
+                continue
+            arquivos.append((st.st_mtime, nome, st.st_size))
+        for mtime, nome, tamanho in sorted(arquivos):
+            self._indice[nome] = (tamanho, mtime)
+            self._total += tamanho
+        self._liberar(time.time())
+        if self._indice:
+            logger.info(f"[Imagens] {len(self._indice)} imagem(ns) recuperadas de {self.diretorio}")
+
+    def _remover(self, ref: str):
+        tamanho, _ = self._indice.pop(ref)
+        self._total -= tamanho
+        try:
+            os.remove(os.path.join(self.diretorio, ref))
+        except OSError:
+            pass
+
+    def _liberar(self, agora: float):
+        # O índice está em ordem de acesso: expiradas e menos usadas ficam no começo
+        while self._indice:
+            ref, (_, acesso) = next(iter(self._indice.items()))
+            if agora - acesso <= self.ttl and self._total <= self.limite_bytes:
+                break
+            self._remover(ref)
+            self._descartadas += 1
+
+    def guardar(self, dono: int, dados: bytes) -> str:
+        """Grava a imagem e devolve a referência a guardar no user_data.
+
+        Levanta OSError se a gravação falhar (ex.: disco cheio); o arquivo parcial é apagado."""
+        ref = f"{dono}_{uuid.uuid4().hex}"
+        caminho = self._caminho(ref)
+        try:
+            with open(caminho, 'wb') as f:
+                f.write(dados)
+        except OSError:
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+            raise
+        agora = time.time()
+        with self._lock:
+            self._indice[ref] = (len(dados), agora)
+            self._total += len(dados)
+            self._liberar(agora)
+        return ref
+
+    def ler(self, ref: str) -> Optional[bytes]:
+        """Bytes da imagem, ou None se expirou/foi descartada pelo limite."""
+        agora = time.time()
+        with self._lock:
+            self._liberar(agora)
+            if ref not in self._indice:
+                return None
+            tamanho, _ = self._indice[ref]
+            self._indice[ref] = (tamanho, agora)
+            self._indice.move_to_end(ref)
+        try:
+            with open(self._caminho(ref), 'rb') as f:
+                return f.read()
+        except OSError:
+            with self._lock:
+                if ref in self._indice:
+                    self._remover(ref)
+            return None
+
+    def ler_varios(self, refs: List[str]) -> Tuple[List[bytes], List[str]]:
+        """(imagens disponíveis na ordem, referências perdidas)."""
+        imagens, perdidas = [], []
+        for ref in refs:
+            dados = self.ler(ref)
+            if dados is None:
+                perdidas.append(ref)
+            else:
+                imagens.append(dados)
+        return imagens, perdidas
+
+    def disponiveis(self, refs: List[str]) -> List[str]:
+        """Referências que ainda têm imagem (sem ler os arquivos)."""
+        with self._lock:
+            self._liberar(time.time())
+            return [ref for ref in refs if ref in self._indice]
+
+    def descartar(self, refs: List[str]):
+        with self._lock:
+            for ref in refs:
+                if ref in self._indice:
+                    self._remover(ref)
+
+    def resumo(self) -> Dict[str, object]:
+        with self._lock:
+            self._liberar(time.time())
+            return {
+                'imagens': len(self._indice),
+                'bytes': self._total,
+                'limite_bytes': self.limite_bytes,
+                'descartadas': self._descartadas,
+                'diretorio': self.diretorio,
+            }
+
+
+armazem_imagens = ArmazemImagens(IMAGENS_DIR or None, int(IMAGENS_LIMITE_MB * 1024 * 1024), IMAGENS_TTL)
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de desempenho e precisão do OCR das máscaras.
+
+Roda extrair_dados_completos sobre o corpus em bench_corpus/ (um JSON por tipo de
+máscara, com as respostas gravadas do Groq e do OCR.space e os valores esperados)
+contra backends simulados com latência e rate limit (429). O cliente Groq falso
+substitui apenas o SDK, então retry, streaming, hedging e fallback reais são exercitados.
+
+Para cada caso × cenário reporta: tempo total, chamadas remotas, tokens estimados
+(entrada e saída) e precisão por campo. Use --salvar para gravar uma baseline e
+--comparar para medir uma mudança contra ela.
+
+Prints reais podem ser colocados em bench_corpus/imagens/ com os nomes listados em
+"imagens" de cada caso; na ausência deles são usados bytes sintéticos.
+
+A/B de prompts: --prompt completo|compacto|ambos troca OCR_PROMPT_COMPACTO; com "ambos"
+o compacto é comparado contra o completo e a tabela de custo de cada prompt é impressa.
+As respostas do Groq são as gravadas no corpus (não dependem do prompt), então a precisão
+só muda pelo efeito do prompt no fluxo (ex: lotes pulados); confirme com prints reais.
+
+Uso:
+    python bench_ocr.py
+    python bench_ocr.py --prompt ambos --cenarios nominal
+    python bench_ocr.py --cenarios nominal groq_429 --salvar bench_baseline.json
+    python bench_ocr.py --comparar bench_baseline.json > bench_output.txt
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import utils
+
+CORPUS_DIR = Path(__file__).parent / 'bench_corpus'
+
+# Latências em segundos. ttft = tempo até o primeiro token; por_chunk = cada pedaço de ~8 chars
+CENARIOS = {
+    'nominal': {
+        'groq_ttft': 0.6, 'groq_por_chunk': 0.004, 'groq_429': [], 'groq_vazio': False,
+        'ocr_space_latencia': 0.4, 'ocr_space_429': [],
+    },
+    'groq_429': {
+        'groq_ttft': 0.6, 'groq_por_chunk': 0.004, 'groq_429': [0], 'groq_vazio': False,
+        'ocr_space_latencia': 0.4, 'ocr_space_429': [],
+    },
+    'groq_lento': {
+        'groq_ttft': 6.0, 'groq_por_chunk': 0.004, 'groq_429': [], 'groq_vazio': False,
+        'ocr_space_latencia': 0.4, 'ocr_space_429': [],
+    },
+    'groq_vazio': {
+        'groq_ttft': 0.6, 'groq_por_chunk': 0.004, 'groq_429': [], 'groq_vazio': True,
+        'ocr_space_latencia': 0.4, 'ocr_space_429': [1],
+    },
+}
+
+TAMANHO_CHUNK = 8  # caracteres por chunk do stream simulado
+
+
+class _Metricas:
+    def __init__(self):
+        self.groq_chamadas = 0
+        self.groq_429 = 0
+        # Respostas do Groq já entregues: o SDK falso é recriado a cada chamada, o cursor fica aqui
+        self.groq_respostas = 0
+        self.ocr_space_chamadas = 0
+        self.ocr_space_429 = 0
+        self.tokens_entrada = 0
+        self.tokens_saida = 0
+
+
+class _StreamFalso:
+    """Imita o Stream do SDK: itera chunks com delta.content e conta só o que foi lido."""
+
+    def __init__(self, conteudo: str, por_chunk: float, metricas: _Metricas):
+        self._partes = [conteudo[i:i + TAMANHO_CHUNK] for i in range(0, len(conteudo), TAMANHO_CHUNK)]
+        self._por_chunk = por_chunk
+        self._metricas = metricas
+        self._fechado = False
+
+    def __iter__(self):
+        for parte in self._partes:
+            if self._fechado:
+                return
+            time.sleep(self._por_chunk)
+            self._metricas.tokens_saida += max(1, len(parte) // 4)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=parte))])
+
+    def close(self):
+        self._fechado = True
+
+
+class _GroqFalso:
+    """Cliente Groq simulado: latência, 429 programados e respostas gravadas do corpus."""
+
+    def __init__(self, respostas: list, cenario: dict, metricas: _Metricas):
+        self._respostas = respostas or ['{}']
+        self._cenario = cenario
+        self._metricas = metricas
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, stream: bool = False, **kwargs):
+        idx = self._metricas.groq_chamadas
+        self._metricas.groq_chamadas += 1
+        for parte in kwargs['messages'][0]['content']:
+            if parte['type'] == 'text':
+                self._metricas.tokens_entrada += len(parte['text']) // 4
+            else:
+                self._metricas.tokens_entrada += len(parte['image_url']['url']) // 750
+
+        time.sleep(self._cenario['groq_ttft'])
+        if idx in self._cenario['groq_429']:
+            self._metricas.groq_429 += 1
+            raise Exception(
+                "Error code: 429 - {'error': {'message': 'Rate limit reached for model. "
+                "Please try again in 0.2s.', 'type': 'tokens', 'code': 'rate_limit_exceeded'}}"
+            )
+
+        if self._cenario['groq_vazio']:
+            conteudo = '{}'
+        else:
+            conteudo = self._respostas[min(self._metricas.groq_respostas, len(self._respostas) - 1)]
+        self._metricas.groq_respostas += 1
+
+        if stream:
+            return _StreamFalso(conteudo, self._cenario['groq_por_chunk'], self._metricas)
+        n_chunks = (len(conteudo) + TAMANHO_CHUNK - 1) // TAMANHO_CHUNK
+        time.sleep(n_chunks * self._cenario['groq_por_chunk'])
+        self._metricas.tokens_saida += len(conteudo) // 4
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=conteudo))])
+
+
+def _carregar_imagens(caso: dict) -> list:
+    imagens = []
+    for idx, nome in enumerate(caso.get('imagens', [])):
+        caminho = CORPUS_DIR / 'imagens' / nome
+        if caminho.exists():
+            imagens.append(caminho.read_bytes())
+        else:
+            # Bytes sintéticos com o índice embutido: o OCR.space falso usa para achar o texto gravado
+            imagens.append(f'bench:{idx}:'.encode() + b'\xff' * 2048)
+    return imagens
+
+
+def _precisao(resultado: dict, esperado: dict) -> dict:
+    campos = {}
+    for campo, valor in esperado.items():
+        obtido = str(resultado.get(campo) or '').strip().upper()
+        campos[campo] = obtido == str(valor).strip().upper()
+    return campos
+
+
+async def _rodar_caso(caso: dict, cenario: dict) -> dict:
+    metricas = _Metricas()
+    imagens = _carregar_imagens(caso)
+    textos = caso.get('ocr_space', [])
+
+    async def ocr_space_falso(image: bytes) -> str:
+        idx = metricas.ocr_space_chamadas
+        metricas.ocr_space_chamadas += 1
+        await asyncio.sleep(cenario['ocr_space_latencia'])
+        if idx in cenario['ocr_space_429']:
+            metricas.ocr_space_429 += 1
+            return ''  # _call_ocr_space real devolve '' em erro
+        try:
+            pos = imagens.index(image)
+        except ValueError:
+            pos = idx
+        return textos[pos] if pos < len(textos) else ''
+
+    async def tesseract_indisponivel(images, tipo_mascara=None) -> dict:
+        return {}
+
+    utils.Groq = lambda **kwargs: _GroqFalso(caso.get('groq'), cenario, metricas)
+    utils.USE_GROQ = True
+    utils.GROQ_API_KEY = 'bench'
+    utils._call_ocr_space = ocr_space_falso
+    utils.extrair_dados_tesseract = tesseract_indisponivel
+    # Cada execução começa com o roteador zerado (sem histórico das anteriores)
+    utils.roteador_ocr.resetar()
+
+    t0 = time.monotonic()
+    resultado = await utils.extrair_dados_completos(imagens, caso['tipo_mascara'])
+    decorrido = time.monotonic() - t0
+
+    campos = _precisao(resultado, caso['esperado'])
+    return {
+        'tempo_s': round(decorrido, 3),
+        'chamadas_groq': metricas.groq_chamadas,
+        'groq_429': metricas.groq_429,
+        'chamadas_ocr_space': metricas.ocr_space_chamadas,
+        'ocr_space_429': metricas.ocr_space_429,
+        'tokens_entrada': metricas.tokens_entrada,
+        'tokens_saida': metricas.tokens_saida,
+        'precisao': round(sum(campos.values()) / len(campos), 3) if campos else 1.0,
+        'campos': campos,
+    }
+
+
+def _imprimir(resultados: dict, baseline: dict = None):
+    cab = f"{'caso':<16}{'cenário':<12}{'tempo':>8}{'groq':>6}{'429':>5}{'ocr.sp':>8}{'tok.in':>8}{'tok.out':>8}{'precisão':>10}"
+    print(cab)
+    print('-' * len(cab))
+    for caso, por_cenario in resultados.items():
+        for cenario, r in por_cenario.items():
+            linha = (
+                f"{caso:<16}{cenario:<12}{r['tempo_s']:>7.2f}s{r['chamadas_groq']:>6}"
+                f"{r['groq_429'] + r['ocr_space_429']:>5}{r['chamadas_ocr_space']:>8}"
+                f"{r['tokens_entrada']:>8}{r['tokens_saida']:>8}{r['precisao']:>9.0%}"
+            )
+            base = (baseline or {}).get(caso, {}).get(cenario)
+            if base:
+                linha += (
+                    f"   Δtempo {r['tempo_s'] - base['tempo_s']:+.2f}s"
+                    f" Δtok {r['tokens_entrada'] + r['tokens_saida'] - base['tokens_entrada'] - base['tokens_saida']:+d}"
+                    f" Δprec {r['precisao'] - base['precisao']:+.0%}"
+                )
+            print(linha)
+            erros = [c for c, ok in r['campos'].items() if not ok]
+            if erros:
+                print(f"{'':<28}campos errados: {', '.join(erros)}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Benchmark do OCR das máscaras')
+    parser.add_argument('--cenarios', nargs='+', choices=sorted(CENARIOS), default=list(CENARIOS))
+    parser.add_argument('--casos', nargs='+', help='Nomes dos arquivos do corpus (sem .json)')
+    parser.add_argument('--hedge-delay', type=float, default=1.5, help='OCR_HEDGE_DELAY usado no benchmark')
+    parser.add_argument('--deadline', type=float, default=20.0, help='OCR_DEADLINE usado no benchmark')
+    parser.add_argument('--salvar', help='Grava os resultados em JSON (baseline)')
+    parser.add_argument('--comparar', help='Compara com uma baseline gravada com --salvar')
+    parser.add_argument('--prompt', choices=['completo', 'compacto', 'ambos'], default='completo',
+                        help='Variante de prompt (OCR_PROMPT_COMPACTO); "ambos" faz o A/B')
+    parser.add_argument('--verbose', action='store_true', help='Mostra os logs do OCR')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL)
+    utils.OCR_HEDGE_DELAY = args.hedge_delay
+    utils.OCR_DEADLINE = args.deadline
+
+    arquivos = sorted(CORPUS_DIR.glob('*.json'))
+    if args.casos:
+        arquivos = [a for a in arquivos if a.stem in args.casos]
+    if not arquivos:
+        print(f"Nenhum caso encontrado em {CORPUS_DIR}")
+        sys.exit(1)
+
+    variantes = ['completo', 'compacto'] if args.prompt == 'ambos' else [args.prompt]
+    if args.prompt == 'ambos':
+        custo = utils.custo_prompts()
+        print("Custo de texto por chamada (tokens estimados):")
+        for nome in sorted({k.rsplit('_', 1)[0] for k in custo}):
+            completo, compacto = custo[f'{nome}_completo'], custo[f'{nome}_compacto']
+            print(f"  {nome:<18}{completo:>6} → {compacto:>5}  ({(compacto - completo) / completo:+.0%})")
+        print()
+
+    baseline = None
+    if args.comparar:
+        baseline = json.loads(Path(args.comparar).read_text(encoding='utf-8'))
+
+    for variante in variantes:
+        utils.OCR_PROMPT_COMPACTO = variante == 'compacto'
+        resultados = {}
+        for arquivo in arquivos:
+            caso = json.loads(arquivo.read_text(encoding='utf-8'))
+            resultados[arquivo.stem] = {}
+            for nome in args.cenarios:
+                resultados[arquivo.stem][nome] = await _rodar_caso(caso, CENARIOS[nome])
+        if len(variantes) > 1:
+            print(f"== Prompt {variante} ==")
+        _imprimir(resultados, baseline)
+        if len(variantes) > 1 and not args.comparar:
+            # A/B: a variante seguinte é comparada com esta
+            baseline = resultados
+
+    total_tempo = sum(r['tempo_s'] for c in resultados.values() for r in c.values())
+    total_tokens = sum(r['tokens_entrada'] + r['tokens_saida'] for c in resultados.values() for r in c.values())
+    precisoes = [r['precisao'] for c in resultados.values() for r in c.values()]
+    print(f"\nTotal: {total_tempo:.2f}s | {total_tokens} tokens estimados | precisão média {sum(precisoes) / len(precisoes):.0%}")
+
+    if args.salvar:
+        Path(args.salvar).write_text(json.dumps(resultados, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"Resultados gravados em {args.salvar}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
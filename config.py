@@ -20,6 +20,10 @@ if not USE_SUPABASE:
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
 GROQ_MODEL = os.getenv("GROQ_MODEL", "qwen/qwen3.6-27b")
 USE_GROQ = bool(GROQ_API_KEY)
+# Streaming: lê os tokens conforme chegam e encerra assim que o JSON fecha
+GROQ_STREAM = os.getenv("GROQ_STREAM", "true").lower() in ("1", "true", "sim", "yes")
+# Prompts compactos (só os campos ainda faltando); desligado até ser validado com prints reais
+OCR_PROMPT_COMPACTO = os.getenv("OCR_PROMPT_COMPACTO", "false").lower() in ("1", "true", "sim", "yes")
 
 if not USE_GROQ:
     logger.warning("⚠️ Groq API não configurada! OCR automático não funcionará.")
@@ -31,6 +35,85 @@ USE_OCR_SPACE = bool(OCR_SPACE_API_KEY)
 if not USE_OCR_SPACE:
     logger.warning("⚠️ OCR.space API não configurada! OCR fallback não funcionará.")
 
+# Hedging do OCR das máscaras: se o Groq não responder em OCR_HEDGE_DELAY segundos,
+# os backends alternativos começam em paralelo. OCR_DEADLINE limita a espera total.
+OCR_HEDGE_DELAY = float(os.getenv("OCR_HEDGE_DELAY", "8"))
+OCR_DEADLINE = float(os.getenv("OCR_DEADLINE", "45"))
+OCR_HEDGE_BACKENDS = [b.strip() for b in os.getenv("OCR_HEDGE_BACKENDS", "tesseract,ocr_space").split(",") if b.strip()]
+# Roteamento dos provedores de OCR: provedor com taxa de sucesso abaixo do mínimo ou p95 da
+# latência por chamada acima de OCR_ROTEADOR_LATENCIA_MAX (segundos) na janela (segundos)
+# vai para o fim da fila até se recuperar
+OCR_ROTEADOR_JANELA = float(os.getenv("OCR_ROTEADOR_JANELA", "600"))
+OCR_ROTEADOR_MIN_AMOSTRAS = int(os.getenv("OCR_ROTEADOR_MIN_AMOSTRAS", "3"))
+OCR_ROTEADOR_TAXA_MINIMA = float(os.getenv("OCR_ROTEADOR_TAXA_MINIMA", "0.5"))
+OCR_ROTEADOR_LATENCIA_MAX = float(os.getenv("OCR_ROTEADOR_LATENCIA_MAX", "15"))
+# Confiança mínima (0-1) de um campo do OCR para dispensar nova chamada focada no campo
+OCR_CONFIANCA_MINIMA = float(os.getenv("OCR_CONFIANCA_MINIMA", "0.75"))
+
+# Cotas diárias de OCR remoto (0 = sem limite). Estouradas, o OCR cai para o Tesseract local.
+# O OCR.space grátis tem 25.000 requisições/mês (~800/dia) compartilhadas entre todos.
+OCR_QUOTA_GROQ_TOKENS_USUARIO_DIA = int(os.getenv("OCR_QUOTA_GROQ_TOKENS_USUARIO_DIA", "150000"))
+OCR_QUOTA_GROQ_TOKENS_DIA = int(os.getenv("OCR_QUOTA_GROQ_TOKENS_DIA", "0"))
+OCR_QUOTA_OCR_SPACE_USUARIO_DIA = int(os.getenv("OCR_QUOTA_OCR_SPACE_USUARIO_DIA", "100"))
+OCR_QUOTA_OCR_SPACE_DIA = int(os.getenv("OCR_QUOTA_OCR_SPACE_DIA", "800"))
+
+# Resolução alvo (maior lado, px) ao escolher qual tamanho da foto baixar do Telegram
+OCR_FOTO_LADO_MINIMO = int(os.getenv("OCR_FOTO_LADO_MINIMO", "1280"))
+
+# Prints quase idênticos (dHash de 256 bits com até N bits diferentes) são ignorados no OCR
+OCR_DHASH_DISTANCIA = int(os.getenv("OCR_DHASH_DISTANCIA", "4"))
+
+# Imagens das sessões em andamento ficam em arquivo (tmp do sistema por padrão), fora da memória.
+# Acima do limite as menos usadas são descartadas; sem acesso por IMAGENS_TTL segundos, expiram.
+IMAGENS_DIR = os.getenv("IMAGENS_DIR", "")
+IMAGENS_LIMITE_MB = float(os.getenv("IMAGENS_LIMITE_MB", "200"))
+IMAGENS_TTL = float(os.getenv("IMAGENS_TTL", "1800"))
+
+# Updates processados ao mesmo tempo (técnicos diferentes em paralelo; os de um mesmo
+# técnico sempre em ordem). Limita a carga simultânea no Supabase e no Groq.
+BOT_CONCORRENCIA_MAX = int(os.getenv("BOT_CONCORRENCIA_MAX", "16"))
+
+# Limites de saída para a Bot API (todas as chamadas passam pelo limitador do Application).
+# Envios em massa (broadcast/enquete) usam no máximo ENVIOS_LOTE_POR_SEGUNDO e cedem a vez às respostas.
+ENVIOS_POR_SEGUNDO = int(os.getenv("ENVIOS_POR_SEGUNDO", "30"))
+ENVIOS_LOTE_POR_SEGUNDO = int(os.getenv("ENVIOS_LOTE_POR_SEGUNDO", "20"))
+ENVIOS_CHAT_POR_SEGUNDO = int(os.getenv("ENVIOS_CHAT_POR_SEGUNDO", "3"))
+ENVIOS_GRUPO_POR_MINUTO = int(os.getenv("ENVIOS_GRUPO_POR_MINUTO", "20"))
+
+# Consulta inline (@bot termo): resultados guardados localmente por INLINE_CACHE_TTL segundos
+# (LRU de INLINE_CACHE_MAX buscas) e no Telegram por INLINE_CACHE_TIME segundos (cache_time)
+INLINE_MAX_RESULTADOS = int(os.getenv("INLINE_MAX_RESULTADOS", "10"))
+INLINE_CACHE_MAX = int(os.getenv("INLINE_CACHE_MAX", "256"))
+INLINE_CACHE_TTL = float(os.getenv("INLINE_CACHE_TTL", "60"))
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "30"))
+
+# /finalizar: a checagem de SA duplicada é refeita a cada foto; resultado mais velho que isso
+# (segundos) é refeito no /finalizar (outro técnico pode ter registrado a SA nesse meio tempo)
+FINALIZAR_PREVIA_TTL = float(os.getenv("FINALIZAR_PREVIA_TTL", "60"))
+
+# Registro em lote (/lote): máximo de SAs por mensagem/arquivo e tamanho do CSV/XLSX
+LOTE_MAX_LINHAS = int(os.getenv("LOTE_MAX_LINHAS", "50"))
+LOTE_ARQUIVO_MAX_KB = int(os.getenv("LOTE_ARQUIVO_MAX_KB", "512"))
+
+# Placar do ciclo em memória (🏆 Ranking): técnicos exibidos e máximo de registros lidos na
+# carga inicial (ciclo maior que isso = placar desligado, ranking volta a consultar o banco)
+RANKING_TOP = int(os.getenv("RANKING_TOP", "25"))
+PLACAR_CARGA_MAX = int(os.getenv("PLACAR_CARGA_MAX", "20000"))
+
+# Modo webhook: com WEBHOOK_URL (URL pública do serviço, ex.: https://bot.onrender.com) o bot
+# recebe os updates por webhook num único servidor async (aiohttp) que também serve /health e
+# /metrics na porta PORT. Sem WEBHOOK_URL o bot continua em polling + Flask keep-alive.
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_PATH = "/" + os.getenv("WEBHOOK_PATH", "telegram").strip("/")
+# Segredo conferido no cabeçalho X-Telegram-Bot-Api-Secret-Token (vazio = derivado do token)
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+USE_WEBHOOK = bool(WEBHOOK_URL)
+
+# Persistência local (SQLite) dos estados das conversas e do user_data; vazio desativa.
+# As alterações são gravadas em lote a cada PERSISTENCIA_INTERVALO segundos.
+PERSISTENCIA_ARQUIVO = os.getenv("PERSISTENCIA_ARQUIVO", "bot_estado.sqlite3")
+PERSISTENCIA_INTERVALO = float(os.getenv("PERSISTENCIA_INTERVALO", "10"))
+
 # IDs de Administradores - Agora vem do .env
 ADMIN_IDS_STR = os.getenv("ADMIN_IDS", "1797158471")
 ADMIN_IDS = [int(id.strip()) for id in ADMIN_IDS_STR.split(",") if id.strip().isdigit()]
@@ -76,8 +159,9 @@ CICLO_DIAS_TURBO = int(os.getenv("CICLO_DIAS_TURBO", "24"))
     AGUARDANDO_CIDADE_REPASSE,
     AGUARDANDO_OPERADORA_REPASSE,
     AGUARDANDO_OBS_REPASSE,
-    AGUARDANDO_OBS_BATIMENTO
-) = range(29)
+    AGUARDANDO_OBS_BATIMENTO,
+    AGUARDANDO_LOTE
+) = range(30)
 
 # Tabelas de Pontos e Valores
 PONTOS_SERVICO = {
@@ -1,11 +1,28 @@
 import asyncio
 from supabase import create_client, Client
 from config import SUPABASE_URL, SUPABASE_KEY, USE_SUPABASE
+from utils import normalizar_sa
 from cachetools import TTLCache
+from typing import Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Lote de valores por filtro in_ (vai na URL do PostgREST)
+_SAS_POR_CONSULTA = 100
+
+
+def _atualizar_placar(rows: list):
+    """Soma os registros recém-inseridos no placar do ciclo (ranking em memória)."""
+    try:
+        from modelos import Instalacao
+        from placar_ciclo import placar
+        placar.registrar([Instalacao.de_linha(row) for row in rows])
+    except Exception as e:
+        # O insert já foi feito; placar desatualizado não pode virar erro de registro
+        logger.error(f"[Placar] Falha ao atualizar: {e}")
+
+
 class DatabaseManager:
     def __init__(self):
         self.client: Client = None
@@ -125,10 +142,7 @@ class DatabaseManager:
     async def check_sa_exists(self, sa: str) -> bool:
         """Verifica se uma SA já foi registrada (normalizes SA first)."""
         if not self.client: return False
-        # Normalize SA before checking
-        sa_normalized = str(sa).strip().upper()
-        if sa_normalized.isdigit():
-            sa_normalized = f"SA-{sa_normalized}"
+        sa_normalized = normalizar_sa(sa)
         try:
             res = await self._run_async(
                 lambda: self.client.table("instalacoes").select("id").eq("sa", sa_normalized).limit(1).execute()
@@ -141,30 +155,69 @@ class DatabaseManager:
     async def save_installation(self, data: dict) -> bool:
         if not self.client: return False
         try:
-            # Normalize SA before saving
             if 'sa' in data:
-                sa_normalized = str(data['sa']).strip().upper()
-                if sa_normalized.isdigit():
-                    sa_normalized = f"SA-{sa_normalized}"
-                data['sa'] = sa_normalized
+                data['sa'] = normalizar_sa(data['sa'])
             
             await self._run_async(
                 lambda: self.client.table("instalacoes").insert(data).execute()
             )
+            _atualizar_placar([data])
             return True
         except Exception as e:
             logger.error(f"Error saving installation: {e}")
             return False
 
-    async def get_installations(self, filters: dict = None, limit=5000):
+    async def sas_existentes(self, sas: list) -> Optional[set]:
+        """SAs da lista que já foram registradas (registro em lote), ou None se a consulta falhar."""
+        if not self.client or not sas: return set()
+        normalizadas = list(dict.fromkeys(normalizar_sa(sa) for sa in sas))
+        def query():
+            existentes = set()
+            for i in range(0, len(normalizadas), _SAS_POR_CONSULTA):
+                res = (
+                    self.client.table("instalacoes").select("sa")
+                    .in_("sa", normalizadas[i:i + _SAS_POR_CONSULTA]).execute()
+                )
+                existentes.update(r['sa'] for r in (res.data or []))
+            return existentes
+
+        try:
+            return await self._run_async(query)
+        except Exception as e:
+            logger.error(f"Error checking {len(normalizadas)} SAs: {e}")
+            return None
+
+    async def save_installations(self, rows: list) -> bool:
+        """Insere várias instalações num único insert (tudo ou nada)."""
+        if not self.client: return False
+        if not rows: return True
+        try:
+            for row in rows:
+                if 'sa' in row:
+                    row['sa'] = normalizar_sa(row['sa'])
+            await self._run_async(
+                lambda: self.client.table("instalacoes").insert(rows).execute()
+            )
+            _atualizar_placar(rows)
+            return True
+        except Exception as e:
+            logger.error(f"Error saving {len(rows)} installations: {e}")
+            return False
+
+    async def get_installations(self, filters: dict = None, limit=5000, levantar_erro: bool = False):
         """
         Busca instalações com filtros opcionais.
         Filtros suportados: tecnico_id, data_inicio, data_fim, termo_busca, sa
         
         Datas podem ser objetos datetime. Novos registros são armazenados em ISO,
         registros legados em formato BR (dd/mm/YYYY HH:MM) são filtrados no Python.
+        Retorna List[Instalacao] (modelos.py). Em erro devolve [] (ou levanta a exceção com
+        levantar_erro=True, para quem precisa distinguir falha de resultado vazio).
         """
-        if not self.client: return []
+        if not self.client:
+            if levantar_erro:
+                raise RuntimeError("Supabase não configurado")
+            return []
         
         def query():
             q = self.client.table("instalacoes").select("*")
@@ -174,11 +227,7 @@ class DatabaseManager:
                     q = q.eq('tecnico_id', filters['tecnico_id'])
                 
                 if 'sa' in filters:
-                    # Normalize SA filter
-                    sa_filter = str(filters['sa']).strip().upper()
-                    if sa_filter.isdigit():
-                        sa_filter = f"SA-{sa_filter}"
-                    q = q.eq('sa', sa_filter)
+                    q = q.eq('sa', normalizar_sa(filters['sa']))
 
                 # Busca textual via ilike no banco (evita carregar tudo em memória)
                 if 'termo_busca' in filters:
@@ -199,29 +248,57 @@ class DatabaseManager:
 
         try:
             res = await self._run_async(query)
-            data = res.data or []
+            # Linha crua → Instalacao uma vez só: data interpretada, tipo normalizado, pontos e dia
+            from modelos import Instalacao
+            insts = [Instalacao.de_linha(item) for item in (res.data or [])]
 
             # Filtro Python de fallback para registros legados (formato BR dd/mm/YYYY HH:MM)
             # e para garantir que registros ISO fora do range não vazem
             if filters and ('data_inicio' in filters or 'data_fim' in filters):
-                from utils import parse_data
                 inicio = filters.get('data_inicio')
                 fim = filters.get('data_fim')
-                filtered_data = []
-                for item in data:
-                    dt = parse_data(item.get('data', ''))
-                    if dt is None:
-                        continue
-                    if inicio and dt < inicio:
-                        continue
-                    if fim and dt > fim:
-                        continue
-                    filtered_data.append(item)
-                return filtered_data
-
-            return data
+                return [
+                    inst for inst in insts
+                    if inst.dt is not None
+                    and not (inicio and inst.dt < inicio)
+                    and not (fim and inst.dt > fim)
+                ]
+
+            return insts
         except Exception as e:
             logger.error(f"Error getting installations: {e}")
+            if levantar_erro:
+                raise
+            return []
+
+    async def buscar_instalacoes(self, termo: str, limit: int = 10, antes_de_id: int = None):
+        """
+        Busca rápida por SA/GPON/serial (consulta e modo inline): só as colunas exibidas,
+        mais recentes primeiro, sem o filtro de datas do get_installations.
+
+        Paginação por cursor (keyset): antes_de_id = id do último registro da página
+        anterior — cada página custa o mesmo, sem OFFSET.
+        """
+        if not self.client: return []
+        # Vírgula/parênteses quebram o filtro or_ do PostgREST
+        termo = ''.join(c for c in str(termo) if c not in ',()%*').strip()
+        if not termo:
+            return []
+        def query():
+            q = (
+                self.client.table("instalacoes")
+                .select("id,sa,gpon,serial_modem,serial_mesh,tipo,tecnico_nome,data,fotos")
+                .or_(f"sa.ilike.%{termo}%,gpon.ilike.%{termo}%,serial_modem.ilike.%{termo}%")
+            )
+            if antes_de_id is not None:
+                q = q.lt('id', antes_de_id)
+            return q.order('id', desc=True).limit(limit).execute()
+
+        try:
+            res = await self._run_async(query)
+            return res.data or []
+        except Exception as e:
+            logger.error(f"Error searching installations '{termo}': {e}")
             return []
 
 # Instância global
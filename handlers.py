@@ -1,15 +1,22 @@
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, constants, InputMediaPhoto
-from telegram.ext import ContextTypes, ConversationHandler
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, constants, InputMediaPhoto, InlineQueryResultArticle, InputTextMessageContent
+from telegram.ext import ContextTypes, ConversationHandler, ApplicationHandlerStop
 from typing import Tuple, Optional, List, Dict, Any
 from config import *
 from config import ADMIN_USERNAME
 from database import db
 from datetime import datetime
-from reports import gerar_texto_producao, gerar_ranking_texto, gerar_resumo_progresso
-from utils import ciclo_atual, escape_markdown, extrair_campos_por_imagem, extrair_campos_por_imagens, extrair_campo_especifico, is_valid_serial, calcular_pontos, parse_data, format_data
-import io
-import os
+from reports import gerar_texto_producao, gerar_ranking_texto, gerar_ranking_placar, gerar_resumo_progresso
+from utils import ciclo_atual, escape_markdown, extrair_campos_por_imagem, extrair_campos_por_imagens, extrair_campo_especifico, is_valid_serial, calcular_pontos, format_data
+from utils import ResultadoOCR, como_resultado_ocr, hash_perceptual, imagem_repetida
+from uso_ocr import definir_usuario_ocr
+from armazem_imagens import armazem_imagens
+from modelos import Instalacao
+from placar_ciclo import placar
+import registro_lote
+from cachetools import TTLCache
+import asyncio
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -50,20 +57,77 @@ def gerar_progresso(etapa_atual: int, total: int = 5, dados: dict = None) -> str
     
     return progresso
 
-async def verificar_acesso_usuario(user_id: int) -> Tuple[bool, str]:
+# ==================== CONTROLE DE ACESSO ====================
+
+# Callbacks do painel admin têm verificação própria (ADMIN_IDS)
+CALLBACKS_LIVRES_ACESSO = ('admin_', 'broadcast_', 'access_')
+# /meuid continua respondendo para o técnico bloqueado informar o ID ao admin
+COMANDOS_LIVRES_ACESSO = ('/meuid',)
+
+
+async def controle_acesso(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
-    Verifica se o usuário tem acesso ao bot.
-    Retorna (tem_acesso, mensagem_erro)
+    Grupo -1: resolve o cadastro do usuário uma vez por update (cache do db) e guarda
+    no context (usuario_db/status_acesso). Bloqueados e pendentes param aqui.
+    Usuário sem cadastro passa, para poder se cadastrar pelo /start.
     """
-    db_user = await db.get_user(str(user_id))
-    
-    if db_user and db_user.get('status') == 'bloqueado':
-        return False, '⛔ *Acesso Bloqueado*\n\nSeu acesso foi suspenso. Entre em contato com o administrador.'
-    
-    if db_user and db_user.get('status') == 'pendente':
-        return False, '⏳ *Cadastro em Análise*\n\nSeu cadastro está aguardando aprovação do administrador.'
-    
-    return True, ''
+    user = update.effective_user
+    if not user:
+        return
+
+    try:
+        db_user = await db.get_user(str(user.id))
+    except Exception as e:
+        # Fail-safe: sem o status, segue e os handlers consultam de novo se precisarem
+        logger.error(f"Erro ao verificar status do usuário {user.id}: {e}")
+        return
+
+    context.usuario_db = db_user
+    context.status_acesso = db_user.get('status', 'ativo') if db_user else None
+
+    if context.status_acesso not in ('bloqueado', 'pendente') or user.id in ADMIN_IDS:
+        return
+
+    bloqueado = context.status_acesso == 'bloqueado'
+    if update.callback_query:
+        if update.callback_query.data and update.callback_query.data.startswith(CALLBACKS_LIVRES_ACESSO):
+            return
+        if bloqueado:
+            await update.callback_query.answer('⛔ Seu acesso está bloqueado. Contate o administrador.', show_alert=True)
+        else:
+            await update.callback_query.answer('⏳ Seu cadastro está aguardando aprovação.', show_alert=True)
+    elif update.inline_query:
+        await update.inline_query.answer([], cache_time=INLINE_CACHE_TIME, is_personal=True)
+    elif update.message and update.effective_chat and update.effective_chat.type == constants.ChatType.PRIVATE:
+        texto = update.message.text or ''
+        if texto.split('@')[0].split(' ')[0] in COMANDOS_LIVRES_ACESSO:
+            return
+        if bloqueado:
+            keyboard = [[InlineKeyboardButton("💬 Falar com Admin", url=f"https://t.me/{ADMIN_USERNAME}")]]
+            await update.message.reply_text(
+                '⛔ *Acesso Bloqueado*\n\n'
+                f'Seu acesso foi suspenso. Para regularizar, clique no botão abaixo ou chame: @{ADMIN_USERNAME}',
+                reply_markup=InlineKeyboardMarkup(keyboard),
+                parse_mode='Markdown'
+            )
+        else:
+            await update.message.reply_text(
+                '⏳ *Cadastro em Análise*\n\n'
+                'Seu cadastro foi realizado e está aguardando aprovação do administrador.\n'
+                'Você será notificado assim que for liberado.',
+                parse_mode='Markdown'
+            )
+    # Grupos, enquetes etc.: ignora em silêncio
+
+    logger.info(f"Update de usuário {user.id} barrado no controle de acesso ({context.status_acesso})")
+    raise ApplicationHandlerStop
+
+
+async def usuario_cadastrado(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[Dict[str, Any]]:
+    """Cadastro do usuário do update: o resolvido pelo controle_acesso, ou do banco se ele não rodou."""
+    if hasattr(context, 'usuario_db'):
+        return context.usuario_db
+    return await db.get_user(str(update.effective_user.id))
 
 # ==================== FLUXO DE INSTALAÇÃO/REPARO ====================
 
@@ -73,37 +137,10 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Log do callback recebido
     logger.info(f"Callback recebido: {query.data} de usuário {query.from_user.id}")
     
-    # Verificar status do usuário antes de processar qualquer ação
-    # Exceto para callbacks admin que têm sua própria verificação
-    if not query.data.startswith(('admin_', 'broadcast_', 'access_')):
-        user_id = query.from_user.id
-        
-        try:
-            db_user = await db.get_user(str(user_id))
-            
-            if db_user:
-                status = db_user.get('status', 'ativo')
-                logger.info(f"Usuário {user_id} tem status: {status}")
-                
-                if status == 'bloqueado':
-                    await query.answer('⛔ Seu acesso está bloqueado. Contate o administrador.', show_alert=True)
-                    logger.warning(f"Acesso bloqueado para usuário {user_id}")
-                    return ConversationHandler.END
-                    
-                if status == 'pendente':
-                    await query.answer('⏳ Seu cadastro está aguardando aprovação.', show_alert=True)
-                    logger.info(f"Usuário {user_id} com cadastro pendente")
-                    return ConversationHandler.END
-            else:
-                # Usuário não existe no banco - permitir para que possa se cadastrar
-                logger.info(f"Usuário {user_id} não encontrado no banco - permitindo acesso para cadastro")
-        except Exception as e:
-            logger.error(f"Erro ao verificar status do usuário {user_id}: {e}")
-            # Em caso de erro, permitir acesso (fail-safe)
-    
     await query.answer()
     
     if query.data == 'registrar':
+        _limpar_autofill(context)
         context.user_data['modo_registro'] = 'instalacao'
         logger.info(f"✅ Usuário {query.from_user.id} iniciou INSTALAÇÃO - modo_registro definido")
         logger.debug(f"Context user_data: {context.user_data}")
@@ -118,6 +155,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return AGUARDANDO_SA
     
     elif query.data == 'registrar_reparo':
+        _limpar_autofill(context)
         context.user_data['modo_registro'] = 'reparo'
         logger.info(f"✅ Usuário {query.from_user.id} iniciou REPARO - modo_registro definido")
         logger.debug(f"Context user_data: {context.user_data}")
@@ -153,8 +191,8 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             
         msg = f'📂 *Suas Últimas Instalações*\n\n'
         for i, inst in enumerate(insts, 1):
-            msg += f'{i}. SA: `{inst.get("sa")}` | GPON: `{inst.get("gpon")}`\n'
-            msg += f'   Data: {inst.get("data")}\n\n'
+            msg += f'{i}. SA: `{inst.sa}` | GPON: `{inst.gpon}`\n'
+            msg += f'   Data: {inst.data}\n\n'
             
         await query.edit_message_text(msg, parse_mode='Markdown')
         return ConversationHandler.END
@@ -195,18 +233,15 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         msg = f"📄 *Detalhes do Ciclo ({inicio_dt.strftime('%d/%m')} - {fim_dt.strftime('%d/%m')})*\n\n"
         
         # Ordenar por data (mais recente primeiro)
-        insts_sorted = sorted(insts, key=lambda x: parse_data(x.get('data', '')) or datetime.min.replace(tzinfo=TZ), reverse=True)
+        insts_sorted = sorted(insts, key=lambda x: x.dt or datetime.min.replace(tzinfo=TZ), reverse=True)
         
         # Limitar exibição para evitar erro de tamanho de mensagem
         MAX_ITEMS = 30
         exibidos = insts_sorted[:MAX_ITEMS]
         
         for inst in exibidos:
-            tipo = inst.get('tipo', 'Instalação')
-            from config import PONTOS_SERVICO
-            pontos = PONTOS_SERVICO.get(tipo.lower(), 0)
-            msg += f"📅 {format_data(inst.get('data', ''))} | {pontos} pts\n"
-            msg += f"🔧 {tipo} | SA: {inst['sa']}\n"
+            msg += f"📅 {inst.data_br} | {inst.pontos} pts\n"
+            msg += f"🔧 {inst.tipo} | SA: {inst.sa}\n"
             msg += f"───\n"
             
         if len(insts_sorted) > MAX_ITEMS:
@@ -230,8 +265,12 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Chamar finalizar_registro_forcado que faz o save direto
         return await finalizar_registro_forcado(update, context)
     
+    elif query.data.startswith('lote_'):
+        return await confirmar_lote(update, context)
+    
     elif query.data == 'cancelar_registro':
         # Cancelar registro
+        _descartar_imagens_sessao(context)
         context.user_data.clear()
         await query.edit_message_text('❌ Registro cancelado.')
         return ConversationHandler.END
@@ -286,11 +325,15 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return AGUARDANDO_DATA_INICIO
         
     elif query.data == 'rel_ranking':
-        inicio_ciclo, _ = ciclo_atual()
-        insts = await db.get_installations({'data_inicio': inicio_ciclo}, limit=2000)
         user_id = query.from_user.id
         is_admin = user_id in ADMIN_IDS
-        msg = gerar_ranking_texto(insts, is_admin=is_admin)
+        if placar.pronto:
+            msg = gerar_ranking_placar(placar, is_admin=is_admin)
+        else:
+            # Placar não carregado na subida: agrupa o ciclo direto do banco
+            inicio_ciclo, _ = ciclo_atual()
+            insts = await db.get_installations({'data_inicio': inicio_ciclo}, limit=2000)
+            msg = gerar_ranking_texto(insts, is_admin=is_admin)
         await query.edit_message_text(msg, parse_mode='Markdown')
         return ConversationHandler.END
         
@@ -386,6 +429,150 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.warning(f"Callback não tratado: {query.data}")
     return ConversationHandler.END
 
+# ==================== OCR ANTECIPADO DAS MÁSCARAS ====================
+# Cada par de fotos (tamanho do lote do Groq) vira uma tarefa em background assim que é
+# baixado, e "Gerar Máscara" só aguarda o que ainda faltar. Os lotes de uma sessão rodam
+# um de cada vez, na ordem (limite de 8000 TPM do plano free do Groq), e cada um recebe
+# o que os anteriores já acharam. As tarefas ficam fora do user_data (não são
+# serializáveis), indexadas pelo user_id.
+OCR_FOTOS_POR_LOTE = 2
+_ocr_mascara_sessoes: Dict[int, Dict[str, Any]] = {}
+
+
+def _escolher_tamanho_foto(fotos: List[Any], lado_minimo: int = None) -> Any:
+    """Menor PhotoSize cujo maior lado atinge a resolução do OCR (ou a maior disponível).
+
+    O Telegram manda a mesma foto em vários tamanhos (90, 320, 800, 1280, 2560px...):
+    baixar um maior que o necessário só custa tempo, já que o OCR reduz de novo."""
+    lado_minimo = lado_minimo or OCR_FOTO_LADO_MINIMO
+    por_area = sorted(fotos, key=lambda f: f.width * f.height)
+    for foto in por_area:
+        if max(foto.width, foto.height) >= lado_minimo:
+            return foto
+    return por_area[-1]
+
+
+async def _baixar_foto(fotos: List[Any]) -> bytearray:
+    """Baixa o tamanho adequado ao OCR direto num bytearray (sem BytesIO + getvalue nem
+    arquivo temporário). Levanta exceção se o download falhar."""
+    foto = _escolher_tamanho_foto(fotos)
+    file = await foto.get_file()
+    dados = await file.download_as_bytearray()
+    if not dados:
+        raise ValueError("download vazio")
+    logger.info(f"[FOTO] {foto.width}x{foto.height} baixada ({len(dados)//1024}KB)")
+    return dados
+
+
+def _refs_imagens(context, chave: str) -> Tuple[List[str], bool]:
+    """Referências das imagens da sessão (user_data guarda só as refs; os bytes ficam no
+    armazem_imagens). Refs expiradas/descartadas saem do user_data; o bool indica se houve."""
+    refs = context.user_data.get(chave) or []
+    vivas = armazem_imagens.disponiveis(refs)
+    if len(vivas) != len(refs):
+        logger.warning(f"[Imagens] {len(refs) - len(vivas)} imagem(ns) de '{chave}' expiraram")
+        context.user_data[chave] = vivas
+    return vivas, len(vivas) != len(refs)
+
+
+async def _guardar_imagem(update: Update, image_bytes: bytes) -> Optional[str]:
+    """Guarda a imagem no armazém; se a gravação falhar (disco cheio), avisa o técnico e devolve None."""
+    try:
+        return await asyncio.to_thread(armazem_imagens.guardar, update.effective_user.id, image_bytes)
+    except OSError as e:
+        logger.error(f"[Imagens] Falha ao guardar imagem de {update.effective_user.id}: {e}")
+        await update.message.reply_text('❌ Não consegui guardar a imagem agora. Tente novamente em instantes ou digite o dado.')
+        return None
+
+
+async def _imagens(refs: List[str]) -> List[bytes]:
+    """Lê os bytes das refs fora do event loop (são arquivos em disco)."""
+    return (await asyncio.to_thread(armazem_imagens.ler_varios, refs))[0]
+
+
+def _descartar_imagens_sessao(context):
+    """Apaga do armazém as imagens da sessão antes de limpar o user_data."""
+    for chave in ('fotos_mascara', 'autofill_images'):
+        armazem_imagens.descartar(context.user_data.get(chave) or [])
+
+
+def _limpar_autofill(context):
+    """Descarta prints, hashes e campos lidos no autofill de um registro anterior: um registro
+    novo não pode herdar a SA/GPON de uma sessão abandonada."""
+    armazem_imagens.descartar(context.user_data.pop('autofill_images', None) or [])
+    context.user_data.pop('autofill_ocr', None)
+    context.user_data.pop('hashes_autofill', None)
+
+
+def _cancelar_ocr_mascara(user_id: int):
+    """Descarta o OCR em andamento da sessão (nova máscara, sessão encerrada)."""
+    sessao = _ocr_mascara_sessoes.pop(user_id, None)
+    if sessao:
+        for tarefa in sessao['tarefas']:
+            tarefa.cancel()
+
+
+async def _ocr_lote_mascara(sessao: Dict[str, Any], anterior: Optional[asyncio.Task], lote_refs: List[str], tipo: str):
+    """OCR de um lote depois do anterior terminar, com os campos já achados na sessão."""
+    from utils import extrair_dados_completos
+
+    lote = await _imagens(lote_refs)
+    if anterior:
+        # Erro do anterior já foi registrado por ele; este lote segue mesmo assim
+        await asyncio.wait([anterior])
+    if not lote:
+        return
+    try:
+        dados = await extrair_dados_completos(lote, tipo_mascara=tipo, ja_extraidos=sessao['dados'])
+    except Exception as e:
+        logger.error(f"Erro OCR mascara (lote): {e}")
+        return
+    sessao['dados'].mesclar(dados)
+
+
+def _agendar_ocr_mascara(user_id: int, fotos: List[str], tipo: str, final: bool = False):
+    """Enfileira o OCR dos lotes completos ainda não enviados (final=True envia também a sobra).
+
+    `fotos` são as refs do armazem_imagens; só as do lote são lidas, já dentro da tarefa."""
+    sessao = _ocr_mascara_sessoes.setdefault(user_id, {'enviadas': 0, 'tarefas': [], 'dados': ResultadoOCR()})
+    while len(fotos) - sessao['enviadas'] >= OCR_FOTOS_POR_LOTE or (final and len(fotos) > sessao['enviadas']):
+        lote_refs = fotos[sessao['enviadas']:sessao['enviadas'] + OCR_FOTOS_POR_LOTE]
+        sessao['enviadas'] += len(lote_refs)
+        logger.info(f"[MASCARA] OCR antecipado: lote com {len(lote_refs)} foto(s) (total enviado: {sessao['enviadas']})")
+        anterior = sessao['tarefas'][-1] if sessao['tarefas'] else None
+        sessao['tarefas'].append(asyncio.create_task(_ocr_lote_mascara(sessao, anterior, lote_refs, tipo)))
+
+
+async def _coletar_ocr_mascara(user_id: int, fotos: List[str], tipo: str) -> ResultadoOCR:
+    """
+    Envia as fotos restantes e aguarda os lotes pendentes (já mesclados na ordem de envio).
+    SA/GPON ausentes ou com baixa confiança ganham uma única chamada focada no campo.
+    """
+    _agendar_ocr_mascara(user_id, fotos, tipo, final=True)
+    sessao = _ocr_mascara_sessoes.pop(user_id)
+    tarefas = sessao['tarefas']
+    pendentes = [t for t in tarefas if not t.done()]
+    logger.info(f"[MASCARA] {len(tarefas) - len(pendentes)}/{len(tarefas)} lote(s) já concluídos ao gerar")
+    if pendentes:
+        # Cada lote já respeita OCR_DEADLINE e eles rodam em fila; o timeout é só uma rede de segurança
+        _, atrasadas = await asyncio.wait(pendentes, timeout=(OCR_DEADLINE + 5) * len(pendentes))
+        for tarefa in atrasadas:
+            tarefa.cancel()
+
+    dados = sessao['dados']
+
+    # Sem nenhum dado o Groq provavelmente está fora — não vale insistir
+    incertos = dados.campos_incertos([c for c in ('sa', 'gpon') if c in dados]) if any(dados.values()) else []
+    imagens = await _imagens(fotos) if incertos else []
+    for campo in incertos:
+        logger.info(f"[MASCARA] Campo '{campo}' incerto ({dados.info(campo)}) — chamada focada")
+        try:
+            dados.mesclar(await asyncio.wait_for(extrair_campo_especifico(imagens, campo), timeout=OCR_HEDGE_DELAY))
+        except asyncio.TimeoutError:
+            logger.warning(f"[MASCARA] Chamada focada em '{campo}' excedeu {OCR_HEDGE_DELAY:.0f}s — mantendo o que havia")
+    return dados
+
+
 async def receber_tipo_mascara(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -406,7 +593,10 @@ async def receber_tipo_mascara(update: Update, context: ContextTypes.DEFAULT_TYP
         return AGUARDANDO_TIPO_MASCARA
         
     context.user_data['tipo_mascara'] = tipo
+    armazem_imagens.descartar(context.user_data.get('fotos_mascara') or [])
     context.user_data['fotos_mascara'] = []
+    context.user_data['hashes_mascara'] = []
+    _cancelar_ocr_mascara(update.effective_user.id)
     
     keyboard = [[InlineKeyboardButton("⏩ Pular Foto (Preencher Manual)", callback_data='skip_photo')]]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -422,6 +612,8 @@ async def receber_tipo_mascara(update: Update, context: ContextTypes.DEFAULT_TYP
     return AGUARDANDO_FOTO_MASCARA
 
 async def receber_foto_mascara(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Uso de OCR (tokens/requisições) contabilizado para este técnico
+    definir_usuario_ocr(update.effective_user.id)
     # Inicializar lista de fotos se não existir
     if 'fotos_mascara' not in context.user_data:
         context.user_data['fotos_mascara'] = []
@@ -438,15 +630,32 @@ async def receber_foto_mascara(update: Update, context: ContextTypes.DEFAULT_TYP
 
     # Se enviou foto, acumula
     if update.message and update.message.photo:
-        photo = update.message.photo[-1]
         try:
-            file = await photo.get_file()
-            out = io.BytesIO()
-            await file.download_to_memory(out)
-            image_bytes = out.getvalue()
-            context.user_data['fotos_mascara'].append(image_bytes)
+            image_bytes = await _baixar_foto(update.message.photo)
+
+            # Print repetido (ou recorte quase igual) não paga outro OCR
+            hashes = context.user_data.setdefault('hashes_mascara', [])
+            # PIL (decodificar + redimensionar) fora do event loop
+            hash_foto = await asyncio.to_thread(hash_perceptual, image_bytes)
+            if imagem_repetida(hash_foto, hashes):
+                keyboard = [[InlineKeyboardButton("✅ Gerar Máscara", callback_data='gerar_mascara')]]
+                await update.message.reply_text(
+                    '♻️ Essa foto é igual a uma que você já enviou — ignorada.\nEnvie outra aba ou clique em Gerar.',
+                    reply_markup=InlineKeyboardMarkup(keyboard)
+                )
+                return AGUARDANDO_FOTO_MASCARA
+            ref = await _guardar_imagem(update, image_bytes)
+            if not ref:
+                return AGUARDANDO_FOTO_MASCARA
+            hashes.append(hash_foto)
+            context.user_data['fotos_mascara'].append(ref)
+            fotos, perdeu = _refs_imagens(context, 'fotos_mascara')
+            if perdeu:
+                # Os lotes já enviados não batem mais com a lista: recomeça o OCR antecipado
+                _cancelar_ocr_mascara(update.effective_user.id)
+            _agendar_ocr_mascara(update.effective_user.id, fotos, context.user_data['tipo_mascara'])
             
-            qtd = len(context.user_data['fotos_mascara'])
+            qtd = len(fotos)
             keyboard = [[InlineKeyboardButton("✅ Gerar Máscara", callback_data='gerar_mascara')]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             
@@ -468,10 +677,11 @@ async def receber_foto_mascara(update: Update, context: ContextTypes.DEFAULT_TYP
             return AGUARDANDO_FOTO_MASCARA
             
     # Processar OCR
-    logger.info("[MASCARA] Iniciando processamento OCR das fotos...")
-    from utils import extrair_dados_completos
+    logger.info("[MASCARA] Coletando OCR das fotos...")
     
-    imgs = context.user_data.get('fotos_mascara', [])
+    imgs, perdeu = _refs_imagens(context, 'fotos_mascara')
+    if perdeu:
+        _cancelar_ocr_mascara(update.effective_user.id)
     dados = {}
     logger.info(f"[MASCARA] Total de imagens para processar: {len(imgs)}")
     
@@ -480,7 +690,7 @@ async def receber_foto_mascara(update: Update, context: ContextTypes.DEFAULT_TYP
         try:
             tipo = context.user_data.get('tipo_mascara')
             logger.info(f"[MASCARA] Tipo de máscara selecionado: {tipo}")
-            dados = await extrair_dados_completos(imgs, tipo_mascara=tipo)
+            dados = await _coletar_ocr_mascara(update.effective_user.id, imgs, tipo)
             logger.info(f"[MASCARA] Dados extraídos do OCR: {dados}")
         except Exception as e:
             logger.error(f"Erro OCR mascara: {e}", exc_info=True)
@@ -511,7 +721,11 @@ async def receber_foto_mascara(update: Update, context: ContextTypes.DEFAULT_TYP
         campos_preenchidos = [k for k, v in dados.items() if v]
         campos_vazios = [k for k, v in dados.items() if not v]
         if campos_preenchidos:
-            preenchidos_str = '\n'.join([f'  ✅ `{k}`: {dados[k][:50]}' for k in campos_preenchidos])
+            # ❓ = campo com baixa confiança (backend fraco ou valor fora do formato esperado)
+            preenchidos_str = '\n'.join([
+                f"  {'✅' if dados.confianca(k) >= OCR_CONFIANCA_MINIMA else '❓'} `{k}`: {dados[k][:50]}"
+                for k in campos_preenchidos
+            ])
             msg_ocr = f'📸 *OCR:* {len(campos_preenchidos)}/{len(dados)} campos detectados:\n{preenchidos_str}'
         else:
             msg_ocr = '⚠️ *OCR:* Nenhum campo foi detectado nas imagens. Você precisará preencher tudo manualmente.'
@@ -747,8 +961,7 @@ async def gerar_mascara_final(update: Update, context: ContextTypes.DEFAULT_TYPE
         
     elif tipo == 'Repasse':
         # Pegar dados do usuário logado para o campo TECNICO
-        user_id = update.effective_user.id
-        db_user = await db.get_user(str(user_id))
+        db_user = await usuario_cadastrado(update, context)
         tecnico_nome = f"{db_user.get('nome','')} {db_user.get('sobrenome','')}".strip() if db_user else ""
         
         cidade = context.user_data.get('cidade_repasse', '')
@@ -795,7 +1008,9 @@ async def gerar_mascara_final(update: Update, context: ContextTypes.DEFAULT_TYPE
         await update.message.reply_text(msg, parse_mode='Markdown')
     
     # Limpar dados temporários
-    context.user_data.pop('fotos_mascara', None)
+    _cancelar_ocr_mascara(update.effective_user.id)
+    armazem_imagens.descartar(context.user_data.pop('fotos_mascara', None) or [])
+    context.user_data.pop('hashes_mascara', None)
     context.user_data.pop('dados_mascara', None)
     context.user_data.pop('tipo_mascara', None)
     context.user_data.pop('obs_batimento', None)
@@ -813,33 +1028,13 @@ async def gerar_mascara_final(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    user_id = user.id
     raw_username = user.username or user.first_name
     # Escapar caracteres de Markdown V1 para evitar erro Bad Request
     username = raw_username.replace("_", "\\_").replace("*", "\\*").replace("`", "\\`").replace("[", "\\[")
     
-    # Verificar se usuário existe e se está bloqueado
-    db_user = await db.get_user(str(user_id))
-    
-    if db_user and db_user.get('status') == 'bloqueado':
-        keyboard = [[InlineKeyboardButton("💬 Falar com Admin", url=f"https://t.me/{ADMIN_USERNAME}")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text(
-            '⛔ *Acesso Bloqueado*\n\n'
-            f'Seu acesso foi suspenso. Para regularizar, clique no botão abaixo ou chame: @{ADMIN_USERNAME}',
-            reply_markup=reply_markup,
-            parse_mode='Markdown'
-        )
-        return ConversationHandler.END
-
-    if db_user and db_user.get('status') == 'pendente':
-        await update.message.reply_text(
-            '⏳ *Cadastro em Análise*\n\n'
-            'Seu cadastro foi realizado e está aguardando aprovação do administrador.\n'
-            'Você será notificado assim que for liberado.',
-            parse_mode='Markdown'
-        )
-        return ConversationHandler.END
+    # Bloqueados/pendentes já pararam no controle_acesso
+    db_user = await usuario_cadastrado(update, context)
+    _limpar_autofill(context)
     
     if not db_user:
         msg_text = (
@@ -962,6 +1157,7 @@ async def ajuda(update: Update, context: ContextTypes.DEFAULT_TYPE):
         '/producao - Ver produção atual\n'
         '/consultar - Consultar instalação\n'
         '/reparo - Registrar reparo\n'
+        '/lote - Registrar várias SAs de uma vez\n'
         '/cancelar - Cancelar operação\n'
         '/admin - Painel Administrativo (apenas admins)'
     )
@@ -973,6 +1169,9 @@ async def meu_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def cancelar(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Limpar TODOS os dados temporários
+    _cancelar_ocr_mascara(update.effective_user.id)
+    _descartar_finalizacao_previa(update.effective_user.id)
+    _descartar_imagens_sessao(context)
     context.user_data.clear()
     logger.info(f"Operação cancelada e memória limpa para usuário {update.effective_user.id}")
     await update.message.reply_text(
@@ -981,6 +1180,16 @@ async def cancelar(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return ConversationHandler.END
 
+async def conversa_expirada(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """ConversationHandler.TIMEOUT: conversa parada além do conversation_timeout. Libera as
+    imagens e os dados temporários, como o /cancelar (sem mensagem ao técnico)."""
+    _descartar_imagens_sessao(context)
+    context.user_data.clear()
+    if update.effective_user:
+        _cancelar_ocr_mascara(update.effective_user.id)
+        _descartar_finalizacao_previa(update.effective_user.id)
+        logger.info(f"Conversa expirada: memória limpa para usuário {update.effective_user.id}")
+
 async def receber_sa(update: Update, context: ContextTypes.DEFAULT_TYPE):
     sa = update.message.text.strip().upper()
     # Normalize SA: add prefix if just numeric
@@ -1001,56 +1210,40 @@ async def receber_sa(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return AGUARDANDO_GPON
 
 async def receber_print_autofill(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    photo = update.message.photo[-2] if len(update.message.photo) > 1 else update.message.photo[-1]
+    definir_usuario_ocr(update.effective_user.id)
     try:
-        file = await photo.get_file()
-    except Exception:
-        await update.message.reply_text('❌ Não consegui acessar a imagem. Envie novamente ou digite a SA.')
-        return AGUARDANDO_SA
-    image_bytes = None
-    try:
-        out = io.BytesIO()
-        await file.download_to_memory(out)
-        image_bytes = out.getvalue()
-    except Exception:
-        try:
-            if hasattr(file, 'download_as_bytearray'):
-                ba = await file.download_as_bytearray()
-                image_bytes = bytes(ba)
-        except Exception:
-            try:
-                tmp = f"tmp_{photo.file_unique_id}.jpg"
-                await file.download_to_drive(tmp)
-                with open(tmp, 'rb') as f:
-                    image_bytes = f.read()
-                try:
-                    os.remove(tmp)
-                except Exception:
-                    pass
-            except Exception:
-                pass
+        image_bytes = await _baixar_foto(update.message.photo)
+    except Exception as e:
+        logger.error(f"Falha ao baixar print do autofill: {e}")
+        image_bytes = None
     if not image_bytes:
         await update.message.reply_text('❌ Não consegui processar a imagem. Envie novamente (print recortado) ou digite a SA.')
         return AGUARDANDO_SA
-    imgs = context.user_data.get('autofill_images') or []
-    imgs.append(image_bytes)
-    context.user_data['autofill_images'] = imgs
+    hashes = context.user_data.setdefault('hashes_autofill', [])
+    # PIL (decodificar + redimensionar) fora do event loop
+    hash_foto = await asyncio.to_thread(hash_perceptual, image_bytes)
+    if imagem_repetida(hash_foto, hashes):
+        await update.message.reply_text('♻️ Esse print já foi enviado — ignorado. Envie outra aba ou digite a SA.')
+        return AGUARDANDO_SA
+    ref = await _guardar_imagem(update, image_bytes)
+    if not ref:
+        return AGUARDANDO_SA
+    hashes.append(hash_foto)
+    context.user_data.setdefault('autofill_images', []).append(ref)
+    imgs = await _imagens(_refs_imagens(context, 'autofill_images')[0])
     
     await context.bot.send_chat_action(chat_id=update.effective_chat.id, action=constants.ChatAction.TYPING)
     
-    data = await extrair_campos_por_imagens(imgs)
-    if not data.get('sa'):
-        d_sa = await extrair_campo_especifico(imgs, 'sa')
-        if d_sa.get('sa'):
-            data['sa'] = d_sa['sa']
-    if not data.get('gpon'):
-        d_gpon = await extrair_campo_especifico(imgs, 'gpon')
-        if d_gpon.get('gpon'):
-            data['gpon'] = d_gpon['gpon']
-    if not data.get('serial_do_modem'):
-        d_serial = await extrair_campo_especifico(imgs, 'serial_do_modem')
-        if d_serial.get('serial_do_modem'):
-            data['serial_do_modem'] = d_serial['serial_do_modem']
+    # Campos já lidos com confiança em prints anteriores não geram nova chamada
+    # nem entram no prompt deste print
+    anterior = context.user_data.get('autofill_ocr')
+    campos = como_resultado_ocr(anterior).campos_incertos(['sa', 'gpon', 'serial_do_modem']) + ['mesh'] if anterior else None
+    data = await extrair_campos_por_imagens(imgs, campos)
+    if anterior:
+        data = como_resultado_ocr(anterior).mesclar(data)
+    for campo in data.campos_incertos(['sa', 'gpon', 'serial_do_modem']):
+        data.mesclar(await extrair_campo_especifico(imgs, campo))
+    context.user_data['autofill_ocr'] = data
     # Não extrair mesh nesta etapa para evitar falsos positivos
     # data['mesh'] = []  <-- Removido para permitir preenchimento de mesh
     sa = data.get('sa')
@@ -1269,36 +1462,25 @@ async def receber_serial(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return AGUARDANDO_FOTOS
 
 async def receber_serial_por_foto(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    photo = update.message.photo[-2] if len(update.message.photo) > 1 else update.message.photo[-1]
-    image_bytes = None
+    definir_usuario_ocr(update.effective_user.id)
     try:
-        file = await photo.get_file()
-        out = io.BytesIO()
-        await file.download_to_memory(out)
-        image_bytes = out.getvalue()
-        if not image_bytes and hasattr(file, 'download_as_bytearray'):
-            ba = await file.download_as_bytearray()
-            image_bytes = bytes(ba)
-        if not image_bytes:
-            tmp = f"tmp_{photo.file_unique_id}.jpg"
-            await file.download_to_drive(tmp)
-            with open(tmp, 'rb') as f:
-                image_bytes = f.read()
-            try:
-                os.remove(tmp)
-            except Exception:
-                pass
+        image_bytes = await _baixar_foto(update.message.photo)
     except Exception as e:
         logger.error(f"Falha ao baixar foto do serial: {e}")
         await update.message.reply_text('❌ Não consegui processar a imagem. Envie novamente ou digite o serial.')
         return AGUARDANDO_SERIAL
-    imgs = context.user_data.get('autofill_images') or []
-    imgs.append(image_bytes)
-    context.user_data['autofill_images'] = imgs
+    ref = await _guardar_imagem(update, image_bytes)
+    if not ref:
+        return AGUARDANDO_SERIAL
+    context.user_data.setdefault('autofill_images', []).append(ref)
+    imgs = await _imagens(_refs_imagens(context, 'autofill_images')[0])
     
     await context.bot.send_chat_action(chat_id=update.effective_chat.id, action=constants.ChatAction.TYPING)
     
-    d = await extrair_campo_especifico(imgs, 'serial_do_modem')
+    # O print novo é o do serial: tenta só ele e recorre aos anteriores se a leitura for incerta
+    d = await extrair_campo_especifico(imgs[-1:], 'serial_do_modem', offset=len(imgs) - 1)
+    if d.campos_incertos(['serial_do_modem']) and len(imgs) > 1:
+        d.mesclar(await extrair_campo_especifico(imgs[:-1], 'serial_do_modem'))
     serial = d.get('serial_do_modem')
     if not serial or not is_valid_serial(serial):
         await update.message.reply_text('❌ Não consegui extrair o serial. Digite o número de série do modem.')
@@ -1347,32 +1529,18 @@ async def receber_serial_mesh(update: Update, context: ContextTypes.DEFAULT_TYPE
     return AGUARDANDO_FOTOS
 
 async def receber_serial_mesh_por_foto(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    photo = update.message.photo[-2] if len(update.message.photo) > 1 else update.message.photo[-1]
-    image_bytes = None
+    definir_usuario_ocr(update.effective_user.id)
     try:
-        file = await photo.get_file()
-        out = io.BytesIO()
-        await file.download_to_memory(out)
-        image_bytes = out.getvalue()
-        if not image_bytes and hasattr(file, 'download_as_bytearray'):
-            ba = await file.download_as_bytearray()
-            image_bytes = bytes(ba)
-        if not image_bytes:
-            tmp = f"tmp_{photo.file_unique_id}.jpg"
-            await file.download_to_drive(tmp)
-            with open(tmp, 'rb') as f:
-                image_bytes = f.read()
-            try:
-                os.remove(tmp)
-            except Exception:
-                pass
+        image_bytes = await _baixar_foto(update.message.photo)
     except Exception as e:
         logger.error(f"Falha ao baixar foto do mesh: {e}")
         await update.message.reply_text('❌ Não consegui processar a imagem. Envie novamente ou digite o serial mesh.')
         return AGUARDANDO_SERIAL_MESH
-    imgs = context.user_data.get('autofill_images') or []
-    imgs.append(image_bytes)
-    context.user_data['autofill_images'] = imgs
+    ref = await _guardar_imagem(update, image_bytes)
+    if not ref:
+        return AGUARDANDO_SERIAL_MESH
+    context.user_data.setdefault('autofill_images', []).append(ref)
+    imgs = await _imagens(_refs_imagens(context, 'autofill_images')[0])
     
     await context.bot.send_chat_action(chat_id=update.effective_chat.id, action=constants.ChatAction.TYPING)
     
@@ -1403,6 +1571,8 @@ async def receber_foto(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['fotos'].append(photo.file_id)
     
     num_fotos = len(context.user_data['fotos'])
+    if context.user_data.get('sa'):
+        _pre_verificar_finalizacao(update.message.from_user.id, context.user_data['sa'])
     
     if num_fotos < 3:
         await update.message.reply_text(
@@ -1420,14 +1590,94 @@ async def receber_foto(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
     return AGUARDANDO_FOTOS
 
+# ==================== PIPELINE DO FINALIZAR ====================
+# A consulta que não depende do insert (SA duplicada) roda a cada foto, enquanto
+# o técnico ainda envia as outras; o cadastro do técnico já vem do controle_acesso. No
+# /finalizar só falta o insert. Tarefas ficam fora do user_data (não são serializáveis),
+# indexadas pelo user_id; /cancelar e o timeout da conversa descartam a do técnico.
+_finalizacao_previa: Dict[int, Dict[str, Any]] = {}
+
+
+def _descartar_finalizacao_previa(user_id: int):
+    previa = _finalizacao_previa.pop(user_id, None)
+    if previa:
+        previa['tarefa'].cancel()
+
+
+def _pre_verificar_finalizacao(user_id: int, sa: str):
+    """Refaz a checagem a cada foto, para chegar fresca ao /finalizar; uma consulta ainda em
+    andamento para a mesma SA (fotos de um álbum chegando juntas) é aproveitada."""
+    previa = _finalizacao_previa.get(user_id)
+    if previa and previa['sa'] == sa and not previa['tarefa'].done():
+        return
+    _descartar_finalizacao_previa(user_id)
+    _finalizacao_previa[user_id] = {
+        'sa': sa, 'inicio': time.monotonic(), 'tarefa': asyncio.create_task(db.check_sa_exists(sa))
+    }
+
+
+async def _sa_ja_registrada(user_id: int, sa: str) -> bool:
+    """SA já existe — da pré-verificação se for da mesma SA e recente, senão consulta agora."""
+    previa = _finalizacao_previa.pop(user_id, None)
+    if previa and previa['sa'] == sa and time.monotonic() - previa['inicio'] <= FINALIZAR_PREVIA_TTL:
+        try:
+            return await previa['tarefa']
+        except Exception as e:
+            logger.warning(f"Pré-verificação do finalizar falhou, refazendo: {e}")
+    elif previa:
+        previa['tarefa'].cancel()
+    return await db.check_sa_exists(sa)
+
+
+async def _notificar_progresso(message, user_id: int, album_enviado: asyncio.Event):
+    """Mensagem de progresso/faixa do ciclo, calculada em segundo plano após o registro."""
+    try:
+        posicao = placar.posicao(user_id)
+        if posicao:
+            pontos_totais = posicao.pontos
+        else:
+            inicio, fim = ciclo_atual()
+            insts_ciclo = await db.get_installations({
+                'tecnico_id': user_id, 
+                'data_inicio': inicio, 
+                'data_fim': fim
+            })
+            pontos_totais = calcular_pontos(insts_ciclo)
+        msg_progresso = gerar_resumo_progresso(pontos_totais)
+        if posicao:
+            msg_progresso += f'\n🏅 *{posicao.posicao}º* de {posicao.total_tecnicos} no ranking do ciclo'
+            if posicao.falta_posicao > 0:
+                msg_progresso += f' (+{posicao.falta_posicao:.2f} pts para subir)'
+            msg_progresso += '\n'
+        
+        # Adicionar dica de encaminhamento
+        msg_progresso += "\n👆 _Dica: Segure nas fotos acima para encaminhar ao grupo!_"
+        
+        # Envia em mensagem separada usando Markdown V1 com botões de ação rápida
+        keyboard_acoes = [
+            [InlineKeyboardButton("📝 Nova Instalação", callback_data='registrar')],
+            [InlineKeyboardButton("🛠️ Novo Reparo", callback_data='registrar_reparo')],
+            [InlineKeyboardButton("🏠 Voltar ao Menu", callback_data='voltar')]
+        ]
+        reply_markup_acoes = InlineKeyboardMarkup(keyboard_acoes)
+        
+        # O cálculo corre junto com o envio do álbum; a mensagem só sai depois dele
+        await asyncio.wait_for(album_enviado.wait(), timeout=60)
+        await message.reply_text(msg_progresso, parse_mode='Markdown', reply_markup=reply_markup_acoes)
+    except Exception as e:
+        logger.error(f"Erro ao gerar notificacao de progresso: {e}")
+
+
 async def finalizar(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if 'sa' not in context.user_data or 'gpon' not in context.user_data:
         await update.message.reply_text('❌ Erro: Dados incompletos. Use /start para recomeçar.')
         return ConversationHandler.END
     
-    # Verificar SA duplicada
+    # Verificar SA duplicada (o cadastro do técnico já veio do controle_acesso)
     sa = context.user_data['sa']
-    if await db.check_sa_exists(sa):
+    user_id = update.message.from_user.id
+    sa_existe, user_data = await asyncio.gather(_sa_ja_registrada(user_id, sa), usuario_cadastrado(update, context))
+    if sa_existe:
         keyboard = [
             [InlineKeyboardButton("✅ Sim, registrar mesmo assim", callback_data=f"confirmar_sa_dup")],
             [InlineKeyboardButton("❌ Cancelar", callback_data="cancelar_registro")]
@@ -1439,9 +1689,6 @@ async def finalizar(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return AGUARDANDO_FOTOS
     
-    user_id = update.message.from_user.id
-    user_data = await db.get_user(str(user_id))
-    
     tecnico_nome = (f"{user_data.get('nome','')} {user_data.get('sobrenome','')}".strip() if user_data else (update.message.from_user.username or update.message.from_user.first_name))
     tecnico_regiao = (user_data.get('regiao') if user_data else None)
     
@@ -1524,52 +1771,35 @@ async def finalizar(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         summary_text = ''.join(msg_parts)
         
+        # Progresso do ciclo em segundo plano: a consulta ao banco corre junto com o álbum
+        album_enviado = asyncio.Event()
+        context.application.create_task(
+            _notificar_progresso(update.message, user_id, album_enviado), update=update
+        )
+
         # Enviar Album (Fotos + Caption) se houver fotos
         fotos_ids = nova_instalacao.get('fotos', [])
-        if fotos_ids:
-            media_group = []
-            for i, file_id in enumerate(fotos_ids):
-                # Apenas a primeira foto leva o caption
-                if i == 0:
-                    media_group.append(InputMediaPhoto(media=file_id, caption=summary_text, parse_mode='MarkdownV2'))
-                else:
-                    media_group.append(InputMediaPhoto(media=file_id))
-            
-            try:
-                await update.message.reply_media_group(media=media_group)
-            except Exception as e:
-                logger.error(f"Erro ao enviar album: {e}")
-                # Fallback se falhar album: envia texto normal
-                await update.message.reply_text(summary_text, parse_mode='MarkdownV2')
-        else:
-            # Sem fotos, envia só texto
-            await update.message.reply_text(summary_text, parse_mode='MarkdownV2')
-
-        # === NOTIFICAÇÃO DE PROGRESSO (QUASE LÁ) ===
         try:
-            inicio, fim = ciclo_atual()
-            insts_ciclo = await db.get_installations({
-                'tecnico_id': user_id, 
-                'data_inicio': inicio, 
-                'data_fim': fim
-            })
-            pontos_totais = calcular_pontos(insts_ciclo)
-            msg_progresso = gerar_resumo_progresso(pontos_totais)
-            
-            # Adicionar dica de encaminhamento
-            msg_progresso += "\n👆 _Dica: Segure nas fotos acima para encaminhar ao grupo!_"
-            
-            # Envia em mensagem separada usando Markdown V1 com botões de ação rápida
-            keyboard_acoes = [
-                [InlineKeyboardButton("📝 Nova Instalação", callback_data='registrar')],
-                [InlineKeyboardButton("🛠️ Novo Reparo", callback_data='registrar_reparo')],
-                [InlineKeyboardButton("🏠 Voltar ao Menu", callback_data='voltar')]
-            ]
-            reply_markup_acoes = InlineKeyboardMarkup(keyboard_acoes)
-            
-            await update.message.reply_text(msg_progresso, parse_mode='Markdown', reply_markup=reply_markup_acoes)
-        except Exception as e:
-            logger.error(f"Erro ao gerar notificacao de progresso: {e}")
+            if fotos_ids:
+                media_group = []
+                for i, file_id in enumerate(fotos_ids):
+                    # Apenas a primeira foto leva o caption
+                    if i == 0:
+                        media_group.append(InputMediaPhoto(media=file_id, caption=summary_text, parse_mode='MarkdownV2'))
+                    else:
+                        media_group.append(InputMediaPhoto(media=file_id))
+                
+                try:
+                    await update.message.reply_media_group(media=media_group)
+                except Exception as e:
+                    logger.error(f"Erro ao enviar album: {e}")
+                    # Fallback se falhar album: envia texto normal
+                    await update.message.reply_text(summary_text, parse_mode='MarkdownV2')
+            else:
+                # Sem fotos, envia só texto
+                await update.message.reply_text(summary_text, parse_mode='MarkdownV2')
+        finally:
+            album_enviado.set()
 
     else:
         keyboard = [[InlineKeyboardButton("🔄 Tentar Novamente", callback_data='retry_save')]]
@@ -1581,6 +1811,7 @@ async def finalizar(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return AGUARDANDO_FOTOS # Mantém no estado para retry
     
     # Limpar dados temporários para evitar memory leak
+    _descartar_imagens_sessao(context)
     context.user_data.clear()
     logger.info(f"Memória limpa para usuário {update.effective_user.id}")
     return ConversationHandler.END
@@ -1589,7 +1820,7 @@ async def finalizar_registro_forcado(update: Update, context: ContextTypes.DEFAU
     """Finaliza registro sem verificar SA duplicada (usado após confirmação do usuário)."""
     query = update.callback_query
     user_id = query.from_user.id
-    user_data = await db.get_user(str(user_id))
+    user_data = await usuario_cadastrado(update, context)
     
     tecnico_nome = (f"{user_data.get('nome','')} {user_data.get('sobrenome','')}".strip() if user_data else (query.from_user.username or query.from_user.first_name))
     tecnico_regiao = (user_data.get('regiao') if user_data else None)
@@ -1638,120 +1869,467 @@ async def finalizar_registro_forcado(update: Update, context: ContextTypes.DEFAU
     else:
         await query.message.reply_text('❌ Erro ao salvar no banco de dados.')
     
+    _descartar_imagens_sessao(context)
     context.user_data.clear()
     return ConversationHandler.END
 
-async def consultar(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    texto_busca = update.message.text.strip()
+# ==================== REGISTRO EM LOTE ====================
+# Várias SAs numa mensagem ou CSV/XLSX: tudo validado de uma vez, duplicatas numa
+# consulta só e um único insert após a confirmação. Sem fotos (o técnico que precisa
+# delas usa o fluxo normal).
+LOTE_PREVIA_MAX = 15
+LOTE_ERROS_MAX = 15
 
-    # Busca via ilike no banco (não carrega tudo em memória)
-    resultados = await db.get_installations({'termo_busca': texto_busca}, limit=20)
-    
-    if not resultados:
-        await update.message.reply_text(
-            f'❌ Nenhuma instalação encontrada para: `{texto_busca}`',
-            parse_mode='Markdown'
-        )
+
+def categoria_do_tipo(tipo: str, modo_registro: Optional[str]) -> str:
+    """Mesma regra do finalizar: o tipo decide; tipos ambíguos seguem o modo escolhido."""
+    if tipo in TIPOS_REPARO:
+        return 'reparo'
+    if tipo in TIPOS_INSTALACAO:
+        return 'instalacao'
+    return modo_registro or 'instalacao'
+
+
+async def comando_lote(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/lote (instalações) ou /lote reparo."""
+    modo = 'reparo' if context.args and context.args[0].lower().startswith('rep') else 'instalacao'
+    _descartar_imagens_sessao(context)
+    context.user_data.clear()
+    context.user_data['modo_registro'] = modo
+    titulo = '🛠️ *Reparos em Lote*' if modo == 'reparo' else '📝 *Instalações em Lote*'
+    await update.message.reply_text(
+        f'{titulo}\n\n'
+        'Envie uma SA por linha: `SA; GPON; tipo; serial modem; seriais mesh`\n'
+        '```\n'
+        '12345678; ABCD1234; instalacao; ZTEGC8123456\n'
+        '12345679; ABCD1235; instalacao_mesh; ZTEGC8123457; ZTEGC8999999\n'
+        '```\n'
+        f'📎 Ou envie um arquivo *CSV/XLSX* com essas colunas (cabeçalho opcional). Até {LOTE_MAX_LINHAS} SAs.\n\n'
+        '🧩 Tipos: instalacao, instalacao\\_tv, instalacao\\_mesh, instalacao\\_fttr, mudanca\\_endereco, '
+        'defeito\\_banda\\_larga, defeito\\_linha, defeito\\_tv, retirada, servicos\n'
+        + ('💡 Reparo sem serial = ONT não trocada.\n' if modo == 'reparo' else '') +
+        '\n_(Digite /cancelar para voltar)_',
+        parse_mode='Markdown'
+    )
+    return AGUARDANDO_LOTE
+
+
+async def receber_lote(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    return await _processar_lote(update, context, registro_lote.ler_texto(update.message.text))
+
+
+async def receber_lote_arquivo(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    documento = update.message.document
+    nome = (documento.file_name or '').lower()
+    if not nome.endswith(('.csv', '.txt', '.xlsx')):
+        await update.message.reply_text('❌ Envie um arquivo .csv ou .xlsx (ou cole as linhas na mensagem).')
+        return AGUARDANDO_LOTE
+    if documento.file_size and documento.file_size > LOTE_ARQUIVO_MAX_KB * 1024:
+        await update.message.reply_text(f'❌ Arquivo muito grande (máximo {LOTE_ARQUIVO_MAX_KB} KB).')
+        return AGUARDANDO_LOTE
+
+    try:
+        dados = bytes(await (await documento.get_file()).download_as_bytearray())
+        leitor = registro_lote.ler_xlsx if nome.endswith('.xlsx') else registro_lote.ler_csv
+        # openpyxl/csv são síncronos: fora do event loop
+        linhas = await asyncio.to_thread(leitor, dados)
+    except ImportError:
+        await update.message.reply_text('❌ Leitura de XLSX indisponível no servidor. Salve a planilha como CSV e envie de novo.')
+        return AGUARDANDO_LOTE
+    except Exception as e:
+        logger.error(f"[LOTE] Falha ao ler {nome} de {update.effective_user.id}: {e}")
+        await update.message.reply_text('❌ Não consegui ler o arquivo. Confira o formato e envie de novo.')
+        return AGUARDANDO_LOTE
+    return await _processar_lote(update, context, linhas)
+
+
+def _linhas_erro(erros: List[str]) -> str:
+    texto = '\n'.join(e.replace('`', "'") for e in erros[:LOTE_ERROS_MAX])
+    if len(erros) > LOTE_ERROS_MAX:
+        texto += f'\n... e mais {len(erros) - LOTE_ERROS_MAX}'
+    return f'```\n{texto}\n```'
+
+
+async def _processar_lote(update: Update, context: ContextTypes.DEFAULT_TYPE, linhas: List[Dict[str, str]]):
+    modo = context.user_data.get('modo_registro') or 'instalacao'
+    validas, erros = registro_lote.validar_linhas(
+        linhas, lambda tipo: categoria_do_tipo(tipo, modo), LOTE_MAX_LINHAS
+    )
+
+    existentes = await db.sas_existentes([r['sa'] for r in validas]) if validas else set()
+    if existentes is None:
+        await update.message.reply_text('❌ Não consegui verificar SAs duplicadas agora. Tente novamente em instantes.')
+        return AGUARDANDO_LOTE
+    if existentes:
+        erros.extend(f"Linha {r['linha']}: {r['sa']} já registrada" for r in validas if r['sa'] in existentes)
+        validas = [r for r in validas if r['sa'] not in existentes]
+
+    logger.info(f"[LOTE] Usuário {update.effective_user.id}: {len(validas)} válidas, {len(erros)} erros")
+    if not validas:
+        msg = '❌ *Nenhuma SA válida no lote.*\n\n'
+        if erros:
+            msg += _linhas_erro(erros) + '\n\n'
+        msg += 'Corrija e envie de novo, ou /cancelar.'
+        await update.message.reply_text(msg, parse_mode='Markdown')
+        return AGUARDANDO_LOTE
+
+    # Só dados simples no user_data (persistível); a confirmação grava estes registros
+    context.user_data['lote'] = validas
+    pontos = calcular_pontos([Instalacao.de_linha(r) for r in validas])
+    previa = '\n'.join(
+        f"{r['sa']} | {r['tipo']} | {r.get('serial_modem', '-')}" for r in validas[:LOTE_PREVIA_MAX]
+    )
+    if len(validas) > LOTE_PREVIA_MAX:
+        previa += f'\n... e mais {len(validas) - LOTE_PREVIA_MAX}'
+    msg = (
+        f'📦 *Lote pronto: {len(validas)} SA(s)* (+{pontos:.2f} pts)\n\n'
+        f'```\n{previa}\n```'
+    )
+    if erros:
+        msg += f'\n\n⚠️ *{len(erros)} linha(s) ignorada(s):*\n' + _linhas_erro(erros)
+    keyboard = [
+        [InlineKeyboardButton(f"✅ Registrar {len(validas)}", callback_data='lote_confirmar')],
+        [InlineKeyboardButton("❌ Cancelar", callback_data='lote_cancelar')]
+    ]
+    await update.message.reply_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
+    return AGUARDANDO_LOTE
+
+
+async def confirmar_lote(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Botões lote_confirmar/lote_cancelar (chegam pelo button_callback, que já respondeu o query)."""
+    query = update.callback_query
+    lote = context.user_data.get('lote')
+
+    if query.data == 'lote_cancelar' or not lote:
+        context.user_data.clear()
+        await query.edit_message_text('❌ Lote cancelado.' if lote else '⚠️ Lote expirado. Use /lote para começar de novo.')
         return ConversationHandler.END
+
+    keyboard_erro = InlineKeyboardMarkup([
+        [InlineKeyboardButton("🔄 Tentar Novamente", callback_data='lote_confirmar')],
+        [InlineKeyboardButton("❌ Cancelar", callback_data='lote_cancelar')]
+    ])
+    # Refaz a checagem de duplicatas: entre a prévia e o confirmar alguém pode ter
+    # registrado as mesmas SAs (outro técnico, o passo a passo ou um segundo clique)
+    existentes = await db.sas_existentes([r['sa'] for r in lote])
+    if existentes is None:
+        await query.edit_message_text('❌ Não consegui verificar SAs duplicadas agora. Nada foi registrado.', reply_markup=keyboard_erro)
+        return AGUARDANDO_LOTE
+    duplicadas = [r['sa'] for r in lote if r['sa'] in existentes]
+    if duplicadas:
+        lote = [r for r in lote if r['sa'] not in existentes]
+        context.user_data['lote'] = lote
+        logger.info(f"[LOTE] {len(duplicadas)} SA(s) registradas desde a prévia: {duplicadas}")
+        if not lote:
+            context.user_data.clear()
+            await query.edit_message_text('⚠️ Todas as SAs do lote já foram registradas. Nada foi gravado.')
+            return ConversationHandler.END
+
+    user_data = await usuario_cadastrado(update, context)
+    tecnico_nome = (f"{user_data.get('nome','')} {user_data.get('sobrenome','')}".strip() if user_data else (query.from_user.username or query.from_user.first_name))
+    tecnico_regiao = (user_data.get('regiao') if user_data else None)
+    agora = datetime.now(TZ).isoformat()
+
+    registros = []
+    for r in lote:
+        registro = {
+            'sa': r['sa'],
+            'gpon': r['gpon'],
+            'tipo': r['tipo'],
+            'categoria': r['categoria'],
+            'fotos': [],
+            'tecnico_id': query.from_user.id,
+            'tecnico_nome': tecnico_nome,
+            'tecnico_regiao': tecnico_regiao,
+            'serial_modem': r.get('serial_modem'),
+            'serial_mesh': r.get('serial_mesh'),
+            'data': agora
+        }
+        registros.append({k: v for k, v in registro.items() if v is not None})
+
+    if not await db.save_installations(registros):
+        await query.edit_message_text('❌ Erro ao salvar o lote. Nada foi registrado.', reply_markup=keyboard_erro)
+        return AGUARDANDO_LOTE
+
+    logger.info(f"✅ [LOTE] {len(registros)} registros salvos por {query.from_user.id}")
+    context.user_data.clear()
+    msg = (
+        f'✅ *{len(registros)} SA(s) registrada(s)!*\n'
+        f'📈 +{calcular_pontos([Instalacao.de_linha(r) for r in registros]):.2f} pts na produção do ciclo'
+    )
+    if duplicadas:
+        msg += f'\n\n⚠️ {len(duplicadas)} já registrada(s) desde a prévia, ignorada(s):\n' + _linhas_erro(duplicadas)
+    await query.edit_message_text(msg, parse_mode='Markdown')
+    return ConversationHandler.END
+
+
+def _tipo_consulta(resultado: Dict[str, Any]) -> str:
+    # tipo pode vir NULL do banco (registros antigos)
+    return (resultado.get('tipo') or 'instalacao').replace('_', ' ').title()
+
+
+def _texto_consulta(resultado: Dict[str, Any]) -> str:
+    """Texto (Markdown simples) de um resultado da consulta."""
+    tipo = _tipo_consulta(resultado)
+    tecnico = resultado.get('tecnico_nome', 'N/A')
+    data = format_data(resultado.get('data', ''))
+    serial = resultado.get('serial_modem', '')
+    # Fix: key is 'serial_mesh', not 'mesh'
+    mesh_text = resultado.get('serial_mesh', '')
+    mesh_list = []
+    if mesh_text:
+        # Split if multiple mesh serials separated by comma or space
+        mesh_list = [m.strip() for m in mesh_text.replace(',', ' ').split() if m.strip()]
     
-    # Limitar resultados para evitar spam
-    MAX_RESULTADOS = 5
-    total = len(resultados)
+    msg = (
+        f'📋 *SA:* `{resultado["sa"]}`\n'
+        f'🔗 *GPON:* `{resultado["gpon"]}`\n'
+    )
     
-    if total > MAX_RESULTADOS:
-        await update.message.reply_text(
-            f'🔍 Encontradas *{total} instalações*\n'
-            f'Mostrando as primeiras {MAX_RESULTADOS}.\n'
-            f'💡 _Seja mais específico para refinar a busca._',
-            parse_mode='Markdown'
-        )
-        resultados = resultados[:MAX_RESULTADOS]
+    if serial:
+        msg += f'📟 *Serial Modem:* `{serial}`\n'
     
+    if mesh_list:
+        mesh_text = ', '.join([f'`{m}`' for m in mesh_list[:3]])
+        if len(mesh_list) > 3:
+            mesh_text += f' (+{len(mesh_list)-3})'
+        msg += f'📶 *Mesh:* {mesh_text}\n'
+    
+    msg += (
+        f'🧩 *Tipo:* {tipo}\n'
+        f'👤 *Técnico:* {tecnico}\n'
+        f'📅 *Data:* {data}\n'
+        f'📸 *Fotos:* {len(resultado.get("fotos", []))}'
+    )
+    return msg
+
+
+def _texto_consulta_simples(resultado: Dict[str, Any]) -> str:
+    """Fallback sem formatação (Markdown quebrado por caractere especial no banco)."""
+    return (
+        f'SA: {resultado["sa"]}\n'
+        f'GPON: {resultado["gpon"]}\n'
+        f'Tipo: {_tipo_consulta(resultado)}\n'
+        f'Técnico: {resultado.get("tecnico_nome", "N/A")}\n'
+        f'Data: {format_data(resultado.get("data", ""))}'
+    )
+
+
+async def _enviar_resultado_consulta(message, resultado: Dict[str, Any], fotos: List[str]):
+    """Um álbum por resultado: 1 chamada em vez de texto + 1 por foto (foto única vai com
+    reply_photo, o sendMediaGroup só aceita de 2 a 10 itens)."""
+    async def enviar(caption, parse_mode):
+        if len(fotos) == 1:
+            await message.reply_photo(photo=fotos[0], caption=caption, parse_mode=parse_mode)
+            return
+        await message.reply_media_group(media=[
+            InputMediaPhoto(media=foto_id, caption=caption, parse_mode=parse_mode) if i == 0 else InputMediaPhoto(media=foto_id)
+            for i, foto_id in enumerate(fotos)
+        ])
+    try:
+        await enviar(_texto_consulta(resultado), 'Markdown')
+        return
+    except Exception as e:
+        logger.error(f"Erro ao enviar fotos da consulta (SA {resultado.get('sa')}): {e}")
+    try:
+        await enviar(_texto_consulta_simples(resultado), None)
+    except Exception as e:
+        # file_id inválido/expirado: pelo menos o texto chega
+        logger.error(f"Erro ao enviar fotos da consulta: {e}")
+        await message.reply_text(_texto_consulta_simples(resultado))
+
+
+async def _enviar_resultados_sem_foto(message, resultados: List[Dict[str, Any]]):
+    """Resultados sem fotos numa única mensagem (dentro do limite de 4096 caracteres)."""
+    blocos, atual = [], ''
     for resultado in resultados:
-        # Construir mensagem com Markdown simples
-        tipo = resultado.get('tipo', 'instalacao').replace('_', ' ').title()
-        tecnico = resultado.get('tecnico_nome', 'N/A')
-        data = format_data(resultado.get('data', ''))
-        serial = resultado.get('serial_modem', '')
-        # Fix: key is 'serial_mesh', not 'mesh'
-        mesh_text = resultado.get('serial_mesh', '')
-        mesh_list = []
-        if mesh_text:
-            # Split if multiple mesh serials separated by comma or space
-            mesh_list = [m.strip() for m in mesh_text.replace(',', ' ').split() if m.strip()]
-        
-        msg = (
-            f'📋 *SA:* `{resultado["sa"]}`\n'
-            f'🔗 *GPON:* `{resultado["gpon"]}`\n'
-        )
-        
-        if serial:
-            msg += f'📟 *Serial Modem:* `{serial}`\n'
-        
-        if mesh_list:
-            mesh_text = ', '.join([f'`{m}`' for m in mesh_list[:3]])
-            if len(mesh_list) > 3:
-                mesh_text += f' (+{len(mesh_list)-3})'
-            msg += f'📶 *Mesh:* {mesh_text}\n'
-        
-        msg += (
-            f'🧩 *Tipo:* {tipo}\n'
-            f'👤 *Técnico:* {tecnico}\n'
-            f'📅 *Data:* {data}\n'
-            f'📸 *Fotos:* {len(resultado.get("fotos", []))}'
-        )
-        
+        texto = _texto_consulta(resultado)
+        if atual and len(atual) + len(texto) + 2 > 4000:
+            blocos.append(atual)
+            atual = ''
+        atual = f'{atual}\n\n{texto}' if atual else texto
+    blocos.append(atual)
+    for bloco in blocos:
         try:
-            await update.message.reply_text(msg, parse_mode='Markdown')
+            await message.reply_text(bloco, parse_mode='Markdown')
         except Exception as e:
             logger.error(f"Erro ao enviar mensagem de consulta: {e}")
-            # Fallback sem formatação
-            await update.message.reply_text(
-                f'SA: {resultado["sa"]}\n'
-                f'GPON: {resultado["gpon"]}\n'
-                f'Tipo: {tipo}\n'
-                f'Técnico: {tecnico}\n'
-                f'Data: {format_data(resultado.get("data", ""))}'
-            )
-        
-        # Enviar as fotos
+            await message.reply_text('\n\n'.join(_texto_consulta_simples(r) for r in resultados))
+            return
+
+
+async def _enviar_pagina_consulta(message, resultados: List[Dict[str, Any]]):
+    """Cada resultado com fotos vira um álbum (texto no caption da 1ª foto); resultados sem
+    foto seguidos vão juntos numa mensagem só. Os envios saem um a um, na ordem da busca
+    (mais recentes primeiro) — o limitador por chat já não deixaria paralelizar muito."""
+    sem_foto = []
+    for resultado in resultados:
         fotos = resultado.get('fotos', [])
-        if fotos:
-            # Enviar no máximo 3 fotos por consulta
-            for foto_id in fotos[:3]:
-                try:
-                    await update.message.reply_photo(photo=foto_id)
-                except Exception as e:
-                    logger.error(f"Erro ao enviar foto: {e}")
-                    
+        if not fotos:
+            sem_foto.append(resultado)
+            continue
+        try:
+            if sem_foto:
+                await _enviar_resultados_sem_foto(message, sem_foto)
+                sem_foto = []
+            await _enviar_resultado_consulta(message, resultado, fotos[:3])
+        except Exception as e:
+            logger.error(f"Erro ao enviar resultado da consulta: {e}")
+    if sem_foto:
+        try:
+            await _enviar_resultados_sem_foto(message, sem_foto)
+        except Exception as e:
+            logger.error(f"Erro ao enviar resultado da consulta: {e}")
+
+
+# Paginação da consulta: o botão carrega o cursor (id do último registro mostrado), então
+# cada página busca só as linhas que exibe. callback_data: "cq|<página>|<id base36>|<termo>";
+# termo longo demais para os 64 bytes fica no user_data.
+CONSULTA_POR_PAGINA = 5
+
+
+def _callback_pagina_consulta(context, pagina: int, ultimo_id: int, termo: str) -> str:
+    dados = f"cq|{pagina}|{_base36(ultimo_id)}|{termo}"
+    if len(dados.encode()) <= 64:
+        return dados
+    context.user_data['consulta_termo'] = termo
+    return f"cq|{pagina}|{_base36(ultimo_id)}|"
+
+
+def _base36(n: int) -> str:
+    digitos = '0123456789abcdefghijklmnopqrstuvwxyz'
+    texto = ''
+    while True:
+        n, r = divmod(n, 36)
+        texto = digitos[r] + texto
+        if not n:
+            return texto
+
+
+async def _mostrar_pagina_consulta(message, context, termo: str, pagina: int, antes_de_id: Optional[int] = None) -> int:
+    """Envia uma página e, se houver mais, o botão da próxima. Retorna quantos resultados mostrou."""
+    # Um a mais só para saber se existe próxima página
+    resultados = await db.buscar_instalacoes(termo, limit=CONSULTA_POR_PAGINA + 1, antes_de_id=antes_de_id)
+    tem_mais = len(resultados) > CONSULTA_POR_PAGINA
+    resultados = resultados[:CONSULTA_POR_PAGINA]
+    if not resultados:
+        return 0
+
+    await _enviar_pagina_consulta(message, resultados)
+
+    if tem_mais or pagina > 1:
+        inicio = (pagina - 1) * CONSULTA_POR_PAGINA + 1
+        fim = inicio + len(resultados) - 1
+        keyboard = None
+        if tem_mais:
+            keyboard = InlineKeyboardMarkup([[InlineKeyboardButton(
+                f"➡️ Próximos {CONSULTA_POR_PAGINA}",
+                callback_data=_callback_pagina_consulta(context, pagina + 1, resultados[-1]['id'], termo)
+            )]])
+        await message.reply_text(
+            f'🔍 Resultados {inicio}–{fim} para `{termo}`' + ('' if tem_mais else '\n✅ _Fim dos resultados._'),
+            reply_markup=keyboard,
+            parse_mode='Markdown'
+        )
+    return len(resultados)
+
+
+async def consultar(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    texto_busca = update.message.text.strip()
+
+    # Busca via ilike no banco, só a primeira página
+    if not await _mostrar_pagina_consulta(update.message, context, texto_busca, pagina=1):
+        await update.message.reply_text(
+            f'❌ Nenhuma instalação encontrada para: `{texto_busca}`',
+            parse_mode='Markdown'
+        )
     return ConversationHandler.END
 
+
+async def consulta_pagina_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Botão "Próximos" da consulta (fora do ConversationHandler)."""
+    query = update.callback_query
+    await query.answer()
+    try:
+        _, pagina, cursor, termo = query.data.split('|', 3)
+        pagina, antes_de_id = int(pagina), int(cursor, 36)
+    except ValueError:
+        return
+    termo = termo or context.user_data.get('consulta_termo', '')
+    if not termo:
+        await query.message.reply_text('⚠️ Consulta expirada. Use /consultar novamente.')
+        return
+    # Tira o botão da página anterior para não ser clicado de novo
+    try:
+        await query.edit_message_reply_markup(reply_markup=None)
+    except Exception:
+        pass
+    if not await _mostrar_pagina_consulta(query.message, context, termo, pagina, antes_de_id):
+        await query.message.reply_text('✅ Não há mais resultados.')
+
+
+# ==================== CONSULTA INLINE ====================
+# "@bot termo" em qualquer chat: resultados prontos para colar no grupo da equipe, sem
+# passar pelo ConversationHandler. Buscas repetidas (vários técnicos procurando a mesma
+# SA) saem do cache local; o Telegram ainda guarda cada resposta por INLINE_CACHE_TIME.
+INLINE_TERMO_MINIMO = 3
+_cache_inline: TTLCache = TTLCache(maxsize=INLINE_CACHE_MAX, ttl=INLINE_CACHE_TTL)
+
+
+async def _buscar_inline(termo: str) -> List[Dict[str, Any]]:
+    chave = termo.upper()
+    if chave in _cache_inline:
+        return _cache_inline[chave]
+    resultados = await db.buscar_instalacoes(termo, limit=INLINE_MAX_RESULTADOS)
+    _cache_inline[chave] = resultados
+    return resultados
+
+
+async def consulta_inline(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    inline_query = update.inline_query
+    termo = inline_query.query.strip()
+
+    # Só técnicos cadastrados (bloqueados/pendentes já pararam no controle_acesso)
+    if not await usuario_cadastrado(update, context):
+        await inline_query.answer([], cache_time=INLINE_CACHE_TIME, is_personal=True)
+        return
+
+    if len(termo) < INLINE_TERMO_MINIMO:
+        await inline_query.answer([], cache_time=INLINE_CACHE_TIME, is_personal=True)
+        return
+
+    resultados = await _buscar_inline(termo)
+    artigos = []
+    for resultado in resultados:
+        tipo = _tipo_consulta(resultado)
+        artigos.append(InlineQueryResultArticle(
+            id=str(resultado.get('id') or resultado['sa'])[:64],
+            title=f'{resultado["sa"]} · {tipo}',
+            description=(
+                f'GPON {resultado.get("gpon", "")} · {resultado.get("tecnico_nome", "N/A")} · '
+                f'{format_data(resultado.get("data", ""))}'
+            ),
+            # Sem parse_mode: no inline não há como refazer o envio se um '_', '*' ou '`' vindo
+            # do banco quebrar o Markdown (o answerInlineQuery inteiro falharia)
+            input_message_content=InputTextMessageContent(_texto_consulta_simples(resultado))
+        ))
+
+    # is_personal: o acesso é por técnico, o cache do Telegram não pode servir a outro usuário
+    await inline_query.answer(artigos, cache_time=INLINE_CACHE_TIME, is_personal=True)
+
+
 async def comando_consultar(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    tem_acesso, msg_erro = await verificar_acesso_usuario(update.message.from_user.id)
-    if not tem_acesso:
-        await update.message.reply_text(msg_erro, parse_mode='Markdown')
-        return ConversationHandler.END
-    
     await update.message.reply_text('🔎 Digite o SA, GPON ou Serial do Modem para buscar:')
     return AGUARDANDO_CONSULTA
 
 async def comando_reparo(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    tem_acesso, msg_erro = await verificar_acesso_usuario(update.message.from_user.id)
-    if not tem_acesso:
-        await update.message.reply_text(msg_erro, parse_mode='Markdown')
-        return ConversationHandler.END
-    
+    _limpar_autofill(context)
     context.user_data['modo_registro'] = 'reparo'
     logger.info(f"Usuário {update.message.from_user.id} iniciou REPARO via comando /reparo")
     await update.message.reply_text('🛠️ *Novo Reparo*\nEnvie o *número da SA:*', parse_mode='Markdown')
     return AGUARDANDO_SA
 
 async def comando_producao(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    tem_acesso, msg_erro = await verificar_acesso_usuario(update.message.from_user.id)
-    if not tem_acesso:
-        await update.message.reply_text(msg_erro, parse_mode='Markdown')
-        return
-    
     # Atalho para produção
     user_id = update.message.from_user.id
     username = update.message.from_user.username or "User"
@@ -1762,11 +2340,6 @@ async def comando_producao(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def comando_mensal(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Comando /mensal - Relatório do mês atual"""
-    tem_acesso, msg_erro = await verificar_acesso_usuario(update.message.from_user.id)
-    if not tem_acesso:
-        await update.message.reply_text(msg_erro, parse_mode='Markdown')
-        return
-    
     from reports import gerar_relatorio_mensal
     agora = datetime.now(TZ)
     inicio_mes = agora.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
@@ -1776,11 +2349,6 @@ async def comando_mensal(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def comando_semanal(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Comando /semanal - Relatório da semana atual"""
-    tem_acesso, msg_erro = await verificar_acesso_usuario(update.message.from_user.id)
-    if not tem_acesso:
-        await update.message.reply_text(msg_erro, parse_mode='Markdown')
-        return
-    
     from reports import gerar_relatorio_semanal
     from datetime import timedelta
     agora = datetime.now(TZ)
@@ -1791,11 +2359,6 @@ async def comando_semanal(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def comando_hoje(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Comando /hoje - Relatório de hoje"""
-    tem_acesso, msg_erro = await verificar_acesso_usuario(update.message.from_user.id)
-    if not tem_acesso:
-        await update.message.reply_text(msg_erro, parse_mode='Markdown')
-        return
-    
     from reports import gerar_relatorio_hoje
     agora = datetime.now(TZ)
     inicio_hoje = agora.replace(hour=0, minute=0, second=0, microsecond=0)
@@ -3,6 +3,7 @@ from threading import Thread
 import os
 import logging
 from datetime import datetime
+from uso_ocr import uso_ocr
 
 app = Flask('')
 
@@ -22,30 +23,49 @@ def home():
     """Endpoint principal - health check básico"""
     return "✅ Bot Técnico está ativo!", 200
 
-@app.route('/health')
-def health():
-    """Endpoint de health check detalhado"""
+def dados_health():
+    """Payload do health check (usado pelo Flask e pelo servidor do modo webhook)"""
     uptime = (datetime.now() - start_time).total_seconds()
-    
-    return jsonify({
+    return {
         'status': 'healthy' if health_status['bot_running'] else 'starting',
         'bot_running': health_status['bot_running'],
         'database_connected': health_status['database_connected'],
         'uptime_seconds': uptime,
         'last_update': health_status['last_update'],
         'timestamp': datetime.now().isoformat()
-    }), 200
+    }
 
-@app.route('/metrics')
-def metrics():
-    """Endpoint de métricas básicas"""
+def dados_metrics():
+    """Payload de métricas (usado pelo Flask e pelo servidor do modo webhook)"""
     uptime = (datetime.now() - start_time).total_seconds()
-    
-    return jsonify({
+    try:
+        from utils import roteador_ocr
+        provedores = roteador_ocr.resumo()
+    except Exception:
+        provedores = {}
+    try:
+        from armazem_imagens import armazem_imagens
+        imagens = armazem_imagens.resumo()
+    except Exception:
+        imagens = {}
+    return {
         'uptime_seconds': uptime,
         'start_time': start_time.isoformat(),
-        'current_time': datetime.now().isoformat()
-    }), 200
+        'current_time': datetime.now().isoformat(),
+        'ocr_uso': uso_ocr.resumo(),
+        'ocr_provedores': provedores,
+        'imagens_sessao': imagens
+    }
+
+@app.route('/health')
+def health():
+    """Endpoint de health check detalhado"""
+    return jsonify(dados_health()), 200
+
+@app.route('/metrics')
+def metrics():
+    """Endpoint de métricas básicas"""
+    return jsonify(dados_metrics()), 200
 
 def update_health_status(bot_running=None, database_connected=None):
     """Atualizar status de saúde do bot"""
@@ -0,0 +1,135 @@
+"""
+Limitador único das chamadas de saída à Bot API, ligado ao Application.
+
+Todas as chamadas com chat_id (mensagens, álbuns, edições, enquetes, broadcast) passam
+por aqui: limite global do bot, limite por chat (grupos têm limite por minuto) e duas
+faixas de prioridade — respostas interativas passam na frente dos envios em massa,
+que além disso usam só parte do limite global. RetryAfter do Telegram pausa todo o
+bot pelo tempo pedido e a chamada é repetida automaticamente.
+
+Envios em massa marcam a faixa com rate_limit_args=PRIORIDADE_LOTE.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Coroutine, Deque, Dict, Optional
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+PRIORIDADE_LOTE = 'lote'
+
+
+class _Janela:
+    """Janela deslizante: no máximo `maximo` eventos a cada `periodo` segundos."""
+
+    def __init__(self, maximo: int, periodo: float):
+        self.maximo = maximo
+        self.periodo = periodo
+        self._eventos: Deque[float] = deque()
+
+    def espera(self, agora: float) -> float:
+        while self._eventos and agora - self._eventos[0] >= self.periodo:
+            self._eventos.popleft()
+        if len(self._eventos) < self.maximo:
+            return 0.0
+        return self.periodo - (agora - self._eventos[0])
+
+    def consumir(self, agora: float):
+        self._eventos.append(agora)
+
+    def ociosa(self, agora: float) -> bool:
+        return not self._eventos or agora - self._eventos[-1] >= self.periodo
+
+
+class LimitadorEnvios(BaseRateLimiter[str]):
+    def __init__(self, por_segundo: int = 30, lote_por_segundo: int = 20,
+                 chat_por_segundo: int = 3, grupo_por_minuto: int = 20, max_retries: int = 3):
+        self._global = _Janela(por_segundo, 1.0)
+        self._lote = _Janela(lote_por_segundo, 1.0)
+        self._chat_por_segundo = chat_por_segundo
+        self._grupo_por_minuto = grupo_por_minuto
+        self._chats: Dict[int, _Janela] = {}
+        self._max_retries = max_retries
+        # Interativos aguardando vaga: enquanto houver, a faixa de lote não avança
+        self._interativos_esperando = 0
+        self._pausa_ate = 0.0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _janela_chat(self, chat_id: int) -> _Janela:
+        janela = self._chats.get(chat_id)
+        if janela is None:
+            if len(self._chats) > 1000:
+                agora = time.monotonic()
+                for cid in [c for c, j in self._chats.items() if j.ociosa(agora)]:
+                    del self._chats[cid]
+            # chat_id negativo = grupo/canal (limite do Telegram por minuto)
+            janela = _Janela(self._grupo_por_minuto, 60.0) if chat_id < 0 else _Janela(self._chat_por_segundo, 1.0)
+            self._chats[chat_id] = janela
+        return janela
+
+    async def _aguardar_vez(self, chat_id: Optional[int], lote: bool):
+        if not lote:
+            self._interativos_esperando += 1
+        try:
+            while True:
+                agora = time.monotonic()
+                janela_chat = self._janela_chat(chat_id) if chat_id is not None else None
+                espera = max(
+                    self._pausa_ate - agora,
+                    self._global.espera(agora),
+                    janela_chat.espera(agora) if janela_chat else 0.0,
+                    self._lote.espera(agora) if lote else 0.0,
+                )
+                if lote and self._interativos_esperando:
+                    espera = max(espera, 0.05)
+                if espera <= 0:
+                    self._global.consumir(agora)
+                    if janela_chat:
+                        janela_chat.consumir(agora)
+                    if lote:
+                        self._lote.consumir(agora)
+                    return
+                await asyncio.sleep(espera)
+        finally:
+            if not lote:
+                self._interativos_esperando -= 1
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[str],
+    ) -> Any:
+        chat_id = data.get('chat_id')
+        limitar = chat_id is not None
+        if isinstance(chat_id, str):
+            # @canal: não dá para saber o tipo; conta só no limite global
+            chat_id = int(chat_id) if chat_id.lstrip('-').isdigit() else None
+        lote = rate_limit_args == PRIORIDADE_LOTE
+
+        for tentativa in range(self._max_retries + 1):
+            if limitar:
+                await self._aguardar_vez(chat_id, lote)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if tentativa >= self._max_retries:
+                    raise
+                segundos = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else float(e.retry_after)
+                # Flood limit vale para o bot todo: pausa todas as faixas
+                self._pausa_ate = max(self._pausa_ate, time.monotonic() + segundos + 0.1)
+                logger.warning(f"[Envios] RetryAfter em {endpoint} (chat {chat_id}): pausando {segundos:.1f}s")
+                if not limitar:
+                    await asyncio.sleep(segundos + 0.1)
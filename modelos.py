@@ -0,0 +1,68 @@
+"""
+Registro tipado das instalações lidas do banco.
+
+O get_installations devolve Instalacao em vez do dict cru do Supabase: a data é
+interpretada uma única vez (ISO ou BR legado), o tipo chega normalizado e os pontos e
+o dia local já vêm calculados. Relatórios, ranking e handlers leem os atributos em vez
+de repetir parse_data/PONTOS_SERVICO a cada uso da mesma linha.
+"""
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+from config import PONTOS_SERVICO, TZ
+from utils import parse_data
+
+# Pontos de tipos fora da tabela (registros antigos/tipos novos ainda não pontuados)
+PONTOS_PADRAO = 1.0
+
+
+@dataclass(slots=True)
+class Instalacao:
+    sa: str
+    gpon: str
+    tipo: str
+    pontos: float
+    data: str
+    dt: Optional[datetime]
+    dia: Optional[date]
+    tecnico_id: Optional[int] = None
+    tecnico_nome: str = 'Desconhecido'
+    tecnico_regiao: Optional[str] = None
+    categoria: Optional[str] = None
+    serial_modem: Optional[str] = None
+    serial_mesh: Optional[str] = None
+    fotos: List[str] = field(default_factory=list)
+    id: Optional[int] = None
+
+    @classmethod
+    def de_linha(cls, linha: Dict[str, Any]) -> 'Instalacao':
+        """Monta a partir de uma linha da tabela instalacoes (ou de um registro a inserir)."""
+        tipo = str(linha.get('tipo') or 'instalacao').lower()
+        data = linha.get('data') or ''
+        dt = parse_data(data)
+        return cls(
+            sa=linha.get('sa') or '',
+            gpon=linha.get('gpon') or '',
+            tipo=tipo,
+            pontos=PONTOS_SERVICO.get(tipo, PONTOS_PADRAO),
+            data=data,
+            dt=dt,
+            # Dia de trabalho no fuso do ciclo (registros com outro offset caem no dia certo)
+            dia=dt.astimezone(TZ).date() if dt else None,
+            tecnico_id=linha.get('tecnico_id'),
+            tecnico_nome=linha.get('tecnico_nome') or 'Desconhecido',
+            tecnico_regiao=linha.get('tecnico_regiao'),
+            categoria=linha.get('categoria'),
+            serial_modem=linha.get('serial_modem'),
+            serial_mesh=linha.get('serial_mesh'),
+            fotos=linha.get('fotos') or [],
+            id=linha.get('id'),
+        )
+
+    @property
+    def data_br(self) -> str:
+        """Data para exibição (dd/mm/YYYY HH:MM), como o format_data."""
+        if self.dt:
+            return self.dt.strftime('%d/%m/%Y %H:%M')
+        return str(self.data) if self.data else 'N/A'
@@ -0,0 +1,196 @@
+"""
+Persistência do estado das conversas em SQLite local.
+
+Guarda os estados do ConversationHandler e o user_data de cada técnico para que um
+deploy ou reinício não derrube registros e máscaras em andamento. As escritas são
+incrementais (uma linha por técnico/conversa) e agrupadas: as chamadas update_* do
+PTB só marcam o que mudou e uma única transação grava tudo logo em seguida, fora do
+event loop. Bytes de imagens (fotos das máscaras, prints do autofill) nunca entram
+no banco — só os dados digitados/extraídos e os file_id.
+"""
+import asyncio
+import json
+import logging
+import pickle
+import sqlite3
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+# Hashes das imagens descartadas: restaurados sem as imagens, fariam o reenvio da
+# mesma foto após um reinício ser ignorado como duplicata
+CHAVES_DERIVADAS_DE_IMAGENS = {'hashes_mascara', 'hashes_autofill'}
+
+
+def _contem_imagem(valor: Any) -> bool:
+    if isinstance(valor, (bytes, bytearray, memoryview)):
+        return True
+    if isinstance(valor, (list, tuple)):
+        return any(isinstance(v, (bytes, bytearray, memoryview)) for v in valor)
+    return False
+
+
+def _serializar_user_data(user_id: int, data: Dict[Any, Any]) -> bytes:
+    """Pickle do user_data sem imagens; valores não serializáveis são descartados com aviso."""
+    limpo = {
+        chave: valor for chave, valor in data.items()
+        if chave not in CHAVES_DERIVADAS_DE_IMAGENS and not _contem_imagem(valor)
+    }
+    try:
+        return pickle.dumps(limpo)
+    except Exception:
+        pass
+    for chave in list(limpo):
+        try:
+            pickle.dumps(limpo[chave])
+        except Exception as e:
+            logger.warning(f"[Persistência] user_data[{chave!r}] do usuário {user_id} não serializável: {e}")
+            del limpo[chave]
+    return pickle.dumps(limpo)
+
+
+class PersistenciaSQLite(BasePersistence):
+    def __init__(self, arquivo: str, update_interval: float = 10):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.arquivo = arquivo
+        self._conn = sqlite3.connect(arquivo, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS user_data (user_id INTEGER PRIMARY KEY, dados BLOB NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversas ("
+            "nome TEXT NOT NULL, chave TEXT NOT NULL, estado TEXT, PRIMARY KEY (nome, chave))"
+        )
+        self._conn.commit()
+        # Uma escrita por vez no arquivo (a gravação roda em thread)
+        self._lock = threading.Lock()
+        # Pendências desde a última gravação: None = apagar a linha
+        self._user_data_pendente: Dict[int, Optional[bytes]] = {}
+        self._conversas_pendentes: Dict[Tuple[str, str], Optional[str]] = {}
+        self._gravacao: Optional[asyncio.Task] = None
+
+    # ---------------- Leitura (só na inicialização) ----------------
+
+    async def get_user_data(self) -> Dict[int, Dict[Any, Any]]:
+        resultado = {}
+        for user_id, dados in self._conn.execute("SELECT user_id, dados FROM user_data"):
+            try:
+                resultado[user_id] = pickle.loads(dados)
+            except Exception as e:
+                logger.warning(f"[Persistência] user_data do usuário {user_id} ilegível, descartado: {e}")
+        logger.info(f"[Persistência] {len(resultado)} user_data restaurados de {self.arquivo}")
+        return resultado
+
+    async def get_chat_data(self) -> Dict[int, Dict[Any, Any]]:
+        return {}
+
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> Dict[Tuple[int, ...], object]:
+        conversas = {}
+        for chave, estado in self._conn.execute("SELECT chave, estado FROM conversas WHERE nome = ?", (name,)):
+            conversas[tuple(json.loads(chave))] = json.loads(estado)
+        logger.info(f"[Persistência] {len(conversas)} conversas '{name}' restauradas")
+        return conversas
+
+    # ---------------- Escrita (agrupada) ----------------
+
+    async def update_conversation(self, name: str, key: Tuple[int, ...], new_state: Optional[object]) -> None:
+        self._conversas_pendentes[(name, json.dumps(list(key)))] = None if new_state is None else json.dumps(new_state)
+        self._agendar_gravacao()
+
+    async def update_user_data(self, user_id: int, data: Dict[Any, Any]) -> None:
+        self._user_data_pendente[user_id] = _serializar_user_data(user_id, data)
+        self._agendar_gravacao()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._user_data_pendente[user_id] = None
+        self._agendar_gravacao()
+
+    async def update_chat_data(self, chat_id: int, data: Dict[Any, Any]) -> None:
+        pass
+
+    async def update_bot_data(self, data: Dict[Any, Any]) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[Any, Any]) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict[Any, Any]) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict[Any, Any]) -> None:
+        pass
+
+    def _agendar_gravacao(self):
+        # O PTB chama update_* em sequência para todos os técnicos alterados; a gravação
+        # é agendada uma vez só e pega tudo o que foi marcado até ela rodar.
+        if self._gravacao is None or self._gravacao.done():
+            self._gravacao = asyncio.get_running_loop().create_task(self._gravar_em_thread())
+
+    async def _gravar_em_thread(self):
+        await asyncio.sleep(0)
+        # Repete enquanto chegarem pendências durante a gravação anterior
+        while self._user_data_pendente or self._conversas_pendentes:
+            user_data, self._user_data_pendente = self._user_data_pendente, {}
+            conversas, self._conversas_pendentes = self._conversas_pendentes, {}
+            try:
+                await asyncio.to_thread(self._gravar, user_data, conversas)
+            except Exception as e:
+                logger.error(f"[Persistência] Falha ao gravar estado: {e}")
+                # Devolve o que não foi gravado sem sobrescrever mudanças mais novas;
+                # a próxima rodada do PTB tenta de novo
+                for k, v in user_data.items():
+                    self._user_data_pendente.setdefault(k, v)
+                for k, v in conversas.items():
+                    self._conversas_pendentes.setdefault(k, v)
+                return
+
+    def _gravar(self, user_data: Dict[int, Optional[bytes]], conversas: Dict[Tuple[str, str], Optional[str]]):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO user_data (user_id, dados) VALUES (?, ?)",
+                [(uid, dados) for uid, dados in user_data.items() if dados is not None]
+            )
+            self._conn.executemany(
+                "DELETE FROM user_data WHERE user_id = ?",
+                [(uid,) for uid, dados in user_data.items() if dados is None]
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO conversas (nome, chave, estado) VALUES (?, ?, ?)",
+                [(nome, chave, estado) for (nome, chave), estado in conversas.items() if estado is not None]
+            )
+            self._conn.executemany(
+                "DELETE FROM conversas WHERE nome = ? AND chave = ?",
+                [(nome, chave) for (nome, chave), estado in conversas.items() if estado is None]
+            )
+
+    async def flush(self) -> None:
+        """Chamado pelo PTB no encerramento: grava o que faltar e fecha o arquivo."""
+        if self._gravacao is not None and not self._gravacao.done():
+            await self._gravacao
+        if self._user_data_pendente or self._conversas_pendentes:
+            user_data, self._user_data_pendente = self._user_data_pendente, {}
+            conversas, self._conversas_pendentes = self._conversas_pendentes, {}
+            self._gravar(user_data, conversas)
+        with self._lock:
+            self._conn.close()
+        logger.info("[Persistência] Estado gravado")
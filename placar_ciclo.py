@@ -0,0 +1,162 @@
+"""
+Placar do ciclo em memória: pontos por técnico, mantidos em ordem a cada registro.
+
+Carregado uma vez na subida do bot com as instalações do ciclo atual e atualizado pelo
+database a cada insert bem-sucedido; o 🏆 Ranking lê o topo daqui em vez de baixar e
+reagrupar o ciclo inteiro. Na virada do ciclo (ciclo_atual) o placar recomeça vazio.
+Enquanto não foi carregado (banco fora na subida, ciclo maior que a carga), pronto=False
+e quem lê volta para a consulta ao banco.
+
+Cada técnico é identificado pelo tecnico_id (o nome é só para exibição: homônimos não se
+misturam e quem muda de nome continua com os mesmos pontos). Registros antigos sem
+tecnico_id ficam agrupados pelo nome.
+"""
+import bisect
+import logging
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from analise_producao import ResumoTecnico
+from config import CICLO_DIAS_TURBO, TABELA_FAIXAS
+from utils import ciclo_atual, obter_faixa_valor
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class _Tecnico:
+    ordem: int
+    nome: str
+    quantidade: int = 0
+    pontos: float = 0.0
+    dias: Set[date] = field(default_factory=set)
+
+
+@dataclass(slots=True)
+class PosicaoTecnico:
+    posicao: int
+    total_tecnicos: int
+    pontos: float
+    faixa: Dict[str, Any]
+    proxima_faixa: Optional[Dict[str, Any]]
+    falta_faixa: float      # pontos até a próxima faixa (0 na faixa máxima)
+    falta_posicao: float    # pontos até alcançar o técnico logo acima (0 em 1º)
+
+
+class PlacarCiclo:
+    def __init__(self):
+        self.pronto = False
+        self.inicio: Optional[datetime] = None
+        self.fim: Optional[datetime] = None
+        self.total_instalacoes = 0
+        self.total_pontos = 0.0
+        self._tecnicos: Dict[Any, _Tecnico] = {}
+        # Conjunto ordenado (-pontos, ordem de aparição, chave): maior pontuação primeiro,
+        # empate na ordem em que o técnico apareceu (igual ao resumo_por_tecnico). A ordem
+        # é única, então a chave nunca chega a ser comparada.
+        self._ranking: List[Tuple[float, int, Any]] = []
+
+    def _zerar(self, inicio: datetime, fim: datetime):
+        self.inicio, self.fim = inicio, fim
+        self.total_instalacoes = 0
+        self.total_pontos = 0.0
+        self._tecnicos.clear()
+        self._ranking.clear()
+
+    def _virar_ciclo(self) -> bool:
+        """Recomeça vazio quando o ciclo_atual muda. False enquanto o placar não foi carregado."""
+        if not self.pronto:
+            return False
+        inicio, fim = ciclo_atual()
+        if inicio != self.inicio:
+            logger.info(f"[Placar] Novo ciclo {inicio:%d/%m} a {fim:%d/%m/%Y}: placar zerado")
+            self._zerar(inicio, fim)
+        return True
+
+    @staticmethod
+    def _chave(tecnico_id, nome: str):
+        if tecnico_id is None or tecnico_id == '':
+            return f'nome:{nome}'
+        try:
+            return int(tecnico_id)
+        except (TypeError, ValueError):
+            return str(tecnico_id)
+
+    def _somar(self, inst):
+        if not inst.dt or not (self.inicio <= inst.dt <= self.fim):
+            return
+        chave = self._chave(inst.tecnico_id, inst.tecnico_nome)
+        tec = self._tecnicos.get(chave)
+        if tec is None:
+            tec = self._tecnicos[chave] = _Tecnico(len(self._tecnicos), inst.tecnico_nome)
+        else:
+            del self._ranking[bisect.bisect_left(self._ranking, (-tec.pontos, tec.ordem, chave))]
+            # Nome mais recente para exibição (a carga vem do mais novo para o mais antigo,
+            # então só os registros novos trocam o nome)
+            if self.pronto:
+                tec.nome = inst.tecnico_nome
+        tec.quantidade += 1
+        tec.pontos += inst.pontos
+        if inst.dia:
+            tec.dias.add(inst.dia)
+        bisect.insort(self._ranking, (-tec.pontos, tec.ordem, chave))
+        self.total_instalacoes += 1
+        self.total_pontos += inst.pontos
+
+    def carregar(self, instalacoes: list, inicio: datetime, fim: datetime):
+        """Monta o placar a partir das instalações (Instalacao) do ciclo inicio..fim, mais recentes primeiro."""
+        self.pronto = False
+        self._zerar(inicio, fim)
+        for inst in instalacoes:
+            self._somar(inst)
+        self.pronto = True
+        logger.info(f"[Placar] Carregado: {self.total_instalacoes} registros, {len(self._tecnicos)} técnicos")
+
+    def registrar(self, instalacoes: list):
+        """Soma registros recém-salvos; os de fora do ciclo atual são ignorados."""
+        if not self._virar_ciclo():
+            return
+        for inst in instalacoes:
+            self._somar(inst)
+
+    def _resumo(self, chave) -> ResumoTecnico:
+        tec = self._tecnicos[chave]
+        turbo = len(tec.dias) >= CICLO_DIAS_TURBO
+        faixa = obter_faixa_valor(tec.pontos)
+        valor_unit = faixa['valor_turbo'] if turbo else faixa['valor']
+        return ResumoTecnico(tec.nome, tec.quantidade, tec.pontos, len(tec.dias), turbo, faixa, valor_unit, tec.pontos * valor_unit)
+
+    @property
+    def total_tecnicos(self) -> int:
+        return len(self._ranking)
+
+    def top(self, n: Optional[int] = None) -> List[ResumoTecnico]:
+        """Os n primeiros (todos se n for None), do maior para o menor."""
+        if not self._virar_ciclo():
+            return []
+        return [self._resumo(chave) for _, _, chave in self._ranking[:n]]
+
+    def posicao(self, tecnico_id: int) -> Optional[PosicaoTecnico]:
+        """Colocação do técnico no ciclo e quanto falta para a próxima faixa e para subir uma posição."""
+        if not self._virar_ciclo():
+            return None
+        chave = self._chave(tecnico_id, '')
+        tec = self._tecnicos.get(chave)
+        if tec is None:
+            return None
+        i = bisect.bisect_left(self._ranking, (-tec.pontos, tec.ordem, chave))
+        proxima = next((t for t in reversed(TABELA_FAIXAS) if t['min'] > tec.pontos), None)
+        return PosicaoTecnico(
+            posicao=i + 1,
+            total_tecnicos=len(self._ranking),
+            pontos=tec.pontos,
+            faixa=obter_faixa_valor(tec.pontos),
+            proxima_faixa=proxima,
+            falta_faixa=proxima['min'] - tec.pontos if proxima else 0.0,
+            falta_posicao=-self._ranking[i - 1][0] - tec.pontos if i else 0.0,
+        )
+
+
+# Instância do processo (um bot = um placar)
+placar = PlacarCiclo()
@@ -0,0 +1,60 @@
+"""
+Processamento concorrente dos updates com ordem garantida por técnico.
+
+Updates de técnicos diferentes rodam em paralelo (o OCR de um não segura o botão do
+outro), mas os de um mesmo técnico entram em fila e rodam um de cada vez, na ordem
+de chegada — o ConversationHandler nunca vê dois updates do mesmo usuário ao mesmo
+tempo. Um limite global de updates simultâneos protege o Supabase e o Groq.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessadorPorUsuario(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # Um lock por técnico (asyncio.Lock atende na ordem de chegada); some quando a fila esvazia
+        self._filas: Dict[int, asyncio.Lock] = {}
+        self._na_fila: Dict[int, int] = {}
+
+    @staticmethod
+    def _chave(update: object) -> Optional[int]:
+        if isinstance(update, Update):
+            if update.effective_user:
+                return update.effective_user.id
+            if update.effective_chat:
+                return update.effective_chat.id
+        return None
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        chave = self._chave(update)
+        if chave is None:
+            await super().process_update(update, coroutine)
+            return
+        lock = self._filas.setdefault(chave, asyncio.Lock())
+        self._na_fila[chave] = self._na_fila.get(chave, 0) + 1
+        try:
+            # Primeiro a vez do técnico, depois a vaga global: updates enfileirados de um
+            # mesmo técnico não ocupam vagas que outros poderiam usar
+            async with lock:
+                await super().process_update(update, coroutine)
+        finally:
+            self._na_fila[chave] -= 1
+            if not self._na_fila[chave]:
+                del self._na_fila[chave]
+                del self._filas[chave]
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,188 @@
+"""
+Registro em lote: várias SAs de uma vez, numa mensagem de várias linhas ou num
+arquivo CSV/XLSX.
+
+Cada linha traz SA, GPON, tipo, serial do modem e (opcional) seriais mesh/FTTR,
+separados por ";", "|", tab ou vírgula. Uma linha de cabeçalho é opcional e, quando
+existe, define a ordem das colunas. A validação usa os mesmos validadores do fluxo
+passo a passo; duplicatas no banco e o insert ficam por conta do handler (uma
+consulta e um insert para o lote todo).
+"""
+import csv
+import io
+import re
+import unicodedata
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import PONTOS_SERVICO
+from utils import is_valid_gpon, is_valid_sa, is_valid_serial, normalizar_sa
+
+COLUNAS = ['sa', 'gpon', 'tipo', 'serial_modem', 'serial_mesh']
+
+# Nomes aceitos no cabeçalho (já normalizados)
+_ALIASES_COLUNA = {
+    'sa': 'sa',
+    'gpon': 'gpon', 'acesso_gpon': 'gpon',
+    'tipo': 'tipo', 'servico': 'tipo',
+    'serial': 'serial_modem', 'serial_modem': 'serial_modem', 'modem': 'serial_modem', 'ont': 'serial_modem',
+    'mesh': 'serial_mesh', 'serial_mesh': 'serial_mesh', 'fttr': 'serial_mesh', 'seriais_mesh': 'serial_mesh',
+}
+
+# Rótulos dos botões e formas comuns de digitar → código do tipo
+_ALIASES_TIPO = {
+    'instalacao_e_mesh': 'instalacao_mesh',
+    'mesh': 'instalacao_mesh',
+    'fttr': 'instalacao_fttr',
+    'tv': 'instalacao_tv',
+    'mudanca_de_endereco': 'mudanca_endereco',
+    'servico': 'servicos',
+}
+
+# Mesmos tipos que pedem o serial do modem no fluxo passo a passo (receber_tipo)
+TIPOS_COM_SERIAL = {
+    'instalacao', 'instalacao_tv', 'instalacao_mesh', 'instalacao_fttr', 'mudanca_endereco',
+    'defeito_banda_larga', 'defeito_linha', 'defeito_tv',
+}
+TIPOS_COM_MESH = {'instalacao_mesh', 'instalacao_fttr'}
+
+_SEPARADORES = (';', '\t', '|', ',')
+
+
+def _normalizar(texto) -> str:
+    texto = unicodedata.normalize('NFKD', str(texto or '')).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]+', '_', texto.lower()).strip('_')
+
+
+def normalizar_tipo(texto) -> Optional[str]:
+    """Código do tipo ('Instalação + Mesh' → 'instalacao_mesh') ou None se desconhecido."""
+    tipo = _normalizar(texto)
+    tipo = _ALIASES_TIPO.get(tipo, tipo)
+    return tipo if tipo in PONTOS_SERVICO else None
+
+
+def _celulas_para_linhas(celulas_por_linha: List[Tuple[int, List[str]]]) -> List[Dict[str, str]]:
+    """Aplica o cabeçalho (se houver) e devolve um dict por linha com 'linha' = número original."""
+    colunas = COLUNAS
+    linhas = []
+    for numero, celulas in celulas_por_linha:
+        celulas = [str(c).strip() if c is not None else '' for c in celulas]
+        if not any(celulas):
+            continue
+        if not linhas and colunas is COLUNAS and 'sa' in (_normalizar(c) for c in celulas):
+            colunas = [_ALIASES_COLUNA.get(_normalizar(c), '') for c in celulas]
+            continue
+        linha = {'linha': numero}
+        for coluna, valor in zip(colunas, celulas):
+            if coluna and valor:
+                linha[coluna] = f"{linha[coluna]} {valor}" if coluna in linha else valor
+        # Colunas além das previstas: mais seriais mesh (ex.: separados por vírgula no CSV)
+        if colunas is COLUNAS and len(celulas) > len(COLUNAS):
+            extras = ' '.join(c for c in celulas[len(COLUNAS):] if c)
+            if extras:
+                linha['serial_mesh'] = f"{linha.get('serial_mesh', '')} {extras}".strip()
+        linhas.append(linha)
+    return linhas
+
+
+def _separador(linha: str) -> str:
+    for sep in _SEPARADORES:
+        if sep in linha:
+            return sep
+    return ','
+
+
+def ler_texto(texto: str) -> List[Dict[str, str]]:
+    """Linhas de uma mensagem (uma SA por linha)."""
+    celulas = []
+    for numero, linha in enumerate(texto.splitlines(), 1):
+        if linha.strip():
+            celulas.append((numero, linha.split(_separador(linha))))
+    return _celulas_para_linhas(celulas)
+
+
+def ler_csv(dados: bytes) -> List[Dict[str, str]]:
+    try:
+        texto = dados.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        # Excel em português salva CSV em cp1252
+        texto = dados.decode('cp1252', errors='replace')
+    primeira = next((l for l in texto.splitlines() if l.strip()), '')
+    leitor = csv.reader(io.StringIO(texto), delimiter=_separador(primeira))
+    return _celulas_para_linhas([(numero, celulas) for numero, celulas in enumerate(leitor, 1)])
+
+
+def ler_xlsx(dados: bytes) -> List[Dict[str, str]]:
+    """Primeira planilha do arquivo. Requer openpyxl."""
+    from openpyxl import load_workbook
+
+    planilha = load_workbook(io.BytesIO(dados), read_only=True, data_only=True).worksheets[0]
+    celulas = []
+    for numero, valores in enumerate(planilha.iter_rows(values_only=True), 1):
+        # Números do Excel (SA digitada como número) viram float/int
+        celulas.append((numero, [
+            str(int(v)) if isinstance(v, float) and v.is_integer() else v for v in valores
+        ]))
+    return _celulas_para_linhas(celulas)
+
+
+def validar_linhas(
+    linhas: List[Dict[str, str]],
+    categoria_do_tipo: Callable[[str], str],
+    max_linhas: int = 50,
+) -> Tuple[List[Dict[str, str]], List[str]]:
+    """
+    (registros válidos, erros por linha). SA e seriais saem normalizados; SAs repetidas
+    dentro do próprio lote ficam só na primeira ocorrência.
+    """
+    validas, erros, vistas = [], [], set()
+    if len(linhas) > max_linhas:
+        erros.append(f"Lote com {len(linhas)} linhas: só as {max_linhas} primeiras foram lidas")
+        linhas = linhas[:max_linhas]
+
+    for linha in linhas:
+        numero = linha['linha']
+        sa = normalizar_sa(linha.get('sa'))
+        gpon = (linha.get('gpon') or '').strip()
+        tipo = normalizar_tipo(linha.get('tipo'))
+        serial = (linha.get('serial_modem') or '').strip().upper()
+        mesh = [m for m in re.split(r'[\s,/;]+', (linha.get('serial_mesh') or '').upper()) if m]
+
+        if not is_valid_sa(sa):
+            erros.append(f"Linha {numero}: SA inválida ({sa or 'vazia'})")
+            continue
+        if sa in vistas:
+            erros.append(f"Linha {numero}: {sa} repetida no lote")
+            continue
+        if not is_valid_gpon(gpon):
+            erros.append(f"Linha {numero}: GPON inválido ({gpon or 'vazio'})")
+            continue
+        if not tipo:
+            erros.append(f"Linha {numero}: tipo desconhecido ({linha.get('tipo') or 'vazio'})")
+            continue
+
+        categoria = categoria_do_tipo(tipo)
+        if serial and not is_valid_serial(serial):
+            erros.append(f"Linha {numero}: serial do modem inválido ({serial})")
+            continue
+        if not serial and tipo in TIPOS_COM_SERIAL:
+            if categoria != 'reparo':
+                erros.append(f"Linha {numero}: falta o serial do modem")
+                continue
+            # Reparo sem serial = ONT não trocada (mesmo valor do botão "Não trocou")
+            serial = 'Não Trocado'
+        invalidos = [m for m in mesh if not is_valid_serial(m)]
+        if invalidos:
+            erros.append(f"Linha {numero}: serial mesh inválido ({', '.join(invalidos)})")
+            continue
+        if not mesh and tipo in TIPOS_COM_MESH:
+            erros.append(f"Linha {numero}: falta o serial mesh/FTTR")
+            continue
+
+        vistas.add(sa)
+        registro = {'linha': numero, 'sa': sa, 'gpon': gpon, 'tipo': tipo, 'categoria': categoria}
+        if serial:
+            registro['serial_modem'] = serial
+        if mesh:
+            registro['serial_mesh'] = ', '.join(mesh)
+        validas.append(registro)
+    return validas, erros
@@ -1,6 +1,7 @@
 from datetime import datetime
-from config import TZ, TABELA_FAIXAS, PONTOS_SERVICO, CICLO_DIAS_TURBO
-from utils import calcular_pontos, contar_dias_produtivos, obter_faixa_valor, formata_brl, parse_data
+from config import TZ, TABELA_FAIXAS, CICLO_DIAS_TURBO, RANKING_TOP
+from utils import calcular_pontos, contar_dias_produtivos, obter_faixa_valor, formata_brl
+from analise_producao import resumo_por_tecnico, contagem_por_tecnico
 
 def gerar_texto_producao(instalacoes: list, inicio: datetime, fim: datetime, username: str) -> str:
     """Gera o texto do relatório de produção detalhado."""
@@ -71,53 +72,16 @@ def gerar_resumo_progresso(pontos: float) -> str:
             f'🚀 Continue assim!'
         )
 
-def gerar_ranking_texto(instalacoes: list, is_admin: bool = False) -> str:
-    """Gera o texto do ranking de técnicos do CICLO ATUAL."""
-    if not instalacoes:
-        return "❌ Nenhuma instalação registrada ainda."
-    
-    from collections import defaultdict
-    from utils import ciclo_atual
-    
-    # Pegar apenas instalações do ciclo atual
-    inicio_ciclo, fim_ciclo = ciclo_atual()
-    
-    instalacoes_ciclo = []
-    for inst in instalacoes:
-        data_inst = parse_data(inst.get('data', ''))
-        if data_inst and inicio_ciclo <= data_inst <= fim_ciclo:
-            instalacoes_ciclo.append(inst)
-    
-    if not instalacoes_ciclo:
+def _texto_ranking(tecnicos_ordenados: list, total_tecnicos: int, total_instalacoes: int, total_pontos: float,
+                   inicio_ciclo: datetime, fim_ciclo: datetime, is_admin: bool) -> str:
+    """Monta o ranking a partir dos ResumoTecnico já ordenados (exibe os RANKING_TOP primeiros)."""
+    if not tecnicos_ordenados:
         return (
             f'🏆 *Ranking do Ciclo Atual*\n'
             f'📅 {inicio_ciclo.strftime("%d/%m")} a {fim_ciclo.strftime("%d/%m/%Y")}\n\n'
             f'❌ Nenhuma instalação registrada neste ciclo ainda.'
         )
-    
-    # Agrupar por técnico
-    por_tecnico = defaultdict(lambda: {'quantidade': 0, 'pontos': 0.0, 'instalacoes': []})
-    
-    for inst in instalacoes_ciclo:
-        nome = inst.get('tecnico_nome', 'Desconhecido')
-        tipo = str(inst.get('tipo', 'instalacao')).lower()
-        pontos = PONTOS_SERVICO.get(tipo, 1.0)
-        
-        por_tecnico[nome]['quantidade'] += 1
-        por_tecnico[nome]['pontos'] += pontos
-        por_tecnico[nome]['instalacoes'].append(inst)
-    
-    # Ordenar por pontos
-    tecnicos_ordenados = sorted(
-        por_tecnico.items(), 
-        key=lambda x: x[1]['pontos'], 
-        reverse=True
-    )
-    
-    # Calcular totais
-    total_instalacoes = len(instalacoes_ciclo)
-    total_pontos = sum(t[1]['pontos'] for t in tecnicos_ordenados)
-    
+
     msg = (
         f'━━━━━━━━━━━━━━━━━━━━\n'
         f'🏆 *RANKING DO CICLO*\n'
@@ -132,38 +96,28 @@ def gerar_ranking_texto(instalacoes: list, is_admin: bool = False) -> str:
     msg += '\n👥 *TOP TÉCNICOS:*\n'
     
     medals = ['🥇', '🥈', '🥉']
-    for idx, (tecnico, dados) in enumerate(tecnicos_ordenados, 1):
+    for idx, dados in enumerate(tecnicos_ordenados[:RANKING_TOP], 1):
         medal = medals[idx-1] if idx <= 3 else f'{idx}º'
-        percentual_inst = (dados['quantidade'] / total_instalacoes) * 100
+        percentual_inst = (dados.quantidade / total_instalacoes) * 100
         
         if is_admin:
             # VERSÃO ADMIN - Completa com valores
-            percentual_pts = (dados['pontos'] / total_pontos) * 100
+            percentual_pts = (dados.pontos / total_pontos) * 100
             
-            # Calcular dias produtivos
-            dias = set()
-            for inst in dados['instalacoes']:
-                dt = parse_data(inst.get('data', ''))
-                if dt:
-                    dias.add(dt.date())
-            dias_produtivos = len(dias)
-            
-            # Calcular valor estimado
-            turbo_ativo = dias_produtivos >= CICLO_DIAS_TURBO
-            tier = obter_faixa_valor(dados['pontos'])
-            valor_unit = tier['valor_turbo'] if turbo_ativo else tier['valor']
-            valor_estimado = dados['pontos'] * valor_unit
-            
-            msg += f'\n{medal} *{tecnico}*\n'
-            msg += f'   📦 {dados["quantidade"]} inst. ({percentual_inst:.1f}%)\n'
-            msg += f'   ⭐ {dados["pontos"]:.2f} pts ({percentual_pts:.1f}%)\n'
-            msg += f'   📅 {dias_produtivos} dias | Faixa {tier["faixa"]}\n'
-            msg += f'   💰 {formata_brl(valor_estimado)} {"🚀" if turbo_ativo else ""}\n'
+            msg += f'\n{medal} *{dados.nome}*\n'
+            msg += f'   📦 {dados.quantidade} inst. ({percentual_inst:.1f}%)\n'
+            msg += f'   ⭐ {dados.pontos:.2f} pts ({percentual_pts:.1f}%)\n'
+            msg += f'   📅 {dados.dias} dias | Faixa {dados.faixa["faixa"]}\n'
+            msg += f'   💰 {formata_brl(dados.valor)} {"🚀" if dados.turbo else ""}\n'
         else:
             # VERSÃO PÚBLICA - Simples sem valores
-            msg += f'\n{medal} *{tecnico}*\n'
-            msg += f'   📦 {dados["quantidade"]} instalações ({percentual_inst:.1f}%)\n'
-            msg += f'   ⭐ {dados["pontos"]:.2f} pontos\n'
+            msg += f'\n{medal} *{dados.nome}*\n'
+            msg += f'   📦 {dados.quantidade} instalações ({percentual_inst:.1f}%)\n'
+            msg += f'   ⭐ {dados.pontos:.2f} pontos\n'
+
+    restantes = total_tecnicos - min(len(tecnicos_ordenados), RANKING_TOP)
+    if restantes > 0:
+        msg += f'\n_... e mais {restantes} técnicos_\n'
     
     # Estatísticas do ciclo
     dias_decorridos = (datetime.now(TZ) - inicio_ciclo).days + 1
@@ -178,25 +132,46 @@ def gerar_ranking_texto(instalacoes: list, is_admin: bool = False) -> str:
     
     return msg
 
+def gerar_ranking_texto(instalacoes: list, is_admin: bool = False) -> str:
+    """Gera o texto do ranking de técnicos do CICLO ATUAL (lista de Instalacao)."""
+    if not instalacoes:
+        return "❌ Nenhuma instalação registrada ainda."
+    
+    from utils import ciclo_atual
+    
+    # Pegar apenas instalações do ciclo atual
+    inicio_ciclo, fim_ciclo = ciclo_atual()
+    
+    instalacoes_ciclo = [inst for inst in instalacoes if inst.dt and inicio_ciclo <= inst.dt <= fim_ciclo]
+    
+    # Agrupar por técnico (já ordenado por pontos)
+    tecnicos_ordenados = resumo_por_tecnico(instalacoes_ciclo)
+    total_pontos = sum(t.pontos for t in tecnicos_ordenados)
+    return _texto_ranking(
+        tecnicos_ordenados, len(tecnicos_ordenados), len(instalacoes_ciclo), total_pontos,
+        inicio_ciclo, fim_ciclo, is_admin
+    )
+
+def gerar_ranking_placar(placar, is_admin: bool = False) -> str:
+    """Ranking do ciclo lido do placar em memória (placar_ciclo), sem consultar o banco."""
+    # top() primeiro: vira o ciclo se for o caso antes de ler os totais
+    tecnicos = placar.top(RANKING_TOP)
+    return _texto_ranking(
+        tecnicos, placar.total_tecnicos, placar.total_instalacoes, placar.total_pontos,
+        placar.inicio, placar.fim, is_admin
+    )
+
 def gerar_relatorio_mensal(instalacoes: list) -> str:
     """Gera relatório do mês atual."""
-    from collections import defaultdict
     agora = datetime.now(TZ)
     mes_atual = agora.month
     ano_atual = agora.year
     
-    instalacoes_mes = []
-    for inst in instalacoes:
-        dt = parse_data(inst.get('data', ''))
-        if dt and dt.month == mes_atual and dt.year == ano_atual:
-            instalacoes_mes.append(inst)
+    instalacoes_mes = [inst for inst in instalacoes if inst.dia and inst.dia.month == mes_atual and inst.dia.year == ano_atual]
     
     if not instalacoes_mes:
         return "❌ Nenhuma instalação registrada neste mês."
     
-    por_tecnico = defaultdict(int)
-    for inst in instalacoes_mes:
-        por_tecnico[inst['tecnico_nome']] += 1
     
     nome_mes = agora.strftime('%B/%Y')
     msg = (
@@ -208,8 +183,7 @@ def gerar_relatorio_mensal(instalacoes: list) -> str:
         '👥 *Por Técnico:*\n'
     )
     
-    tecnicos_ordenados = sorted(por_tecnico.items(), key=lambda x: x[1], reverse=True)
-    for tecnico, quantidade in tecnicos_ordenados:
+    for tecnico, quantidade in contagem_por_tecnico(instalacoes_mes):
         msg += f'  • {tecnico}: *{quantidade}* instalações\n'
     
     dias_mes = agora.day
@@ -220,25 +194,17 @@ def gerar_relatorio_mensal(instalacoes: list) -> str:
 
 def gerar_relatorio_semanal(instalacoes: list) -> str:
     """Gera relatório da semana atual."""
-    from collections import defaultdict
     from datetime import timedelta
     
     agora = datetime.now(TZ)
     inicio_semana = agora - timedelta(days=agora.weekday())
     inicio_semana = inicio_semana.replace(hour=0, minute=0, second=0, microsecond=0)
     
-    instalacoes_semana = []
-    for inst in instalacoes:
-        dt = parse_data(inst.get('data', ''))
-        if dt and dt >= inicio_semana:
-            instalacoes_semana.append(inst)
+    instalacoes_semana = [inst for inst in instalacoes if inst.dt and inst.dt >= inicio_semana]
     
     if not instalacoes_semana:
         return "❌ Nenhuma instalação registrada nesta semana."
     
-    por_tecnico = defaultdict(int)
-    for inst in instalacoes_semana:
-        por_tecnico[inst['tecnico_nome']] += 1
     
     msg = (
         '━━━━━━━━━━━━━━━━━━━━\n'
@@ -249,8 +215,7 @@ def gerar_relatorio_semanal(instalacoes: list) -> str:
         '👥 *Por Técnico:*\n'
     )
     
-    tecnicos_ordenados = sorted(por_tecnico.items(), key=lambda x: x[1], reverse=True)
-    for tecnico, quantidade in tecnicos_ordenados:
+    for tecnico, quantidade in contagem_por_tecnico(instalacoes_semana):
         msg += f'  • {tecnico}: *{quantidade}* instalações\n'
     
     dias_semana = (agora - inicio_semana).days + 1
@@ -261,22 +226,15 @@ def gerar_relatorio_semanal(instalacoes: list) -> str:
 
 def gerar_relatorio_hoje(instalacoes: list) -> str:
     """Gera relatório do dia atual."""
-    from collections import defaultdict
     
     agora = datetime.now(TZ)
     
-    instalacoes_hoje = []
-    for inst in instalacoes:
-        dt = parse_data(inst.get('data', ''))
-        if dt and dt.date() == agora.date():
-            instalacoes_hoje.append(inst)
+    hoje = agora.date()
+    instalacoes_hoje = [inst for inst in instalacoes if inst.dia == hoje]
     
     if not instalacoes_hoje:
         return "❌ Nenhuma instalação registrada hoje."
     
-    por_tecnico = defaultdict(int)
-    for inst in instalacoes_hoje:
-        por_tecnico[inst['tecnico_nome']] += 1
     
     msg = (
         '━━━━━━━━━━━━━━━━━━━━\n'
@@ -287,8 +245,7 @@ def gerar_relatorio_hoje(instalacoes: list) -> str:
         '👥 *Por Técnico:*\n'
     )
     
-    tecnicos_ordenados = sorted(por_tecnico.items(), key=lambda x: x[1], reverse=True)
-    for tecnico, quantidade in tecnicos_ordenados:
+    for tecnico, quantidade in contagem_por_tecnico(instalacoes_hoje):
         msg += f'  • {tecnico}: *{quantidade}* instalações\n'
     
     return msg
@@ -1,4 +1,5 @@
 import os
+import asyncio
 import logging
 import warnings
 from pathlib import Path
@@ -16,19 +17,23 @@ except ImportError:
     pass  # Se não tiver dotenv, assume que as variáveis já estão no ambiente
 
 from telegram import Update, BotCommand
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ConversationHandler, filters
+from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ConversationHandler, InlineQueryHandler, TypeHandler, filters
 
 # Importar configurações e módulos
 from config import *
 from database import db
 from keep_alive import keep_alive
+from processador_updates import ProcessadorPorUsuario
+from limitador_envios import LimitadorEnvios
+from placar_ciclo import placar
+from utils import ciclo_atual
 
 # Importar handlers
 from handlers import (
-    start, ajuda, cancelar, meu_id,
+    start, ajuda, cancelar, conversa_expirada, meu_id, controle_acesso,
     receber_nome, receber_sobrenome, receber_regiao,
     receber_sa, receber_gpon, receber_tipo, receber_serial, receber_serial_mesh, receber_foto, finalizar, receber_print_autofill, receber_serial_por_foto, receber_serial_mesh_por_foto,
-    button_callback, consultar, comando_consultar, comando_reparo, comando_producao,
+    button_callback, consultar, consulta_inline, consulta_pagina_callback, comando_consultar, comando_reparo, comando_producao, comando_lote, receber_lote, receber_lote_arquivo,
     comando_mensal, comando_semanal, comando_hoje, receber_data_inicio, receber_data_fim,
     receber_tipo_mascara, receber_foto_mascara, verificar_troca_ont,
     receber_obs_batimento, receber_tipo_pendencia, receber_obs_pendencia,
@@ -103,7 +108,21 @@ def main():
         return
 
     # Inicializar App
-    app = Application.builder().token(TOKEN).build()
+    builder = (
+        Application.builder()
+        .token(TOKEN)
+        .concurrent_updates(ProcessadorPorUsuario(BOT_CONCORRENCIA_MAX))
+        .rate_limiter(LimitadorEnvios(
+            por_segundo=ENVIOS_POR_SEGUNDO,
+            lote_por_segundo=ENVIOS_LOTE_POR_SEGUNDO,
+            chat_por_segundo=ENVIOS_CHAT_POR_SEGUNDO,
+            grupo_por_minuto=ENVIOS_GRUPO_POR_MINUTO
+        ))
+    )
+    if PERSISTENCIA_ARQUIVO:
+        from persistencia import PersistenciaSQLite
+        builder = builder.persistence(PersistenciaSQLite(PERSISTENCIA_ARQUIVO, update_interval=PERSISTENCIA_INTERVALO))
+    app = builder.build()
 
     # Definir comandos do bot
     async def post_init(application: Application) -> None:
@@ -117,6 +136,7 @@ def main():
             BotCommand("hoje", "Relatório de hoje"),
             BotCommand("consultar", "Consultar instalação"),
             BotCommand("reparo", "Registrar reparo"),
+            BotCommand("lote", "Registrar várias SAs"),
             BotCommand("admin", "Painel Admin")
         ])
         # Verificar banco de dados
@@ -128,6 +148,22 @@ def main():
         else:
             logger.warning("❌ Falha na conexão com Supabase!")
             update_health_status(database_connected=False)
+
+        # Placar do ciclo em memória (🏆 Ranking); se a carga falhar, o ranking consulta direto
+        if health:
+            inicio, fim = ciclo_atual()
+            try:
+                insts = await db.get_installations(
+                    {'data_inicio': inicio, 'data_fim': fim}, limit=PLACAR_CARGA_MAX, levantar_erro=True
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Falha ao carregar o placar do ciclo ({e}): ranking seguirá pelo banco")
+            else:
+                if len(insts) >= PLACAR_CARGA_MAX:
+                    logger.warning(f"⚠️ Ciclo com {PLACAR_CARGA_MAX}+ registros: placar em memória desligado")
+                else:
+                    # Ciclo ainda sem registros também carrega (placar vazio, atualizado a cada registro)
+                    placar.carregar(insts, inicio, fim)
             
         # Notificar Admin que o bot iniciou
         try:
@@ -151,6 +187,7 @@ def main():
             CommandHandler('producao', comando_producao),
             CommandHandler('consultar', comando_consultar),
             CommandHandler('reparo', comando_reparo),
+            CommandHandler('lote', comando_lote),
             CallbackQueryHandler(admin_callback_handler, pattern='^(admin_broadcast|admin_poll|admin_fix_days)$'),
             CallbackQueryHandler(button_callback)
         ],
@@ -184,6 +221,12 @@ def main():
             
             # Consultas
             AGUARDANDO_CONSULTA: [MessageHandler(filters.TEXT & ~filters.COMMAND, consultar)],
+
+            # Registro em lote (a confirmação chega pelo button_callback)
+            AGUARDANDO_LOTE: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, receber_lote),
+                MessageHandler(filters.Document.ALL, receber_lote_arquivo)
+            ],
             
             # Relatório por Período
             AGUARDANDO_DATA_INICIO: [MessageHandler(filters.TEXT & ~filters.COMMAND, receber_data_inicio)],
@@ -218,12 +261,17 @@ def main():
 
             # Admin Ajuste Dias
             AGUARDANDO_ID_TECNICO_AJUSTE: [MessageHandler(filters.TEXT & ~filters.COMMAND, receber_id_tecnico_ajuste)],
-            AGUARDANDO_DATA_AJUSTE: [MessageHandler(filters.TEXT & ~filters.COMMAND, receber_data_ajuste)]
+            AGUARDANDO_DATA_AJUSTE: [MessageHandler(filters.TEXT & ~filters.COMMAND, receber_data_ajuste)],
+
+            # Conversa parada além do conversation_timeout: limpa a sessão
+            ConversationHandler.TIMEOUT: [TypeHandler(Update, conversa_expirada)]
         },
         fallbacks=[
             CommandHandler('cancelar', cancelar)
         ],
         per_message=False,
+        name='conversa_principal',
+        persistent=bool(PERSISTENCIA_ARQUIVO),
         per_chat=True,
         per_user=True,
         allow_reentry=True,
@@ -231,6 +279,8 @@ def main():
     )
 
     # Adicionar handlers
+    # Controle de acesso antes de todos: resolve o cadastro uma vez e barra bloqueados/pendentes
+    app.add_handler(TypeHandler(Update, controle_acesso), group=-1)
     app.add_handler(CommandHandler('admin', admin_panel))
     app.add_handler(CommandHandler('meuid', meu_id))
     app.add_handler(CommandHandler('ajuda', ajuda))
@@ -238,29 +288,48 @@ def main():
     app.add_handler(CommandHandler('semanal', comando_semanal))
     app.add_handler(CommandHandler('hoje', comando_hoje))
     app.add_handler(CommandHandler('reparo', comando_reparo))
+    # Consulta inline (@bot termo) em qualquer chat, fora do ConversationHandler
+    app.add_handler(InlineQueryHandler(consulta_inline))
     
     # Handler para callbacks de admin (DEVE vir ANTES do ConversationHandler)
     # Excluímos admin_broadcast e admin_poll para que sejam processados pelo ConversationHandler
     app.add_handler(CallbackQueryHandler(admin_callback_handler, pattern='^(admin_(?!broadcast|poll|fix_days)|access_|au_)'))
     
+    # Paginação da consulta (cursor no callback_data) — também antes do ConversationHandler
+    app.add_handler(CallbackQueryHandler(consulta_pagina_callback, pattern=r'^cq\|'))
+    
     # Conversation Handler (deve vir por último para pegar os callbacks genéricos se não for admin)
     app.add_handler(conv_handler)
 
-    # Iniciar servidor web (Render health check)
-    keep_alive()
+    # Iniciar servidor web (Render health check) — no modo webhook o servidor async já serve /health
+    if not USE_WEBHOOK:
+        keep_alive()
 
     logger.info("="*60)
     logger.info("🤖 BOT TÉCNICO INICIADO COM SUCESSO!")
     logger.info("="*60)
     logger.info(f"📊 Modo: Produção (Render)")
     logger.info(f"🔧 ConversationHandler: Otimizado")
-    logger.info(f"🌐 Servidor web: Ativo")
+    logger.info(f"📡 Recebimento: {'Webhook' if USE_WEBHOOK else 'Polling'}")
+    logger.info(f"🌐 Servidor web: {'aiohttp (mesmo loop do bot)' if USE_WEBHOOK else 'Flask (thread)'}")
     logger.info("="*60)
     
     from telegram.error import Conflict, NetworkError
     from keep_alive import update_health_status
     
     try:
+        if USE_WEBHOOK:
+            from webhook import rodar_webhook, segredo_padrao
+            logger.info("🔄 Iniciando webhook...")
+            asyncio.run(rodar_webhook(
+                app,
+                url=WEBHOOK_URL,
+                caminho=WEBHOOK_PATH,
+                segredo=WEBHOOK_SECRET or segredo_padrao(TOKEN),
+                porta=int(os.environ.get("PORT", 10000))
+            ))
+            return
+
         # Atualizar status antes de iniciar polling
         update_health_status(bot_running=True)
         
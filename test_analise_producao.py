@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Teste da agregação por técnico (analise_producao.py): caminho NumPy igual ao Python puro."""
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import analise_producao
+from config import TZ
+from modelos import Instalacao
+
+
+def checar(nome, obtido, esperado):
+    ok = obtido == esperado
+    print(f"  [{'OK' if ok else 'FALHOU'}] {nome}: esperado={esperado!r} obtido={obtido!r}")
+    return ok
+
+
+def _chave(r):
+    return (r.nome, r.quantidade, round(r.pontos, 6), r.dias, r.turbo, r.faixa['faixa'], round(r.valor, 4))
+
+
+def main():
+    falhas = []
+
+    print("TESTE — agregação por técnico (NumPy e Python puro):")
+    random.seed(7)
+    agora = datetime.now(TZ).replace(microsecond=0)
+    tipos = ['instalacao', 'instalacao_fttr', 'defeito_tv', 'retirada', 'servicos']
+    ano = [
+        Instalacao.de_linha({
+            'tecnico_nome': f'Tec{random.randint(1, 40)}', 'tipo': random.choice(tipos),
+            'data': (agora - timedelta(days=random.randint(0, 364), minutes=random.randint(0, 600))).isoformat()
+        })
+        for _ in range(20000)
+    ]
+    inicio = time.perf_counter()
+    vetorizado = analise_producao.resumo_por_tecnico(ano)
+    ms = (time.perf_counter() - inicio) * 1000
+    np_original = analise_producao.np
+    analise_producao.np = None
+    try:
+        puro = analise_producao.resumo_por_tecnico(ano)
+        contagem_pura = analise_producao.contagem_por_tecnico(ano)
+    finally:
+        analise_producao.np = np_original
+    if not checar('NumPy == Python puro', [_chave(r) for r in vetorizado] == [_chave(r) for r in puro], True):
+        falhas.append('analise_resumo')
+    if not checar('contagem igual', analise_producao.contagem_por_tecnico(ano) == contagem_pura, True):
+        falhas.append('analise_contagem')
+    print(f"  {len(ano)} registros / {len(vetorizado)} técnicos em {ms:.1f} ms (numpy={'sim' if np_original else 'não'})")
+
+    if falhas:
+        print("\nTESTE FALHOU:", falhas)
+        sys.exit(1)
+    print("\nTODOS OS TESTES PASSARAM ✓")
+
+
+main()
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""Teste do armazém de imagens das sessões (armazem_imagens.py): LRU por bytes, TTL e reindexação."""
+import sys
+import tempfile
+import time
+
+from armazem_imagens import ArmazemImagens
+
+
+def checar(nome, obtido, esperado):
+    ok = obtido == esperado
+    print(f"  [{'OK' if ok else 'FALHOU'}] {nome}: esperado={esperado!r} obtido={obtido!r}")
+    return ok
+
+
+def main():
+    falhas = []
+
+    print("TESTE — ArmazemImagens com limite de bytes e expiração:")
+    with tempfile.TemporaryDirectory() as tmp:
+        arm = ArmazemImagens(tmp, limite_bytes=25, ttl=60)
+        r_a = arm.guardar(1, b'a' * 10)
+        r_b = arm.guardar(1, b'b' * 10)
+        arm.ler(r_a)  # a passa a ser a mais recente
+        r_c = arm.guardar(2, b'c' * 10)
+        if not checar('menos usada sai ao passar do limite', arm.disponiveis([r_a, r_b, r_c]), [r_a, r_c]):
+            falhas.append('armazem_lru')
+        if not checar('ler_varios devolve as perdidas', arm.ler_varios([r_a, r_b]), ([b'a' * 10], [r_b])):
+            falhas.append('armazem_ler_varios')
+        if not checar('reinício reindexa o diretório', ArmazemImagens(tmp, 25, 60).disponiveis([r_a, r_c]), [r_a, r_c]):
+            falhas.append('armazem_reindexar')
+        arm.ttl = 0
+        time.sleep(0.01)
+        if not checar('expiradas somem', (arm.ler(r_a), arm.resumo()['bytes']), (None, 0)):
+            falhas.append('armazem_ttl')
+
+    if falhas:
+        print("\nTESTE FALHOU:", falhas)
+        sys.exit(1)
+    print("\nTODOS OS TESTES PASSARAM ✓")
+
+
+main()
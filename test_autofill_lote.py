@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""Teste do autofill com várias imagens numa chamada só (extrair_campos_por_imagens, um objeto por imagem)."""
+import asyncio
+import sys
+
+import utils
+
+
+def checar(nome, obtido, esperado):
+    ok = obtido == esperado
+    print(f"  [{'OK' if ok else 'FALHOU'}] {nome}: esperado={esperado!r} obtido={obtido!r}")
+    return ok
+
+
+async def main():
+    falhas = []
+
+    print("TESTE — extrair_campos_por_imagens com lote multi-imagem:")
+    chamadas_groq = []
+
+    async def fake_groq_multi(system_prompt, user_prompt, images, json_mode=True, retries=2, timeout_seconds=30):
+        chamadas_groq.append(len(images))
+        return ('{"imagens": [{"sa": "39574545", "gpon": null, "serial_do_modem": null, "mesh": []}, '
+                '{"sa": null, "gpon": "A0001C05C", "serial_do_modem": "ZTEGC8A1B2C3", "mesh": ["ZTEGC8A1B2C3"]}]}')
+
+    groq_original = utils._call_groq_vision
+    utils._call_groq_vision = fake_groq_multi
+    try:
+        r = await utils.extrair_campos_por_imagens([b'a', b'b', b'c'])
+    finally:
+        utils._call_groq_vision = groq_original
+    if not checar('uma chamada com as 2 últimas imagens', chamadas_groq, [2]):
+        falhas.append('multi_chamadas')
+    if not checar('sa (imagem 2)', (r.get('sa'), r.info('sa')['imagens']), ('SA-39574545', [1])):
+        falhas.append('multi_origem_sa')
+    if not checar('gpon/serial (imagem 3)', (r.get('gpon'), r.get('serial_do_modem'), r.info('gpon')['imagens']), ('A0001C05C', 'ZTEGC8A1B2C3', [2])):
+        falhas.append('multi_origem_gpon')
+    if not checar('mesh sem o serial do modem', r.get('mesh'), []):
+        falhas.append('multi_mesh')
+
+    if falhas:
+        print("\nTESTE FALHOU:", falhas)
+        sys.exit(1)
+    print("\nTODOS OS TESTES PASSARAM ✓")
+
+
+asyncio.run(main())
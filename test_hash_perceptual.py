@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""Teste do hash perceptual (dHash) usado para ignorar prints repetidos antes do OCR."""
+import io
+import sys
+
+import utils
+
+
+def checar(nome, obtido, esperado):
+    ok = obtido == esperado
+    print(f"  [{'OK' if ok else 'FALHOU'}] {nome}: esperado={esperado!r} obtido={obtido!r}")
+    return ok
+
+
+def main():
+    falhas = []
+
+    print("TESTE — hash perceptual de prints repetidos:")
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        print("  [PULADO] Pillow não instalado")
+        return
+
+    def print_falso(texto, qualidade=90, recorte=0):
+        img = Image.new('RGB', (720, 1280), 'white')
+        d = ImageDraw.Draw(img)
+        d.rectangle([0, 0, 720, 80], fill=(30, 60, 160))
+        for i in range(12):
+            d.text((20, 120 + i * 60), f"{texto} {i}", fill='black')
+            d.line([0, 160 + i * 60, 720, 160 + i * 60], fill=(200, 200, 200))
+        img = img.crop((0, recorte, 720, 1280 - recorte))
+        out = io.BytesIO()
+        img.save(out, 'JPEG', quality=qualidade)
+        return out.getvalue()
+
+    original = utils.hash_perceptual(print_falso('Acesso GPON A0001C05C'))
+    if not checar('mesmo print recomprimido/recortado', utils.imagem_repetida(
+            utils.hash_perceptual(print_falso('Acesso GPON A0001C05C', qualidade=60, recorte=10)), [original]), True):
+        falhas.append('dhash_repetido')
+    if not checar('outra aba não é repetida', utils.imagem_repetida(
+            utils.hash_perceptual(print_falso('Cliente OLNEI ALEXANDRE ABEGG')), [original]), False):
+        falhas.append('dhash_outra_aba')
+
+    if falhas:
+        print("\nTESTE FALHOU:", falhas)
+        sys.exit(1)
+    print("\nTODOS OS TESTES PASSARAM ✓")
+
+
+main()
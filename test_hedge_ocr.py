@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Teste do hedging do OCR das máscaras: Groq lento, o backend reserva começa após o atraso e vence."""
+import asyncio
+import sys
+import time
+
+import utils
+
+TEXTO_OCR_SPACE = "64\t\r\nSA-39574545\t\r\nFTTH\tCAMINHO DA FIBRA\t\r\nAcesso GPON\t\r\nA0001C05C\t\r\n"
+
+
+async def fake_ocr_space(img_bytes):
+    return TEXTO_OCR_SPACE
+
+
+async def fake_groq_lento(system_prompt, user_prompt, images, json_mode=True, retries=2, timeout_seconds=30):
+    await asyncio.sleep(5)
+    return '{"sa": "SA-11111111"}'
+
+
+def checar(nome, obtido, esperado):
+    ok = obtido == esperado
+    print(f"  [{'OK' if ok else 'FALHOU'}] {nome}: esperado={esperado!r} obtido={obtido!r}")
+    return ok
+
+
+async def main():
+    falhas = []
+
+    print("TESTE — extrair_dados_completos com Groq lento (hedge após atraso):")
+    originais = (utils._call_groq_vision, utils._call_ocr_space, utils.OCR_HEDGE_DELAY)
+    utils._call_groq_vision = fake_groq_lento
+    utils._call_ocr_space = fake_ocr_space
+    utils.OCR_HEDGE_DELAY = 0.05
+    utils.roteador_ocr.resetar()
+    try:
+        t0 = time.monotonic()
+        r = await utils.extrair_dados_completos([b'x'] * 5, 'Repasse', provedores=['groq', 'ocr_space'])
+        decorrido = time.monotonic() - t0
+    finally:
+        utils._call_groq_vision, utils._call_ocr_space, utils.OCR_HEDGE_DELAY = originais
+        utils.roteador_ocr.resetar()
+    if not checar('sa (OCR.space venceu)', r.get('sa'), 'SA-39574545'):
+        falhas.append('hedge_sa')
+    if not checar('Groq cancelado (< 2s)', decorrido < 2, True):
+        falhas.append('hedge_tempo')
+
+    if falhas:
+        print("\nTESTE FALHOU:", falhas)
+        sys.exit(1)
+    print("\nTODOS OS TESTES PASSARAM ✓")
+
+
+asyncio.run(main())
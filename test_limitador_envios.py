@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""Teste do limitador de envios (limitador_envios.py): janela deslizante e prioridade das faixas."""
+import asyncio
+import sys
+
+try:
+    from limitador_envios import PRIORIDADE_LOTE, LimitadorEnvios, _Janela
+except ImportError:
+    print("[PULADO] python-telegram-bot não instalado")
+    sys.exit(0)
+
+
+def checar(nome, obtido, esperado):
+    ok = obtido == esperado
+    print(f"  [{'OK' if ok else 'FALHOU'}] {nome}: esperado={esperado!r} obtido={obtido!r}")
+    return ok
+
+
+async def main():
+    falhas = []
+
+    print("TESTE 1 — _Janela (no máximo 2 eventos por segundo):")
+    janela = _Janela(2, 1.0)
+    livre = janela.espera(0.0)
+    janela.consumir(0.0)
+    janela.consumir(0.1)
+    if not checar('espera até o evento mais antigo sair', (livre, round(janela.espera(0.5), 6)), (0.0, 0.5)):
+        falhas.append('janela_espera')
+    if not checar('evento antigo sai da janela', (janela.espera(1.0), janela.ociosa(1.0), janela.ociosa(1.1)), (0.0, False, True)):
+        falhas.append('janela_desliza')
+
+    print("TESTE 2 — interativo passa na frente do lote:")
+    # 1 envio por segundo: quem entrar na fila depois do primeiro espera a próxima vaga
+    limitador = LimitadorEnvios(por_segundo=1, lote_por_segundo=1)
+    ordem = []
+
+    async def enviar(nome):
+        ordem.append(nome)
+        return nome
+
+    async def pedir(nome, chat_id, faixa=None):
+        return await limitador.process_request(enviar, (nome,), {}, 'sendMessage', {'chat_id': chat_id}, faixa)
+
+    await pedir('primeiro', 1)
+    lote = asyncio.create_task(pedir('lote', 2, PRIORIDADE_LOTE))
+    await asyncio.sleep(0.01)
+    interativo = asyncio.create_task(pedir('interativo', 3))
+    await asyncio.gather(lote, interativo)
+    if not checar('ordem de envio', ordem, ['primeiro', 'interativo', 'lote']):
+        falhas.append('faixas_prioridade')
+
+    if falhas:
+        print("\nTESTE FALHOU:", falhas)
+        sys.exit(1)
+    print("\nTODOS OS TESTES PASSARAM ✓")
+
+
+asyncio.run(main())
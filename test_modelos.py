@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""Teste do Instalacao (modelos.py): tipo, pontos e dia calculados uma vez na leitura do banco."""
+import sys
+from datetime import datetime
+
+import utils
+from config import TZ
+from modelos import Instalacao
+from reports import gerar_ranking_texto
+
+
+def checar(nome, obtido, esperado):
+    ok = obtido == esperado
+    print(f"  [{'OK' if ok else 'FALHOU'}] {nome}: esperado={esperado!r} obtido={obtido!r}")
+    return ok
+
+
+def main():
+    falhas = []
+
+    print("TESTE — Instalacao com data/pontos pré-calculados:")
+    agora = datetime.now(TZ).replace(microsecond=0)
+    insts = [
+        Instalacao.de_linha({'sa': 'SA-1', 'tipo': 'Instalacao_FTTR', 'tecnico_nome': 'Ana', 'data': agora.isoformat()}),
+        Instalacao.de_linha({'sa': 'SA-2', 'tipo': None, 'tecnico_nome': 'Ana', 'data': agora.strftime('%d/%m/%Y %H:%M')}),
+        Instalacao.de_linha({'sa': 'SA-3', 'tipo': 'desconhecido', 'tecnico_nome': 'Bia', 'data': 'lixo'}),
+    ]
+    if not checar('tipo/pontos/dia', [(i.tipo, i.pontos, i.dia) for i in insts], [
+        ('instalacao_fttr', 5.57, agora.date()), ('instalacao', 2.28, agora.date()), ('desconhecido', 1.0, None)
+    ]):
+        falhas.append('instalacao_modelo')
+    if not checar('calcular_pontos / dias produtivos', (round(utils.calcular_pontos(insts), 2), utils.contar_dias_produtivos(insts)), (8.85, 1)):
+        falhas.append('instalacao_pontos')
+    ranking = gerar_ranking_texto(insts, is_admin=True)
+    if not checar('ranking usa os campos prontos', ('*Ana*' in ranking, '7.85 pts' in ranking, 'Bia' in ranking), (True, True, False)):
+        falhas.append('instalacao_ranking')
+
+    if falhas:
+        print("\nTESTE FALHOU:", falhas)
+        sys.exit(1)
+    print("\nTODOS OS TESTES PASSARAM ✓")
+
+
+main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""Teste da persistência em SQLite (persistencia.py): sem imagens no banco, escritas agrupadas e restauração."""
+import asyncio
+import os
+import sys
+import tempfile
+
+try:
+    from persistencia import PersistenciaSQLite
+except ImportError:
+    print("[PULADO] python-telegram-bot não instalado")
+    sys.exit(0)
+
+
+def checar(nome, obtido, esperado):
+    ok = obtido == esperado
+    print(f"  [{'OK' if ok else 'FALHOU'}] {nome}: esperado={esperado!r} obtido={obtido!r}")
+    return ok
+
+
+async def main():
+    falhas = []
+    pasta = tempfile.TemporaryDirectory()
+    arquivo = os.path.join(pasta.name, 'estado.sqlite3')
+    try:
+        persistencia = PersistenciaSQLite(arquivo)
+        gravacoes = []
+        gravar_original = persistencia._gravar
+
+        def gravar_contando(user_data, conversas):
+            gravacoes.append((sorted(user_data), sorted(conversas)))
+            gravar_original(user_data, conversas)
+
+        persistencia._gravar = gravar_contando
+
+        print("TESTE 1 — várias mudanças numa gravação só:")
+        await persistencia.update_user_data(1, {
+            'sa': 'SA-39574545',
+            'fotos_mascara': [b'jpeg1', b'jpeg2'],
+            'print_autofill': b'png',
+            'hashes_mascara': [123, 456],
+            'hashes_autofill': [789],
+            'file_ids': ['AgAC-1', 'AgAC-2'],
+        })
+        await persistencia.update_user_data(2, {'sa': 'SA-11111111'})
+        await persistencia.update_conversation('registro', (1, 1), 3)
+        await persistencia.update_conversation('registro', (2, 2), 5)
+        await persistencia._gravacao
+        if not checar('uma transação para 2 técnicos e 2 conversas', len(gravacoes), 1):
+            falhas.append('persistencia_agrupada')
+
+        print("TESTE 2 — estado da conversa None apaga a linha:")
+        await persistencia.update_conversation('registro', (2, 2), None)
+        await persistencia._gravacao
+        linhas = persistencia._conn.execute("SELECT chave FROM conversas WHERE nome = 'registro'").fetchall()
+        if not checar('só a conversa ativa fica no banco', linhas, [('[1, 1]',)]):
+            falhas.append('persistencia_apaga_conversa')
+        await persistencia.flush()
+
+        print("TESTE 3 — restauração após reabrir o arquivo:")
+        reaberta = PersistenciaSQLite(arquivo)
+        try:
+            user_data = await reaberta.get_user_data()
+            conversas = await reaberta.get_conversations('registro')
+        finally:
+            await reaberta.flush()
+        if not checar('user_data sem bytes nem hashes de imagens', user_data.get(1),
+                      {'sa': 'SA-39574545', 'file_ids': ['AgAC-1', 'AgAC-2']}):
+            falhas.append('persistencia_sem_imagens')
+        if not checar('outro técnico restaurado', user_data.get(2), {'sa': 'SA-11111111'}):
+            falhas.append('persistencia_outro_tecnico')
+        if not checar('conversas restauradas', conversas, {(1, 1): 3}):
+            falhas.append('persistencia_conversas')
+    finally:
+        pasta.cleanup()
+
+    if falhas:
+        print("\nTESTE FALHOU:", falhas)
+        sys.exit(1)
+    print("\nTODOS OS TESTES PASSARAM ✓")
+
+
+asyncio.run(main())
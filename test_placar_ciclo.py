@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""Teste do placar do ciclo em memória (placar_ciclo.py) contra o resumo_por_tecnico do ciclo inteiro."""
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import analise_producao
+import placar_ciclo
+import utils
+from config import TZ
+from modelos import Instalacao
+from reports import gerar_ranking_placar
+
+
+def checar(nome, obtido, esperado):
+    ok = obtido == esperado
+    print(f"  [{'OK' if ok else 'FALHOU'}] {nome}: esperado={esperado!r} obtido={obtido!r}")
+    return ok
+
+
+def _chave(r):
+    return (r.nome, r.quantidade, round(r.pontos, 6), r.dias, r.turbo, r.faixa['faixa'], round(r.valor, 4))
+
+
+def main():
+    falhas = []
+
+    print("TESTE — placar do ciclo em memória:")
+    random.seed(7)
+    tipos = ['instalacao', 'instalacao_fttr', 'defeito_tv', 'retirada', 'servicos']
+    ini_ciclo, fim_ciclo = utils.ciclo_atual()
+    agora = min(datetime.now(TZ), fim_ciclo).replace(microsecond=0)
+    dias_ciclo = max(0, (agora - ini_ciclo).days)
+    ciclo = []
+    for _ in range(3000):
+        tecnico = random.randint(1, 40)
+        ciclo.append(Instalacao.de_linha({
+            'tecnico_id': tecnico, 'tecnico_nome': f'Tec{tecnico}', 'tipo': random.choice(tipos),
+            'data': max(ini_ciclo, agora - timedelta(days=random.randint(0, dias_ciclo), minutes=random.randint(0, 600))).isoformat()
+        }))
+    metade = len(ciclo) // 2
+
+    p = placar_ciclo.PlacarCiclo()
+    p.registrar(ciclo[:10])
+    if not checar('sem carga = desligado', (p.pronto, p.top(), p.total_instalacoes), (False, [], 0)):
+        falhas.append('placar_desligado')
+    p.carregar(ciclo[:metade], ini_ciclo, fim_ciclo)
+    inicio = time.perf_counter()
+    for inst in ciclo[metade:]:
+        p.registrar([inst])
+    ms = (time.perf_counter() - inicio) * 1000
+    p.registrar([Instalacao.de_linha({'tecnico_id': 1, 'tecnico_nome': 'Tec1', 'data': (ini_ciclo - timedelta(days=1)).isoformat()})])
+    if not checar('top = resumo do ciclo', [_chave(r) for r in p.top()] == [_chave(r) for r in analise_producao.resumo_por_tecnico(ciclo)], True):
+        falhas.append('placar_top')
+
+    primeiro, segundo = p.top(2)
+    pos = p.posicao(int(segundo.nome[3:]))
+    proxima = next((t for t in reversed(utils.TABELA_FAIXAS) if t['min'] > segundo.pontos), None)
+    if not checar('posição / distâncias', (
+        p.posicao(int(primeiro.nome[3:])).posicao, pos.posicao, round(pos.falta_posicao, 6),
+        round(pos.falta_faixa, 6), p.posicao(999)
+    ), (1, 2, round(primeiro.pontos - segundo.pontos, 6), round(proxima['min'] - segundo.pontos, 6) if proxima else 0.0, None)):
+        falhas.append('placar_posicao')
+
+    # Homônimos não se misturam; quem muda de nome mantém os pontos (chave = tecnico_id)
+    homonimos = placar_ciclo.PlacarCiclo()
+    homonimos.carregar([
+        Instalacao.de_linha({'tecnico_id': 1, 'tecnico_nome': 'João', 'tipo': 'instalacao', 'data': agora.isoformat()}),
+        Instalacao.de_linha({'tecnico_id': 2, 'tecnico_nome': 'João', 'tipo': 'retirada', 'data': agora.isoformat()}),
+    ], ini_ciclo, fim_ciclo)
+    homonimos.registrar([Instalacao.de_linha({'tecnico_id': 2, 'tecnico_nome': 'João Pedro', 'tipo': 'instalacao', 'data': agora.isoformat()})])
+    if not checar('chave por tecnico_id', (
+        [(r.nome, r.quantidade) for r in homonimos.top()], homonimos.posicao(1).pontos, homonimos.posicao(2).posicao
+    ), ([('João Pedro', 2), ('João', 1)], 2.28, 1)):
+        falhas.append('placar_tecnico_id')
+
+    vazio = placar_ciclo.PlacarCiclo()
+    vazio.carregar([], ini_ciclo, fim_ciclo)
+    if not checar('ciclo vazio carrega', (vazio.pronto, vazio.top(), vazio.total_tecnicos), (True, [], 0)):
+        falhas.append('placar_vazio')
+
+    texto = gerar_ranking_placar(p, is_admin=False)
+    if not checar('ranking do placar', (f'*{primeiro.nome}*' in texto, f'{len(ciclo)} instalações' in texto), (True, True)):
+        falhas.append('placar_ranking')
+
+    ciclo_original = placar_ciclo.ciclo_atual
+    placar_ciclo.ciclo_atual = lambda: (fim_ciclo + timedelta(minutes=1), fim_ciclo + timedelta(days=30))
+    try:
+        if not checar('virada do ciclo zera', (p.top(), p.total_instalacoes, p.pronto), ([], 0, True)):
+            falhas.append('placar_virada')
+    finally:
+        placar_ciclo.ciclo_atual = ciclo_original
+    print(f"  {len(ciclo) - metade} registros somados um a um em {ms:.1f} ms")
+
+    if falhas:
+        print("\nTESTE FALHOU:", falhas)
+        sys.exit(1)
+    print("\nTODOS OS TESTES PASSARAM ✓")
+
+
+main()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""Teste do processador de updates (processador_updates.py): ordem por técnico, paralelismo entre técnicos."""
+import asyncio
+import sys
+import time
+from datetime import datetime
+
+try:
+    from telegram import Chat, Message, Update, User
+    from processador_updates import ProcessadorPorUsuario
+except ImportError:
+    print("[PULADO] python-telegram-bot não instalado")
+    sys.exit(0)
+
+
+def checar(nome, obtido, esperado):
+    ok = obtido == esperado
+    print(f"  [{'OK' if ok else 'FALHOU'}] {nome}: esperado={esperado!r} obtido={obtido!r}")
+    return ok
+
+
+def update_de(update_id, user_id):
+    chat = Chat(user_id, Chat.PRIVATE)
+    usuario = User(user_id, f"Técnico {user_id}", False)
+    return Update(update_id, message=Message(update_id, datetime.now(), chat, from_user=usuario))
+
+
+async def main():
+    falhas = []
+    processador = ProcessadorPorUsuario(8)
+    eventos = []
+
+    async def handler_lento(nome, espera):
+        eventos.append(('inicio', nome))
+        await asyncio.sleep(espera)
+        eventos.append(('fim', nome))
+
+    print("TESTE — dois técnicos, handlers lentos:")
+    t0 = time.monotonic()
+    # O primeiro update do técnico 1 é o mais lento: o segundo não pode passar na frente
+    await asyncio.gather(
+        processador.process_update(update_de(1, 1), handler_lento('t1-a', 0.3)),
+        processador.process_update(update_de(2, 1), handler_lento('t1-b', 0.1)),
+        processador.process_update(update_de(3, 2), handler_lento('t2-a', 0.3)),
+    )
+    decorrido = time.monotonic() - t0
+
+    do_tecnico_1 = [e for e in eventos if e[1].startswith('t1')]
+    if not checar('técnico 1 em ordem, um de cada vez', do_tecnico_1,
+                  [('inicio', 't1-a'), ('fim', 't1-a'), ('inicio', 't1-b'), ('fim', 't1-b')]):
+        falhas.append('processador_ordem')
+    inicio_t2 = eventos.index(('inicio', 't2-a'))
+    if not checar('técnico 2 começa antes do técnico 1 terminar', inicio_t2 < eventos.index(('fim', 't1-a')), True):
+        falhas.append('processador_paralelo')
+    if not checar('tempo total ~ fila do técnico 1 (< 0.55s)', decorrido < 0.55, True):
+        falhas.append('processador_tempo')
+    if not checar('filas vazias ao final', (processador._filas, processador._na_fila), ({}, {})):
+        falhas.append('processador_filas')
+
+    if falhas:
+        print("\nTESTE FALHOU:", falhas)
+        sys.exit(1)
+    print("\nTODOS OS TESTES PASSARAM ✓")
+
+
+asyncio.run(main())
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""Teste do registro em lote (registro_lote.py): leitura de texto/CSV e validação por linha."""
+import sys
+
+import registro_lote
+
+
+def checar(nome, obtido, esperado):
+    ok = obtido == esperado
+    print(f"  [{'OK' if ok else 'FALHOU'}] {nome}: esperado={esperado!r} obtido={obtido!r}")
+    return ok
+
+
+def main():
+    falhas = []
+
+    print("TESTE — registro em lote (texto/CSV, validação):")
+    texto = (
+        "12345678; ABCD1234; Instalação + Mesh; ztegc8123456; ZTEGC8999999, ZTEGC8888888\n"
+        "\n"
+        "12345678; ABCD1234; instalacao; ZTEGC8123456\n"
+        "SA-87654321 | ABCD9999 | Defeito Banda Larga\n"
+        "123; ABCD1234; instalacao; ZTEGC8123456\n"
+        "22222222; ABCD1234; instalacao\n"
+    )
+    categoria = lambda tipo: 'reparo' if tipo.startswith('defeito') else 'instalacao'
+    validas, erros = registro_lote.validar_linhas(registro_lote.ler_texto(texto), categoria)
+    if not checar('válidas (SA normalizada, tipo do rótulo, mesh)', [(r['sa'], r['tipo'], r.get('serial_modem'), r.get('serial_mesh')) for r in validas], [
+        ('SA-12345678', 'instalacao_mesh', 'ZTEGC8123456', 'ZTEGC8999999, ZTEGC8888888'),
+        ('SA-87654321', 'defeito_banda_larga', 'Não Trocado', None),
+    ]):
+        falhas.append('lote_validas')
+    if not checar('erros por linha', [e.split(':')[0] for e in erros], ['Linha 3', 'Linha 5', 'Linha 6']):
+        falhas.append('lote_erros')
+    csv_bytes = "Tipo;SA;GPON;Serial\r\ninstalacao_tv;33333333;GPON3333;ZTEGC8333333\r\n".encode('cp1252')
+    if not checar('CSV com cabeçalho em outra ordem', registro_lote.validar_linhas(registro_lote.ler_csv(csv_bytes), categoria)[0], [
+        {'linha': 2, 'sa': 'SA-33333333', 'gpon': 'GPON3333', 'tipo': 'instalacao_tv', 'categoria': 'instalacao', 'serial_modem': 'ZTEGC8333333'}
+    ]):
+        falhas.append('lote_csv')
+    if not checar('limite de linhas', len(registro_lote.validar_linhas(registro_lote.ler_texto(texto), categoria, max_linhas=1)[0]), 1):
+        falhas.append('lote_limite')
+
+    if falhas:
+        print("\nTESTE FALHOU:", falhas)
+        sys.exit(1)
+    print("\nTODOS OS TESTES PASSARAM ✓")
+
+
+main()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Teste da confiança/origem por campo (ResultadoOCR) e da junção dos prints do autofill."""
+import asyncio
+import sys
+
+import utils
+
+TEXTO_OCR_SPACE = "64\t\r\nSA-39574545\t\r\nFTTH\tCAMINHO DA FIBRA\t\r\nAcesso GPON\t\r\nA0001C05C\t\r\n"
+
+
+async def fake_ocr_space(img_bytes):
+    return TEXTO_OCR_SPACE
+
+
+async def fake_groq_vazio(system_prompt, user_prompt, images, json_mode=True, retries=2, timeout_seconds=30):
+    return "{}"
+
+
+async def fake_groq_parcial(system_prompt, user_prompt, images, json_mode=True, retries=2, timeout_seconds=30):
+    return '{"sa": "SA-39574545", "gpon": "A0001C05C", "cliente": "", "telefone": "", "endereco": "", "cdo": "", "porta": "", "documento": ""}'
+
+
+def checar(nome, obtido, esperado):
+    ok = obtido == esperado
+    print(f"  [{'OK' if ok else 'FALHOU'}] {nome}: esperado={esperado!r} obtido={obtido!r}")
+    return ok
+
+
+async def main():
+    falhas = []
+    groq_original, ocr_space_original = utils._call_groq_vision, utils._call_ocr_space
+    utils._call_ocr_space = fake_ocr_space
+    try:
+        print("TESTE 1 — confiança/origem dos campos (ResultadoOCR):")
+        utils._call_groq_vision = fake_groq_vazio
+        fallback = await utils.extrair_dados_completos([b'x'] * 2, 'Repasse', provedores=['groq', 'ocr_space'])
+        utils._call_groq_vision = fake_groq_parcial
+        groq = await utils.extrair_dados_completos([b'x'] * 2, 'Repasse', provedores=['groq', 'ocr_space'])
+        info_sa = fallback.info('sa')
+        if not checar('origem da SA no fallback', (info_sa['backend'], info_sa['imagens'], info_sa['validado']), ('ocr_space', [0], True)):
+            falhas.append('fonte_sa')
+        if not checar('SA do Groq dispensa chamada focada', groq.campos_incertos(['sa', 'gpon']), []):
+            falhas.append('confianca_groq')
+        if not checar('campo vazio é incerto', groq.campos_incertos(['cliente']), ['cliente']):
+            falhas.append('confianca_vazio')
+        fraco = utils.como_resultado_ocr({'gpon': 'A0001C05C', 'cliente': 'X'}, 'tesseract')
+        if not checar('tesseract sozinho abaixo do mínimo', fraco.confianca('gpon') < utils.OCR_CONFIANCA_MINIMA, True):
+            falhas.append('confianca_tesseract')
+        fraco.mesclar(utils.como_resultado_ocr({'gpon': 'A0001C05C'}, 'ocr_space'))
+        if not checar('concordância entre backends', fraco.confianca('gpon') >= 0.95, True):
+            falhas.append('concordancia')
+
+        # Mesma sequência do receber_print_autofill: cada print novo é lido e mesclado ao anterior
+        print("TESTE 2 — autofill com dois prints mostrando mesh diferentes:")
+
+        async def fake_groq_print1(system_prompt, user_prompt, images, json_mode=True, retries=2, timeout_seconds=30):
+            return '{"sa": "39574545", "gpon": "A0001C05C", "serial_do_modem": "ZTEGC8A1B2C3", "mesh": ["ZTEGC8AAAAAA"]}'
+
+        async def fake_groq_print2(system_prompt, user_prompt, images, json_mode=True, retries=2, timeout_seconds=30):
+            return ('{"imagens": [{"sa": "39574545", "gpon": null, "serial_do_modem": null, "mesh": ["ZTEGC8AAAAAA"]}, '
+                    '{"sa": null, "gpon": null, "serial_do_modem": null, "mesh": ["ZTEGC8BBBBBB"]}]}')
+
+        utils._call_groq_vision = fake_groq_print1
+        anterior = await utils.extrair_campos_por_imagens([b'a'])
+        utils._call_groq_vision = fake_groq_print2
+        campos = anterior.campos_incertos(['sa', 'gpon', 'serial_do_modem']) + ['mesh']
+        atual = utils.como_resultado_ocr(anterior).mesclar(await utils.extrair_campos_por_imagens([b'a', b'b'], campos))
+        if not checar('mesh dos dois prints', (atual.get('mesh'), atual.info('mesh')['imagens']), (['ZTEGC8AAAAAA', 'ZTEGC8BBBBBB'], [0, 1])):
+            falhas.append('autofill_mesh')
+        if not checar('campos do primeiro print mantidos', (atual.get('sa'), atual.get('serial_do_modem')), ('SA-39574545', 'ZTEGC8A1B2C3')):
+            falhas.append('autofill_campos')
+    finally:
+        utils._call_groq_vision, utils._call_ocr_space = groq_original, ocr_space_original
+
+    if falhas:
+        print("\nTESTE FALHOU:", falhas)
+        sys.exit(1)
+    print("\nTODOS OS TESTES PASSARAM ✓")
+
+
+asyncio.run(main())
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""Teste do registro de provedores de OCR e do roteador (rebaixa quem falha ou passa do orçamento de latência)."""
+import asyncio
+import sys
+
+import utils
+
+
+def checar(nome, obtido, esperado):
+    ok = obtido == esperado
+    print(f"  [{'OK' if ok else 'FALHOU'}] {nome}: esperado={esperado!r} obtido={obtido!r}")
+    return ok
+
+
+async def main():
+    falhas = []
+
+    print("TESTE 1 — provedor falso quebrado é rebaixado:")
+    utils.roteador_ocr.resetar()
+    quebrado = utils.ProvedorOCRFalso('falso_quebrado', [], erro=RuntimeError('fora do ar'))
+    bom = utils.ProvedorOCRFalso('falso_bom', [{'sa': '39574545', 'gpon': 'A0001C05C'}], latencia=0.01)
+    utils.registrar_provedor_ocr(quebrado)
+    utils.registrar_provedor_ocr(bom)
+    provedores = ['falso_quebrado', 'falso_bom']
+    try:
+        for _ in range(utils.OCR_ROTEADOR_MIN_AMOSTRAS + 1):
+            r = await utils.extrair_dados_completos([b'x'], 'Repasse', provedores=provedores)
+        if not checar('sa do provedor falso', r.get('sa'), 'SA-39574545'):
+            falhas.append('roteador_sa')
+        if not checar('ordem após falhas', utils.roteador_ocr.ordenar(provedores), ['falso_bom', 'falso_quebrado']):
+            falhas.append('roteador_ordem')
+        chamadas_antes = quebrado.chamadas
+        await utils.extrair_dados_completos([b'x'], 'Repasse', provedores=provedores)
+        if not checar('rebaixado não é chamado quando o primeiro vence', quebrado.chamadas, chamadas_antes):
+            falhas.append('roteador_rebaixado')
+    finally:
+        for nome in provedores:
+            utils.PROVEDORES_OCR.pop(nome, None)
+        utils.roteador_ocr.resetar()
+
+    print("TESTE 2 — latência comparada por chamada:")
+    # Groq com 6 imagens = 3 chamadas: 30s no total são 10s por chamada, dentro do orçamento
+    try:
+        for _ in range(utils.OCR_ROTEADOR_MIN_AMOSTRAS):
+            utils._registrar_no_roteador('groq', True, 30.0, [b'x'] * 6)
+        stats = utils.roteador_ocr.estatisticas('groq')
+        if not checar('vários lotes não rebaixam', (stats['p95'], stats['saudavel']), (10.0, True)):
+            falhas.append('roteador_latencia_por_chamada')
+    finally:
+        utils.roteador_ocr.resetar()
+
+    if falhas:
+        print("\nTESTE FALHOU:", falhas)
+        sys.exit(1)
+    print("\nTODOS OS TESTES PASSARAM ✓")
+
+
+asyncio.run(main())
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""Teste do parser do streaming do Groq (_ParserJSONStream): descarta <think> e para quando o JSON fecha."""
+import sys
+
+import utils
+
+
+def checar(nome, obtido, esperado):
+    ok = obtido == esperado
+    print(f"  [{'OK' if ok else 'FALHOU'}] {nome}: esperado={esperado!r} obtido={obtido!r}")
+    return ok
+
+
+def main():
+    falhas = []
+
+    print("TESTE — _ParserJSONStream (think partido + JSON com chaves dentro de string):")
+    parser = utils._ParserJSONStream()
+    chunks = ["<thi", "nk>vou montar {\"sa\": ...}</th", "ink>\n{\"sa\": \"SA-1", "23456\", \"obs\": \"a}b{\"", "}", " texto extra {"]
+    obtido = None
+    lidos = 0
+    for ch in chunks:
+        lidos += 1
+        obtido = parser.feed(ch)
+        if obtido is not None:
+            break
+    if not checar('json do stream', obtido, '{"sa": "SA-123456", "obs": "a}b{"}'):
+        falhas.append('stream_json')
+    if not checar('chunks lidos (parou antes do texto extra)', lidos, 5):
+        falhas.append('stream_early_stop')
+
+    if falhas:
+        print("\nTESTE FALHOU:", falhas)
+        sys.exit(1)
+    print("\nTODOS OS TESTES PASSARAM ✓")
+
+
+main()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Teste das cotas de OCR (uso_ocr.py): técnico acima da cota cai para o OCR local e /metrics só mostra totais."""
+import asyncio
+import sys
+
+import uso_ocr
+import utils
+
+TEXTO_OCR_SPACE = "64\t\r\nSA-39574545\t\r\nFTTH\tCAMINHO DA FIBRA\t\r\nAcesso GPON\t\r\nA0001C05C\t\r\n"
+
+
+def checar(nome, obtido, esperado):
+    ok = obtido == esperado
+    print(f"  [{'OK' if ok else 'FALHOU'}] {nome}: esperado={esperado!r} obtido={obtido!r}")
+    return ok
+
+
+async def main():
+    falhas = []
+    chamadas_groq = []
+
+    async def fake_groq(system_prompt, user_prompt, images, json_mode=True, retries=2, timeout_seconds=30):
+        chamadas_groq.append(len(images))
+        return '{"sa": "SA-11111111"}'
+
+    async def fake_tesseract(images, tipo_mascara=None):
+        return {'sa': '39574545', 'gpon': 'A0001C05C'}
+
+    async def fake_ocr_space(img_bytes):
+        return TEXTO_OCR_SPACE
+
+    originais = (uso_ocr.OCR_QUOTA_GROQ_TOKENS_USUARIO_DIA, utils.USE_GROQ, utils._call_groq_vision,
+                 utils.extrair_dados_tesseract, utils._call_ocr_space)
+    uso_ocr.OCR_QUOTA_GROQ_TOKENS_USUARIO_DIA = 100
+    utils.USE_GROQ = True
+    utils._call_groq_vision = fake_groq
+    utils.extrair_dados_tesseract = fake_tesseract
+    utils._call_ocr_space = fake_ocr_space
+    registro = utils.uso_ocr
+    registro._dias.clear()
+    try:
+        print("TESTE 1 — cota por técnico:")
+        uso_ocr.definir_usuario_ocr(1)
+        registro.registrar('groq', tokens_entrada=80, tokens_saida=30, latencia=1.0)
+        if not checar('técnico acima da cota é recusado', registro.permitido('groq'), False):
+            falhas.append('cota_recusa')
+        uso_ocr.definir_usuario_ocr(2)
+        if not checar('outro técnico continua liberado', registro.permitido('groq'), True):
+            falhas.append('cota_outro_tecnico')
+
+        print("TESTE 2 — recusa cai para o OCR local:")
+        uso_ocr.definir_usuario_ocr(1)
+        r = await utils.extrair_campos_por_imagens([b'a'])
+        if not checar('autofill lido pelo Tesseract', (r.get('sa'), r.info('sa')['backend'], chamadas_groq), ('SA-39574545', 'tesseract', [])):
+            falhas.append('cota_tesseract')
+        bloqueadas = registro._somar(registro._hoje(), 'groq', 1)['bloqueadas']
+        if not checar('cada recusa contada uma vez', bloqueadas, 2):
+            falhas.append('cota_bloqueadas')
+        r = await utils.extrair_dados_completos([b'a'], 'Repasse', provedores=['groq', 'ocr_space'])
+        if not checar('máscara sai pelo backend reserva (CotaOCRExcedida)', (r.get('sa'), r.info('sa')['backend'], chamadas_groq), ('SA-39574545', 'ocr_space', [])):
+            falhas.append('cota_reserva')
+
+        print("TESTE 3 — resumo do /metrics:")
+        resumo = registro.resumo()
+        if not checar('só totais (sem IDs do Telegram)', (sorted(resumo), resumo['tecnicos'], resumo['total']['groq']['tokens_saida']),
+                      (['dia', 'tecnicos', 'total'], 1, 30)):
+            falhas.append('cota_resumo')
+    finally:
+        (uso_ocr.OCR_QUOTA_GROQ_TOKENS_USUARIO_DIA, utils.USE_GROQ, utils._call_groq_vision,
+         utils.extrair_dados_tesseract, utils._call_ocr_space) = originais
+        uso_ocr.definir_usuario_ocr(None)
+        registro._dias.clear()
+        utils.roteador_ocr.resetar()
+
+    if falhas:
+        print("\nTESTE FALHOU:", falhas)
+        sys.exit(1)
+    print("\nTODOS OS TESTES PASSARAM ✓")
+
+
+asyncio.run(main())
@@ -0,0 +1,119 @@
+"""
+Registro de uso do OCR remoto (Groq e OCR.space) por técnico e por dia, com cotas.
+
+O técnico da chamada atual é guardado num ContextVar (definir_usuario_ocr no início
+do handler); tarefas criadas a partir do handler herdam o valor. Chamadas sem técnico
+(benchmark, tarefas internas) entram no total do dia mas não têm cota individual.
+"""
+import logging
+import threading
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Optional
+
+from config import TZ
+from config import (
+    OCR_QUOTA_GROQ_TOKENS_USUARIO_DIA, OCR_QUOTA_GROQ_TOKENS_DIA,
+    OCR_QUOTA_OCR_SPACE_USUARIO_DIA, OCR_QUOTA_OCR_SPACE_DIA,
+)
+
+logger = logging.getLogger(__name__)
+
+DIAS_MANTIDOS = 7
+
+usuario_ocr: ContextVar[Optional[int]] = ContextVar('usuario_ocr', default=None)
+
+
+def definir_usuario_ocr(user_id: Optional[int]):
+    """Associa as próximas chamadas de OCR deste handler (e das tarefas que ele criar) ao técnico."""
+    usuario_ocr.set(user_id)
+
+
+class CotaOCRExcedida(Exception):
+    """Cota diária do provedor esgotada para este técnico (ou global) — não é falha do provedor."""
+
+
+def _novo_contador() -> Dict[str, float]:
+    return {'chamadas': 0, 'tokens_entrada': 0, 'tokens_saida': 0, 'latencia_total': 0.0, 'erros_429': 0, 'bloqueadas': 0}
+
+
+class RegistroUsoOCR:
+    def __init__(self):
+        # dia → user_id (None = sem técnico) → backend → contador
+        self._dias: Dict[str, Dict[Optional[int], Dict[str, Dict[str, float]]]] = {}
+        # /metrics lê de outra thread (Flask)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _hoje() -> str:
+        return datetime.now(TZ).date().isoformat()
+
+    def _contador(self, dia: str, user_id: Optional[int], backend: str) -> Dict[str, float]:
+        if dia not in self._dias:
+            self._dias[dia] = {}
+            for antigo in sorted(self._dias)[:-DIAS_MANTIDOS]:
+                del self._dias[antigo]
+        return self._dias[dia].setdefault(user_id, {}).setdefault(backend, _novo_contador())
+
+    def registrar(self, backend: str, tokens_entrada: int = 0, tokens_saida: int = 0,
+                  latencia: float = 0.0, erro_429: bool = False):
+        with self._lock:
+            c = self._contador(self._hoje(), usuario_ocr.get(), backend)
+            c['chamadas'] += 1
+            c['tokens_entrada'] += tokens_entrada
+            c['tokens_saida'] += tokens_saida
+            c['latencia_total'] += latencia
+            if erro_429:
+                c['erros_429'] += 1
+
+    def _somar(self, dia: str, backend: str, user_id=...) -> Dict[str, float]:
+        total = _novo_contador()
+        for uid, backends in self._dias.get(dia, {}).items():
+            if user_id is not ... and uid != user_id:
+                continue
+            for k, v in backends.get(backend, {}).items():
+                total[k] += v
+        return total
+
+    def permitido(self, backend: str) -> bool:
+        """False se a chamada estouraria a cota do técnico ou a global do dia (o chamador cai para o OCR local)."""
+        user_id = usuario_ocr.get()
+        dia = self._hoje()
+        with self._lock:
+            if backend == 'groq':
+                usado_usuario = self._somar(dia, 'groq', user_id)
+                usado_total = self._somar(dia, 'groq')
+                tokens_usuario = usado_usuario['tokens_entrada'] + usado_usuario['tokens_saida']
+                tokens_total = usado_total['tokens_entrada'] + usado_total['tokens_saida']
+                excedeu = (
+                    (user_id is not None and 0 < OCR_QUOTA_GROQ_TOKENS_USUARIO_DIA <= tokens_usuario)
+                    or 0 < OCR_QUOTA_GROQ_TOKENS_DIA <= tokens_total
+                )
+            elif backend == 'ocr_space':
+                excedeu = (
+                    (user_id is not None and 0 < OCR_QUOTA_OCR_SPACE_USUARIO_DIA <= self._somar(dia, 'ocr_space', user_id)['chamadas'])
+                    or 0 < OCR_QUOTA_OCR_SPACE_DIA <= self._somar(dia, 'ocr_space')['chamadas']
+                )
+            else:
+                return True
+            if excedeu:
+                self._contador(dia, user_id, backend)['bloqueadas'] += 1
+                logger.warning(f"[OCR] Cota diária de {backend} atingida (usuário {user_id}) — usando OCR local")
+        return not excedeu
+
+    def resumo(self, dia: str = None) -> Dict[str, object]:
+        """Uso do dia por backend (total) — exposto em /metrics. O /metrics é público (sem
+        autenticação, e no modo webhook fica na mesma URL do bot), então não sai nada por
+        técnico além da quantidade: IDs do Telegram e o uso de cada um ficam só em memória."""
+        dia = dia or self._hoje()
+        with self._lock:
+            usuarios = self._dias.get(dia, {})
+            backends = {b for u in usuarios.values() for b in u}
+            total = {b: self._somar(dia, b) for b in sorted(backends)}
+            tecnicos = sum(1 for uid in usuarios if uid is not None)
+        for c in total.values():
+            c['latencia_media'] = round(c['latencia_total'] / c['chamadas'], 2) if c['chamadas'] else 0.0
+        return {'dia': dia, 'total': total, 'tecnicos': tecnicos}
+
+
+uso_ocr = RegistroUsoOCR()
@@ -1,17 +1,29 @@
 from datetime import datetime
-from config import TZ, PONTOS_SERVICO, TABELA_FAIXAS, USE_GROQ, GROQ_API_KEY, GROQ_MODEL, CICLO_DIA_INICIO, CICLO_DIAS_TURBO, OCR_SPACE_API_KEY, USE_OCR_SPACE
+from config import TZ, TABELA_FAIXAS, USE_GROQ, GROQ_API_KEY, GROQ_MODEL, GROQ_STREAM, OCR_PROMPT_COMPACTO, CICLO_DIA_INICIO, CICLO_DIAS_TURBO, OCR_SPACE_API_KEY, USE_OCR_SPACE
+from config import OCR_HEDGE_DELAY, OCR_DEADLINE, OCR_HEDGE_BACKENDS, OCR_CONFIANCA_MINIMA, OCR_DHASH_DISTANCIA
+from config import OCR_ROTEADOR_JANELA, OCR_ROTEADOR_MIN_AMOSTRAS, OCR_ROTEADOR_TAXA_MINIMA, OCR_ROTEADOR_LATENCIA_MAX
 import base64
+import hashlib
 import json
 import re
 import logging
 import asyncio
-from typing import List, Optional, Dict, Any
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import List, Optional, Dict, Any, Tuple
+from uso_ocr import uso_ocr, CotaOCRExcedida
 
 # Configurar logger
 logger = logging.getLogger(__name__)
 
 # ==================== PROMPTS E CONSTANTES OCR ====================
 
+# Batching: modelo suporta até 3 imagens, mas plano free (8000 TPM) estoura
+# com 3 (~8700 tokens) — usar no máximo 2 por lote.
+GROQ_MAX_POR_LOTE = 2
+
 OCR_SYSTEM_DEFAULT = (
     "Você é um especialista em OCR de dados técnicos de telecomunicações. "
     "Sua tarefa é extrair EXATAMENTE os dados solicitados de prints de tela de sistemas técnicos. "
@@ -53,6 +65,14 @@ OCR_USER_DEFAULT = (
     "}"
 )
 
+# Variante com várias imagens numa chamada só: mesmas instruções, um objeto por imagem
+OCR_USER_MULTI = (
+    "Você receberá VÁRIAS imagens. Aplique as instruções abaixo a CADA imagem separadamente.\n\n"
+    + OCR_USER_DEFAULT.split("Retorne o JSON no seguinte formato:")[0]
+    + "Retorne UM objeto por imagem, NA MESMA ORDEM em que as imagens foram enviadas:\n"
+    '{"imagens": [{"sa": "...", "gpon": "...", "serial_do_modem": "...", "mesh": ["..."]}]}'
+)
+
 OCR_SYSTEM_MASK = (
     "Você é um especialista em OCR de sistemas técnicos de telecomunicações. "
     "Sua tarefa é extrair TODOS os dados solicitados com MÁXIMA precisão. "
@@ -75,6 +95,8 @@ CAMPO_INSTRUCOES = {
     'atividade': "Tipo de atividade/serviço. Procure na ABA INFO por 'Atividade' (ex: INSTALAÇÃO BL + MESH)."
 }
 
+OCR_SYSTEM_ESPECIFICO = "Você é um especialista em OCR. Extraia apenas o dado solicitado. Se não encontrar, retorne null no JSON."
+
 OCR_PROMPTS_ESPECIFICOS = {
     "sa": (
         "Extraia APENAS o número da SA (Service Order/OS/Pedido).\n"
@@ -113,8 +135,73 @@ OCR_PROMPTS_ESPECIFICOS = {
     )
 }
 
+# ==================== PROMPTS COMPACTOS ====================
+# Mesmas regras dos prompts acima em poucas palavras, e só para os campos pedidos.
+# Cada chamada do plano free conta no limite de 8000 TPM: cada token de texto
+# economizado é espaço para imagem.
+
+OCR_SYSTEM_COMPACTO = "OCR de prints de sistema de telecom. Extraia só o pedido, sem inventar. Responda APENAS JSON."
+
+DICAS_CAMPO = {
+    'sa': "topo da tela, 'SA' (ex: SA-37285421; só número → prefixo SA-)",
+    'gpon': "aba REDE, 'Acesso GPON' (6-20 alfanum., ex: A0002VH1E; não é CPF/telefone/serial)",
+    'serial_do_modem': "S/N da ONT/ONU principal (8-20 alfanum., ex: ZTEGC8A1B2C3; não é mesh nem GPON)",
+    'mesh': "lista de seriais de mesh/AP/FTTR (8-20 alfanum.; sem o serial da ONT)",
+    'cliente': "aba CLIENTE/INFO, 'Cliente'",
+    'documento': "aba INFO, 'Doc. Assoc.'",
+    'telefone': "aba CLIENTE, 'Contato 1'",
+    'endereco': "aba CLIENTE/INFO, 'Endereço' completo",
+    'cdo': "aba REDE, CDOPath antes de '.PTP' (ex: CDOI-1220.2)",
+    'porta': "aba REDE, número após 'PTP.FO.O:'",
+    'estacao': "aba REDE, 'Estação'/'Central'",
+    'atividade': "aba INFO, 'Atividade'",
+}
+
+
+def estimar_tokens(texto: str) -> int:
+    """~4 caracteres por token (mesma estimativa do registro de uso)."""
+    return len(texto) // 4
+
+
+def compilar_prompt(campos: List[str], dicas: Dict[str, str] = None, num_imagens: int = 1,
+                    por_imagem: bool = False, contexto: str = "") -> str:
+    """
+    Monta o prompt compacto pedindo só `campos`, com uma linha de dica por campo.
+    por_imagem=True pede {"imagens": [...]} com um objeto por imagem.
+    """
+    dicas = dicas or DICAS_CAMPO
+    esqueleto = "{" + ",".join(f'"{c}":[]' if c == 'mesh' else f'"{c}":""' for c in campos) + "}"
+    formato = f'{{"imagens":[{esqueleto}]}} (um objeto por imagem, na ordem)' if por_imagem else esqueleto
+    prompt = (
+        f"{contexto}{num_imagens} imagem(ns) = abas diferentes do mesmo ticket; combine os dados de todas. Extraia:\n"
+        + "\n".join(f"- {c}: {dicas.get(c, c)}" for c in campos)
+        + "\nMAIÚSCULAS (exceto telefone/documento). Ausente: \"\". JSON: " + formato
+    )
+    logger.info(f"[OCR] Prompt compacto ({len(campos)} campo(s)): ~{estimar_tokens(prompt)} tokens")
+    return prompt
+
+
+def custo_prompts() -> Dict[str, int]:
+    """Tokens estimados de texto (system + user) de cada prompt, completo vs compacto — usado no benchmark."""
+    autofill = ['sa', 'gpon', 'serial_do_modem', 'mesh']
+    custo = {
+        'autofill_completo': estimar_tokens(OCR_SYSTEM_DEFAULT + OCR_USER_DEFAULT),
+        'autofill_compacto': estimar_tokens(OCR_SYSTEM_COMPACTO + compilar_prompt(autofill)),
+        'autofill_multi_completo': estimar_tokens(OCR_SYSTEM_DEFAULT + OCR_USER_MULTI),
+        'autofill_multi_compacto': estimar_tokens(OCR_SYSTEM_COMPACTO + compilar_prompt(autofill, num_imagens=2, por_imagem=True)),
+    }
+    for campo, prompt in OCR_PROMPTS_ESPECIFICOS.items():
+        custo[f'{campo}_completo'] = estimar_tokens(OCR_SYSTEM_ESPECIFICO + prompt)
+        custo[f'{campo}_compacto'] = estimar_tokens(OCR_SYSTEM_COMPACTO + compilar_prompt([campo]))
+    return custo
+
 # ==================== VALIDAÇÃO ====================
 
+def normalizar_sa(sa) -> str:
+    """SA só com números ganha o prefixo SA- (formato salvo no banco)."""
+    sa = str(sa or '').strip().upper()
+    return f"SA-{sa}" if sa.isdigit() else sa
+
 def is_valid_sa(sa: str) -> bool:
     try:
         # Accept both formats: "SA-12345" and just numeric "12345"
@@ -155,6 +242,113 @@ def is_valid_serial(s: str) -> bool:
     except Exception:
         return False
 
+# ==================== CONFIANÇA POR CAMPO ====================
+
+# Confiança base de cada backend; campos que passam no validador ganham um bônus,
+# os que falham ficam baixos, e o mesmo valor lido por dois backends é quase certo.
+CONFIANCA_BACKEND = {'groq': 0.8, 'ocr_space': 0.7, 'tesseract': 0.5}
+VALIDADORES_CAMPO = {
+    'sa': is_valid_sa,
+    'gpon': is_valid_gpon,
+    'serial_do_modem': is_valid_serial,
+}
+
+
+class ResultadoOCR(dict):
+    """
+    Resultado de extração (campo → valor) que também guarda a origem de cada campo.
+    Continua sendo um dict comum para quem só lê os valores; .info(campo) devolve
+    backend, imagens de origem, status de validação e confiança (0-1).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fontes: Dict[str, Dict[str, Any]] = {}
+
+    def registrar(self, campo: str, valor, backend: str, imagens: Optional[List[int]] = None):
+        self[campo] = valor
+        self.fontes[campo] = {'backend': backend, 'imagens': list(imagens or []), 'concordancia': 1}
+
+    def validado(self, campo: str) -> Optional[bool]:
+        """True/False pelo validador do campo; None se o campo não tem validador."""
+        validador = VALIDADORES_CAMPO.get(campo)
+        if validador is None:
+            return None
+        return bool(validador(str(self.get(campo) or '')))
+
+    def confianca(self, campo: str) -> float:
+        valor = self.get(campo)
+        if not valor:
+            return 0.0
+        fonte = self.fontes.get(campo, {})
+        conf = CONFIANCA_BACKEND.get(fonte.get('backend'), 0.5)
+        validado = self.validado(campo)
+        if validado is False:
+            return min(conf, 0.3)
+        if validado:
+            conf += 0.15
+        if fonte.get('concordancia', 1) > 1:
+            conf = max(conf, 0.95)
+        return round(min(conf, 1.0), 2)
+
+    def info(self, campo: str) -> Dict[str, Any]:
+        fonte = self.fontes.get(campo, {})
+        return {
+            'valor': self.get(campo),
+            'backend': fonte.get('backend'),
+            'imagens': fonte.get('imagens', []),
+            'validado': self.validado(campo),
+            'confianca': self.confianca(campo),
+        }
+
+    def campos_incertos(self, campos: List[str], minimo: float = None) -> List[str]:
+        """Campos ausentes ou abaixo da confiança mínima — os únicos que valem nova chamada."""
+        minimo = OCR_CONFIANCA_MINIMA if minimo is None else minimo
+        return [c for c in campos if self.confianca(c) < minimo]
+
+    def mesclar(self, outro: dict) -> 'ResultadoOCR':
+        """
+        Completa campos vazios com os do outro resultado. Valor igual conta como
+        concordância; valor diferente só substitui se o outro tiver mais confiança.
+        Listas (mesh) viram a união sem repetição: cada print pode mostrar outros seriais.
+        """
+        outro = como_resultado_ocr(outro)
+        for campo, valor in outro.items():
+            if not valor:
+                self.setdefault(campo, valor)
+                continue
+            atual = self.get(campo)
+            if not atual:
+                self[campo] = valor
+                self.fontes[campo] = dict(outro.fontes.get(campo, {}))
+            elif str(atual).strip().upper() == str(valor).strip().upper():
+                if outro.fontes.get(campo, {}).get('backend') != self.fontes.get(campo, {}).get('backend'):
+                    self.fontes.setdefault(campo, {})['concordancia'] = self.fontes[campo].get('concordancia', 1) + 1
+            elif isinstance(atual, list) and isinstance(valor, list):
+                novos = [v for v in valor if v not in atual]
+                if novos:
+                    self[campo] = atual + novos
+                    fonte = self.fontes.setdefault(campo, {})
+                    imagens = fonte.get('imagens', []) + outro.fontes.get(campo, {}).get('imagens', [])
+                    fonte['imagens'] = sorted(set(imagens))
+            elif outro.confianca(campo) > self.confianca(campo):
+                self[campo] = valor
+                self.fontes[campo] = dict(outro.fontes.get(campo, {}))
+        return self
+
+
+def como_resultado_ocr(dados: Optional[dict], backend: str = None) -> ResultadoOCR:
+    """Converte um dict simples (ex: backend de terceiros) em ResultadoOCR com a origem informada."""
+    if isinstance(dados, ResultadoOCR):
+        return dados
+    resultado = ResultadoOCR()
+    for campo, valor in (dados or {}).items():
+        if valor:
+            resultado.registrar(campo, valor, backend)
+        else:
+            resultado[campo] = valor
+    return resultado
+
 def _normalizar_campos_finais(resultado: dict) -> dict:
     """
     Normalização final dos campos críticos extraídos pela IA.
@@ -233,21 +427,12 @@ def formata_brl(v: float) -> str:
     return f"R$ {s}"
 
 def calcular_pontos(instalacoes: list) -> float:
-    """Calcula o total de pontos de uma lista de instalações."""
-    total = 0.0
-    for inst in instalacoes:
-        tipo = str(inst.get('tipo') or 'instalacao').lower()
-        total += PONTOS_SERVICO.get(tipo, 1.0)
-    return total
+    """Calcula o total de pontos de uma lista de Instalacao (pontos já calculados no modelo)."""
+    return sum(inst.pontos for inst in instalacoes)
 
 def contar_dias_produtivos(instalacoes: list) -> int:
-    """Conta quantos dias únicos existem na lista de instalações."""
-    dias = set()
-    for inst in instalacoes:
-        dt = parse_data(inst.get('data', ''))
-        if dt:
-            dias.add(dt.date())
-    return len(dias)
+    """Conta quantos dias únicos existem na lista de Instalacao."""
+    return len({inst.dia for inst in instalacoes if inst.dia})
 
 def obter_faixa_valor(pontos: float):
     """Retorna a faixa de valor baseada nos pontos."""
@@ -302,6 +487,119 @@ def _limpar_resposta_ocr(raw: str, json_mode: bool = True) -> str:
     raw = raw.strip()
     return raw or ("{}" if json_mode else "")
 
+class _ParserJSONStream:
+    """
+    Parser incremental para respostas em streaming do modelo.
+    - Descarta o bloco <think>...</think> (reasoning do qwen) conforme os tokens chegam
+    - Detecta o fechamento do primeiro objeto JSON {...} (respeitando strings e escapes)
+    Assim a chamada pode ser encerrada sem esperar o resto da geração.
+    """
+    TAG_ABRE = "<think>"
+    TAG_FECHA = "</think>"
+
+    def __init__(self):
+        self.texto = ""
+        self.json_completo: Optional[str] = None
+        self._pos = 0
+        self._em_think = False
+        self._inicio_json = -1
+        self._profundidade = 0
+        self._em_string = False
+        self._escape = False
+
+    def feed(self, parte: str) -> Optional[str]:
+        """Adiciona um pedaço da resposta. Retorna o JSON assim que ele estiver completo."""
+        if self.json_completo is not None:
+            return self.json_completo
+        self.texto += parte
+        texto = self.texto
+        while self._pos < len(texto):
+            if self._em_think:
+                fim = texto.find(self.TAG_FECHA, self._pos)
+                if fim == -1:
+                    # Mantém margem para a tag de fechamento chegar partida entre chunks
+                    self._pos = max(self._pos, len(texto) - len(self.TAG_FECHA) + 1)
+                    return None
+                self._pos = fim + len(self.TAG_FECHA)
+                self._em_think = False
+                continue
+
+            c = texto[self._pos]
+            if self._inicio_json == -1:
+                if c == '<':
+                    resto = texto[self._pos:self._pos + len(self.TAG_ABRE)]
+                    if resto == self.TAG_ABRE:
+                        self._em_think = True
+                        self._pos += len(self.TAG_ABRE)
+                        continue
+                    if self.TAG_ABRE.startswith(resto):
+                        return None  # Tag <think> ainda incompleta: aguardar próximo chunk
+                elif c == '{':
+                    self._inicio_json = self._pos
+                    self._profundidade = 1
+                self._pos += 1
+                continue
+
+            # Dentro do JSON: contar chaves fora de strings
+            if self._em_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._em_string = False
+            elif c == '"':
+                self._em_string = True
+            elif c == '{':
+                self._profundidade += 1
+            elif c == '}':
+                self._profundidade -= 1
+                if self._profundidade == 0:
+                    self.json_completo = texto[self._inicio_json:self._pos + 1]
+                    self._pos += 1
+                    return self.json_completo
+            self._pos += 1
+        return None
+
+def _executar_completion(client, kwargs: dict, json_mode: bool, stream: bool, cancelado=None) -> str:
+    """
+    Executa a chamada de chat completion (bloqueante — roda no executor).
+    Com stream=True, lê os tokens conforme chegam e fecha a conexão assim que o
+    primeiro JSON completo aparece (o reasoning <think> é descartado no caminho).
+    `cancelado` (threading.Event) interrompe a leitura quando o chamador desistiu (timeout).
+    """
+    if not stream:
+        resp = client.chat.completions.create(**kwargs)
+        raw = resp.choices[0].message.content or ("{}" if json_mode else "")
+        return _limpar_resposta_ocr(raw, json_mode)
+
+    resposta = client.chat.completions.create(stream=True, **kwargs)
+    parser = _ParserJSONStream()
+    chunks = 0
+    try:
+        for chunk in resposta:
+            if cancelado is not None and cancelado.is_set():
+                logger.info("[OCR] Stream cancelado pelo chamador")
+                break
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content or ""
+            if not delta:
+                continue
+            chunks += 1
+            if parser.feed(delta) is not None and json_mode:
+                logger.info(f"[OCR] JSON completo após {chunks} chunks — encerrando stream antecipadamente")
+                break
+    finally:
+        try:
+            resposta.close()
+        except Exception:
+            pass
+
+    if parser.json_completo is not None:
+        return parser.json_completo
+    return _limpar_resposta_ocr(parser.texto, json_mode)
+
 async def _call_groq_vision(
     system_prompt: str,
     user_prompt: str,
@@ -312,6 +610,9 @@ async def _call_groq_vision(
 ) -> str:
     """
     Função centralizada para chamar a API de visão da Groq com retry, fallback de modelos e timeout.
+    Com GROQ_STREAM ativo, a resposta é lida em streaming e encerrada assim que o JSON fecha.
+    A cota (uso_ocr.permitido) é checada por quem chama, uma vez por extração: checar de
+    novo aqui contaria a mesma recusa duas vezes em 'bloqueadas'.
     """
     logger.info(f"[OCR] Iniciando chamada Groq - USE_GROQ: {USE_GROQ}, GROQ_API_KEY setado: {bool(GROQ_API_KEY)}, Groq disponível: {Groq is not None}")
     
@@ -337,6 +638,11 @@ async def _call_groq_vision(
             from PIL import Image
             import io as _io
             img = Image.open(_io.BytesIO(img_bytes))
+            if img.format == 'JPEG' and max(img.size) <= max_size:
+                # Já no tamanho do envio: re-encodar só perderia qualidade
+                return img_bytes
+            # JPEG grande: decodifica já reduzido (escala DCT), bem mais rápido que decodificar inteiro
+            img.draft('RGB', (max_size, max_size))
             if img.mode not in ('RGB', 'L'):
                 img = img.convert('RGB')
             img.thumbnail((max_size, max_size), Image.LANCZOS)
@@ -359,9 +665,12 @@ async def _call_groq_vision(
     logger.info(f"[OCR] Enviando {len(compressed_images)} imagem(ns) numa única chamada")
 
     content = [{"type": "text", "text": user_prompt}]
+    # Estimativa de tokens de entrada para o registro de uso (~4 chars/token no texto)
+    tokens_entrada = len(system_prompt + user_prompt) // 4
     for idx, img in enumerate(compressed_images):
         b64 = base64.b64encode(img).decode("ascii")
         est_tokens = len(b64) // 750
+        tokens_entrada += est_tokens
         logger.info(f"[OCR] Imagem {idx+1}: {len(b64)} chars base64 (~{est_tokens} tokens)")
         content.append({
             "type": "image_url",
@@ -374,6 +683,7 @@ async def _call_groq_vision(
         logger.info(f"[OCR] Tentativa {attempt+1}/{retries+1}")
         for model in models:
             logger.info(f"[OCR] Tentando modelo: {model}")
+            t0 = time.monotonic()
             try:
                 async def call_api():
                     # Groq qwen vision: instruções no user message junto com a imagem
@@ -394,26 +704,35 @@ async def _call_groq_vision(
                     # json_mode desativado para evitar erros de validação JSON
                     # if json_mode and attempt == 0:
                     #     kwargs["response_format"] = {"type": "json_object"}
-                    
+
                     loop = asyncio.get_running_loop()
-                    resp = await loop.run_in_executor(
-                        None,
-                        lambda: client.chat.completions.create(**kwargs)
-                    )
-                    raw = resp.choices[0].message.content or ("{}" if json_mode else "")
-                    return _limpar_resposta_ocr(raw, json_mode)
-                
+                    cancelado = threading.Event()
+                    try:
+                        return await loop.run_in_executor(
+                            None,
+                            lambda: _executar_completion(client, kwargs, json_mode, GROQ_STREAM, cancelado)
+                        )
+                    finally:
+                        # Timeout/cancelamento: avisa a thread para parar de ler o stream
+                        cancelado.set()
+
                 result = await asyncio.wait_for(call_api(), timeout=timeout_seconds)
+                uso_ocr.registrar('groq', tokens_entrada, len(result or '') // 4, time.monotonic() - t0)
                 logger.info(f"[OCR] Sucesso com modelo {model}! Resultado: {result[:200] if result else 'VAZIO'}...")
                 return result
                 
             except asyncio.TimeoutError:
+                uso_ocr.registrar('groq', tokens_entrada, 0, time.monotonic() - t0)
                 last_error = f"Timeout ({timeout_seconds}s)"
                 logging.warning(f"Groq vision timeout (tentativa {attempt+1}, modelo {model})")
                 continue
                 
             except Exception as e:
                 err_str = str(e)
+                uso_ocr.registrar(
+                    'groq', tokens_entrada, 0, time.monotonic() - t0,
+                    erro_429="429" in err_str or "rate_limit" in err_str.lower()
+                )
                 if "json_validate_failed" in err_str or "400" in err_str:
                     logging.warning(f"[OCR] 400 json_validate_failed — retentando sem response_format")
                     try:
@@ -428,13 +747,17 @@ async def _call_groq_vision(
                                 "max_completion_tokens": 1024,
                             }
                             loop2 = asyncio.get_running_loop()
-                            r = await loop2.run_in_executor(
-                                None,
-                                lambda: client.chat.completions.create(**kw)
-                            )
-                            return r.choices[0].message.content or ""
-                        raw = await asyncio.wait_for(call_api_no_json(), timeout=timeout_seconds)
-                        limpo = _limpar_resposta_ocr(raw, json_mode)
+                            cancelado2 = threading.Event()
+                            try:
+                                return await loop2.run_in_executor(
+                                    None,
+                                    lambda: _executar_completion(client, kw, json_mode, GROQ_STREAM, cancelado2)
+                                )
+                            finally:
+                                cancelado2.set()
+                        t1 = time.monotonic()
+                        limpo = await asyncio.wait_for(call_api_no_json(), timeout=timeout_seconds)
+                        uso_ocr.registrar('groq', tokens_entrada, len(limpo or '') // 4, time.monotonic() - t1)
                         if limpo and limpo != "{}":
                             logger.info(f"[OCR] Fallback sem json_mode funcionou!")
                             return limpo
@@ -460,13 +783,85 @@ async def _call_groq_vision(
     return "{}" if json_mode else ""
 
 
-async def extrair_campos_por_imagem(image_bytes: bytes) -> dict:
+# ==================== DEDUPLICAÇÃO DE PRINTS ====================
+
+def hash_perceptual(image_bytes: bytes, lado: int = 16) -> str:
+    """
+    dHash da imagem (lado² bits, em hex): compara cada pixel com o vizinho da direita
+    numa miniatura em tons de cinza. Prints repetidos ou recortes levemente diferentes
+    da mesma aba ficam a poucos bits de distância. Sem Pillow, cai para o SHA-1 dos bytes
+    (só detecta cópias idênticas).
+    """
+    try:
+        from PIL import Image
+        import io as _io
+        img = Image.open(_io.BytesIO(image_bytes)).convert('L').resize((lado + 1, lado), Image.LANCZOS)
+        px = list(img.getdata())
+        bits = 0
+        for y in range(lado):
+            linha = px[y * (lado + 1):(y + 1) * (lado + 1)]
+            for x in range(lado):
+                bits = (bits << 1) | (linha[x] > linha[x + 1])
+        return f"d{lado}:{bits:0{lado * lado // 4}x}"
+    except Exception as e:
+        logger.debug(f"[OCR] dHash indisponível ({e}) — usando SHA-1")
+        return f"sha1:{hashlib.sha1(image_bytes).hexdigest()}"
+
+
+def imagem_repetida(hash_novo: str, hashes_sessao: List[str], distancia_max: int = None) -> bool:
+    """True se o print já foi enviado nesta sessão (mesmo hash ou dHash a até distancia_max bits)."""
+    distancia_max = OCR_DHASH_DISTANCIA if distancia_max is None else distancia_max
+    tipo, _, valor = hash_novo.partition(':')
+    for anterior in hashes_sessao:
+        tipo_ant, _, valor_ant = anterior.partition(':')
+        if tipo_ant != tipo:
+            continue
+        if tipo == 'sha1':
+            if valor == valor_ant:
+                return True
+        elif bin(int(valor, 16) ^ int(valor_ant, 16)).count('1') <= distancia_max:
+            return True
+    return False
+
+CAMPOS_AUTOFILL = ['sa', 'gpon', 'serial_do_modem', 'mesh']
+
+async def extrair_campos_por_imagem(image_bytes: bytes, indice: int = 0, campos: List[str] = None) -> ResultadoOCR:
     """
     Extrai SA, GPON, Serial Modem e Mesh de uma imagem.
+    indice é a posição da imagem na sessão (fica registrado na origem de cada campo).
+    campos limita o prompt compacto aos campos ainda faltando (padrão: todos).
+    Com a cota do Groq estourada, lê SA/GPON pelo Tesseract local.
     """
+    if USE_GROQ and not uso_ocr.permitido('groq'):
+        return await _campos_autofill_tesseract(image_bytes, indice)
+    return await _campos_autofill_groq(image_bytes, indice, campos)
+
+
+async def _campos_autofill_tesseract(image_bytes: bytes, indice: int) -> ResultadoOCR:
+    """SA/GPON de uma imagem pelo Tesseract local (cota do Groq estourada)."""
+    local = await extrair_dados_tesseract([image_bytes])
+    resultado = ResultadoOCR(sa=None, gpon=None, serial_do_modem=None, mesh=[])
+    sa = normalizar_sa(local.get('sa'))
+    gpon = str(local.get('gpon') or '').strip().upper()
+    if is_valid_sa(sa):
+        resultado.registrar('sa', sa, 'tesseract', [indice])
+    if is_valid_gpon(gpon):
+        resultado.registrar('gpon', gpon, 'tesseract', [indice])
+    return resultado
+
+
+async def _campos_autofill_groq(image_bytes: bytes, indice: int, campos: List[str] = None) -> ResultadoOCR:
+    """Uma imagem pelo Groq; a cota já foi checada por quem chama."""
     # Tenta extração via JSON mode
-    response_text = await _call_groq_vision(OCR_SYSTEM_DEFAULT, OCR_USER_DEFAULT, [image_bytes], json_mode=True)
-    
+    if OCR_PROMPT_COMPACTO:
+        system, user = OCR_SYSTEM_COMPACTO, compilar_prompt(campos or CAMPOS_AUTOFILL)
+    else:
+        system, user = OCR_SYSTEM_DEFAULT, OCR_USER_DEFAULT
+    response_text = await _call_groq_vision(system, user, [image_bytes], json_mode=True)
+    return _validar_campos_autofill(_carregar_json_solto(response_text), [indice])
+
+
+def _carregar_json_solto(response_text: str) -> dict:
     data = {}
     try:
         data = json.loads(response_text)
@@ -478,7 +873,11 @@ async def extrair_campos_por_imagem(image_bytes: bytes) -> dict:
                 data = json.loads(match.group(0))
         except:
             pass
+    return data if isinstance(data, dict) else {}
+
 
+def _validar_campos_autofill(data: dict, imagens: List[int]) -> ResultadoOCR:
+    """Normaliza e valida SA/GPON/serial/mesh lidos pelo Groq para as imagens indicadas."""
     # Normalização e Validação
     sa = str(data.get("sa") or "").strip().upper()
     gpon = str(data.get("gpon") or "").strip().upper()
@@ -501,15 +900,14 @@ async def extrair_campos_por_imagem(image_bytes: bytes) -> dict:
     # Vamos confiar que se a IA falhou no JSON, o Regex de fallback no texto bruto seria complexo de implementar sem uma chamada de "descreva a imagem".
     # Mas podemos fazer uma segunda chamada pedindo texto bruto se tudo falhar. Por enquanto, vamos manter simples.
 
-    return {
-        "sa": sa,
-        "gpon": gpon,
-        "serial_do_modem": serial,
-        "mesh": mesh
-    }
+    resultado = ResultadoOCR(sa=None, gpon=None, serial_do_modem=None, mesh=[])
+    for campo, valor in (("sa", sa), ("gpon", gpon), ("serial_do_modem", serial), ("mesh", mesh)):
+        if valor:
+            resultado.registrar(campo, valor, 'groq', imagens)
+    return resultado
 
 
-async def extrair_campos_por_imagens(images: list) -> dict:
+async def extrair_campos_por_imagens(images: list, campos: List[str] = None) -> ResultadoOCR:
     """
     Processa múltiplas imagens e agrega os resultados.
 
@@ -517,35 +915,75 @@ async def extrair_campos_por_imagens(images: list) -> dict:
     Processa apenas as ÚLTIMAS 2 imagens. O fluxo de autofill chama esta função
     a cada foto nova, re-processando todas as acumuladas — com 3+ imagens isso
     estoura o limite. As imagens anteriores já foram analisadas na chamada anterior.
+    As 2 imagens vão numa única chamada (OCR_USER_MULTI, um objeto por imagem), então
+    o prompt e a ida e volta são pagos uma vez só. Com OCR_PROMPT_COMPACTO, campos
+    restringe o pedido aos que ainda faltam.
     """
-    agg = {"sa": None, "gpon": None, "serial_do_modem": None, "mesh": []}
+    agg = ResultadoOCR(sa=None, gpon=None, serial_do_modem=None, mesh=[])
     
     # Últimas 2 imagens apenas (as demais já foram processadas em chamadas anteriores)
-    imagens_para_processar = images[-2:] if len(images) > 2 else images
+    inicio = max(0, len(images) - 2)
+    imagens_para_processar = images[inicio:]
     logger.info(f"[OCR] extrair_campos_por_imagens: {len(images)} imagem(ns) recebida(s), processando {len(imagens_para_processar)} (últimas)")
 
-    for img in imagens_para_processar:
-        d = await extrair_campos_por_imagem(img)
-        
-        # Merge inteligente: Prioriza valores válidos sobre Nones
-        if d.get("sa") and not agg["sa"]: agg["sa"] = d["sa"]
-        if d.get("gpon") and not agg["gpon"]: agg["gpon"] = d["gpon"]
-        if d.get("serial_do_modem") and not agg["serial_do_modem"]: agg["serial_do_modem"] = d["serial_do_modem"]
+    for idx, d in await _extrair_campos_lote(imagens_para_processar, inicio, campos):
+        # Merge inteligente: Prioriza valores válidos sobre Nones (e conta concordância)
+        mesh_novo = d.pop("mesh", [])
+        agg.mesclar(d)
         
         # Merge de listas sem duplicatas
-        for m in d.get("mesh", []):
+        for m in mesh_novo:
             if m not in agg["mesh"] and m != agg["gpon"] and m != agg["serial_do_modem"]:
                 agg["mesh"].append(m)
+                agg.fontes.setdefault("mesh", {'backend': 'groq', 'imagens': [], 'concordancia': 1})["imagens"].append(idx)
                 
     return agg
 
-async def extrair_campo_especifico(images: List[bytes], campo: str) -> dict:
+async def _extrair_campos_lote(images: List[bytes], inicio: int, campos: List[str] = None) -> List[tuple]:
+    """
+    Uma chamada para o lote inteiro; devolve [(índice, ResultadoOCR)] na ordem das imagens.
+    Resposta fora do formato por imagem cai para uma chamada por imagem.
+    """
+    if USE_GROQ and not uso_ocr.permitido('groq'):
+        return [(idx, await _campos_autofill_tesseract(img, idx)) for idx, img in enumerate(images, start=inicio)]
+    if len(images) == 1:
+        return [(inicio, await _campos_autofill_groq(images[0], inicio, campos))]
+
+    indices = list(range(inicio, inicio + len(images)))
+    if OCR_PROMPT_COMPACTO:
+        system = OCR_SYSTEM_COMPACTO
+        user = compilar_prompt(campos or CAMPOS_AUTOFILL, num_imagens=len(images), por_imagem=True)
+    else:
+        system, user = OCR_SYSTEM_DEFAULT, f"São {len(images)} imagens.\n" + OCR_USER_MULTI
+    data = _carregar_json_solto(await _call_groq_vision(system, user, images, json_mode=True))
+    if not data:
+        # Groq fora/sem resposta: repetir imagem por imagem só gastaria mais cota
+        return [(idx, ResultadoOCR(sa=None, gpon=None, serial_do_modem=None, mesh=[])) for idx in indices]
+
+    por_imagem = data.get("imagens")
+    if isinstance(por_imagem, list) and len(por_imagem) == len(images) and all(isinstance(d, dict) for d in por_imagem):
+        return [(idx, _validar_campos_autofill(d, [idx])) for idx, d in zip(indices, por_imagem)]
+    if any(k in data for k in ("sa", "gpon", "serial_do_modem", "mesh")):
+        # Modelo juntou tudo num objeto só: vale para o lote inteiro
+        logger.info("[OCR] Lote multi-imagem respondeu objeto único — atribuindo ao lote")
+        return [(inicio, _validar_campos_autofill(data, indices))]
+
+    logger.warning(f"[OCR] Lote multi-imagem fora do formato ({str(data)[:200]}) — uma chamada por imagem")
+    return [(idx, await _campos_autofill_groq(img, idx, campos)) for idx, img in enumerate(images, start=inicio)]
+
+async def extrair_campo_especifico(images: List[bytes], campo: str, offset: int = 0) -> ResultadoOCR:
     """
     Extrai um campo específico de uma ou mais imagens com prompt focado.
     Se houver mais de 3 imagens, processa em lotes e faz merge (primeiro valor válido ganha).
+    offset é a posição da primeira imagem na sessão (para a origem dos campos).
     """
-    user_prompt = OCR_PROMPTS_ESPECIFICOS.get(campo, f"Extraia o campo {campo}. Retorne JSON.")
-    system_prompt = "Você é um especialista em OCR. Extraia apenas o dado solicitado. Se não encontrar, retorne null no JSON."
+    if USE_GROQ and not uso_ocr.permitido('groq'):
+        return ResultadoOCR()
+    if OCR_PROMPT_COMPACTO:
+        system_prompt, user_prompt = OCR_SYSTEM_COMPACTO, None  # montado por lote (nº de imagens)
+    else:
+        user_prompt = OCR_PROMPTS_ESPECIFICOS.get(campo, f"Extraia o campo {campo}. Retorne JSON.")
+        system_prompt = OCR_SYSTEM_ESPECIFICO
 
     def validar(campo: str, data: dict) -> dict:
         """Valida o campo extraído com as regras do campo."""
@@ -567,15 +1005,13 @@ async def extrair_campo_especifico(images: List[bytes], campo: str) -> dict:
             if valid_mesh: result["mesh"] = valid_mesh
         return result
 
-    # Batching: modelo suporta até 3 imagens, mas plano free (8000 TPM) estoura
-    # com 3 (~8700 tokens) — usar no máximo 2 por lote.
-    MAX_POR_LOTE = 2
-    lotes = [images[i:i+MAX_POR_LOTE] for i in range(0, len(images), MAX_POR_LOTE)]
+    lotes = [images[i:i+GROQ_MAX_POR_LOTE] for i in range(0, len(images), GROQ_MAX_POR_LOTE)]
     logger.info(f"[OCR] extrair_campo_especifico('{campo}'): {len(images)} imagens → {len(lotes)} lote(s)")
 
-    result = {}
+    result = ResultadoOCR()
     for idx_batch, lote in enumerate(lotes):
-        response_text = await _call_groq_vision(system_prompt, user_prompt, lote, json_mode=True)
+        prompt_lote = user_prompt or compilar_prompt([campo], num_imagens=len(lote))
+        response_text = await _call_groq_vision(system_prompt, prompt_lote, lote, json_mode=True)
         try:
             data = json.loads(response_text)
         except json.JSONDecodeError as e:
@@ -584,25 +1020,288 @@ async def extrair_campo_especifico(images: List[bytes], campo: str) -> dict:
         batch_result = validar(campo, data)
         if batch_result:
             # Merge: primeiro valor válido ganha
+            primeira = offset + idx_batch * GROQ_MAX_POR_LOTE
             for k, v in batch_result.items():
                 if not result.get(k):
-                    result[k] = v
+                    result.registrar(k, v, 'groq', list(range(primeira, primeira + len(lote))))
             logger.info(f"[OCR] extrair_campo_especifico '{campo}' lote {idx_batch+1}/{len(lotes)}: {batch_result}")
 
     logger.info(f"[OCR] extrair_campo_especifico '{campo}' resultado final: {result}")
     return result
 
-async def extrair_dados_completos(images: List[bytes], tipo_mascara: str = None) -> dict:
+def _resultado_valido(resultado: dict, ja_extraidos: dict = None) -> bool:
+    """
+    Um resultado de OCR 'vence' a corrida de backends se trouxer SA ou GPON válidos. Num
+    lote seguinte da mesma máscara, com SA/GPON já achados pelos anteriores, basta trazer
+    algum campo (as abas seguintes não costumam repetir SA/GPON).
+    """
+    if is_valid_sa(resultado.get('sa') or '') or is_valid_gpon(resultado.get('gpon') or ''):
+        return True
+    return bool(ja_extraidos) and _resultado_valido(ja_extraidos) and any(resultado.values())
+
+# ==================== PROVEDORES DE OCR ====================
+
+class ProvedorOCR(ABC):
+    """Interface de um provedor de OCR das máscaras: extrair(images, tipo_mascara) → dict de campos.
+
+    ja_extraidos traz o que lotes anteriores da mesma máscara já acharam; quem puder
+    usa para pedir só o que falta. latencia_maxima é o orçamento (s) de cada chamada ao
+    serviço; o roteador compara com ela a latência por chamada (total / lotes())."""
+    nome = ''
+    latencia_maxima = OCR_ROTEADOR_LATENCIA_MAX
+
+    def lotes(self, images: List[bytes]) -> int:
+        """Quantas chamadas ao serviço uma extração de images faz (padrão: uma por imagem)."""
+        return max(1, len(images))
+
+    @abstractmethod
+    async def extrair(self, images: List[bytes], tipo_mascara: str = None, ja_extraidos: dict = None) -> dict:
+        ...
+
+
+class ProvedorGroq(ProvedorOCR):
+    nome = 'groq'
+
+    def lotes(self, images):
+        return max(1, math.ceil(len(images) / GROQ_MAX_POR_LOTE))
+
+    async def extrair(self, images, tipo_mascara=None, ja_extraidos=None):
+        if USE_GROQ and not uso_ocr.permitido('groq'):
+            raise CotaOCRExcedida('groq')
+        return await _extrair_dados_groq(images, tipo_mascara, ja_extraidos)
+
+
+class ProvedorOCRSpace(ProvedorOCR):
+    nome = 'ocr_space'
+
+    async def extrair(self, images, tipo_mascara=None, ja_extraidos=None):
+        if USE_OCR_SPACE and not uso_ocr.permitido('ocr_space'):
+            raise CotaOCRExcedida('ocr_space')
+        return await extrair_dados_ocr_space(images, tipo_mascara)
+
+
+class ProvedorTesseract(ProvedorOCR):
+    nome = 'tesseract'
+
+    async def extrair(self, images, tipo_mascara=None, ja_extraidos=None):
+        return await extrair_dados_tesseract(images, tipo_mascara)
+
+
+class ProvedorOCRFalso(ProvedorOCR):
+    """Provedor para testes/benchmark: devolve respostas fixas após uma latência, ou levanta erro."""
+
+    def __init__(self, nome: str, respostas: List[dict], latencia: float = 0.0, erro: Exception = None):
+        self.nome = nome
+        self.respostas = list(respostas) or [{}]
+        self.latencia = latencia
+        self.erro = erro
+        self.chamadas = 0
+
+    def lotes(self, images):
+        return 1
+
+    async def extrair(self, images, tipo_mascara=None, ja_extraidos=None):
+        self.chamadas += 1
+        await asyncio.sleep(self.latencia)
+        if self.erro:
+            raise self.erro
+        return dict(self.respostas[min(self.chamadas - 1, len(self.respostas) - 1)])
+
+
+PROVEDORES_OCR: Dict[str, ProvedorOCR] = {}
+
+
+def registrar_provedor_ocr(provedor: ProvedorOCR):
+    PROVEDORES_OCR[provedor.nome] = provedor
+
+
+for _provedor in (ProvedorGroq(), ProvedorOCRSpace(), ProvedorTesseract()):
+    registrar_provedor_ocr(_provedor)
+
+
+class RoteadorOCR:
+    """
+    Acompanha, numa janela móvel de tempo, a taxa de sucesso (SA/GPON válidos) e o p95
+    de latência por chamada de cada provedor. ordenar() mantém a ordem de preferência
+    configurada, mas manda para o fim os provedores que estão falhando ou com p95 acima
+    do próprio latencia_maxima — assim um Groq fora do ar deixa de segurar cada máscara
+    pelo OCR_HEDGE_DELAY. Amostras antigas saem da janela, então o provedor rebaixado
+    volta sozinho quando para de falhar.
+
+    O /metrics (thread do Flask) lê o resumo enquanto o loop do bot registra amostras,
+    por isso todo acesso a _amostras passa pelo lock.
+    """
+
+    def __init__(self):
+        self._amostras: Dict[str, List[tuple]] = {}
+        self._lock = threading.Lock()
+
+    def resetar(self):
+        with self._lock:
+            self._amostras.clear()
+
+    def registrar(self, nome: str, sucesso: Optional[bool], latencia: float):
+        """latencia é por chamada ao serviço. sucesso=None: provedor cancelado antes de terminar (só conta como latência mínima)."""
+        with self._lock:
+            self._amostras.setdefault(nome, []).append((time.monotonic(), sucesso, latencia))
+
+    def _recentes(self, nome: str) -> List[tuple]:
+        limite = time.monotonic() - OCR_ROTEADOR_JANELA
+        with self._lock:
+            amostras = [a for a in self._amostras.get(nome, []) if a[0] >= limite]
+            self._amostras[nome] = amostras
+        return amostras
+
+    def estatisticas(self, nome: str) -> Dict[str, Any]:
+        amostras = self._recentes(nome)
+        provedor = PROVEDORES_OCR.get(nome)
+        latencia_maxima = provedor.latencia_maxima if provedor else OCR_ROTEADOR_LATENCIA_MAX
+        concluidas = [ok for _, ok, _ in amostras if ok is not None]
+        latencias = sorted(lat for _, _, lat in amostras)
+        p95 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))] if latencias else None
+        taxa = sum(concluidas) / len(concluidas) if concluidas else None
+        saudavel = not (
+            (len(concluidas) >= OCR_ROTEADOR_MIN_AMOSTRAS and taxa < OCR_ROTEADOR_TAXA_MINIMA)
+            or (len(latencias) >= OCR_ROTEADOR_MIN_AMOSTRAS and p95 > latencia_maxima)
+        )
+        return {'amostras': len(amostras), 'taxa_sucesso': taxa, 'p95': p95, 'saudavel': saudavel}
+
+    def ordenar(self, nomes: List[str]) -> List[str]:
+        stats = {n: self.estatisticas(n) for n in nomes}
+        saudaveis = [n for n in nomes if stats[n]['saudavel']]
+        rebaixados = sorted(
+            (n for n in nomes if not stats[n]['saudavel']),
+            key=lambda n: (-(stats[n]['taxa_sucesso'] or 0), stats[n]['p95'] or 0)
+        )
+        if rebaixados:
+            logger.info(f"[OCR] Provedores rebaixados: {[(n, stats[n]) for n in rebaixados]}")
+        return saudaveis + rebaixados
+
+    def resumo(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            nomes = list(self._amostras)
+        return {nome: self.estatisticas(nome) for nome in nomes}
+
+
+roteador_ocr = RoteadorOCR()
+
+
+def _registrar_no_roteador(nome: str, sucesso: Optional[bool], decorrido: float, images: List[bytes]):
+    """Registra a latência por chamada: uma máscara com vários lotes não conta como um provedor lento."""
+    roteador_ocr.registrar(nome, sucesso, decorrido / PROVEDORES_OCR[nome].lotes(images))
+
+
+async def _rodar_provedor(nome: str, images: List[bytes], tipo_mascara: str = None,
+                          ja_extraidos: dict = None) -> ResultadoOCR:
+    """Executa um provedor e registra sucesso/latência no roteador."""
+    inicio = time.monotonic()
+    try:
+        bruto = await PROVEDORES_OCR[nome].extrair(images, tipo_mascara, ja_extraidos)
+    except asyncio.CancelledError:
+        _registrar_no_roteador(nome, None, time.monotonic() - inicio, images)
+        raise
+    except CotaOCRExcedida:
+        # Cota do técnico não diz nada sobre a saúde do provedor
+        raise
+    except Exception:
+        _registrar_no_roteador(nome, False, time.monotonic() - inicio, images)
+        raise
+    resultado = _normalizar_campos_finais(como_resultado_ocr(bruto, nome))
+    _registrar_no_roteador(nome, _resultado_valido(resultado, ja_extraidos), time.monotonic() - inicio, images)
+    return resultado
+
+async def extrair_dados_completos(images: List[bytes], tipo_mascara: str = None, provedores: List[str] = None,
+                                  ja_extraidos: dict = None) -> dict:
     """
     Extrai todos os dados possíveis de uma ou mais imagens para preenchimento de máscaras.
     Se tipo_mascara for fornecido, foca nos campos específicos daquela máscara.
 
-    As imagens são ABAS DIFERENTES do mesmo ticket (INFO, CLIENTE, REDE).
-    Se houver mais de 3 imagens, processa em lotes e faz merge dos resultados.
+    Hedging: o primeiro provedor da fila (Groq, salvo se o roteador o rebaixou) começa
+    sozinho. Se não houver resultado válido em OCR_HEDGE_DELAY segundos (ou se ele terminar
+    sem SA/GPON válidos), os demais começam em paralelo. O primeiro resultado que passar em
+    is_valid_sa/is_valid_gpon vence e os outros são cancelados. A espera total é limitada
+    por OCR_DEADLINE; estourado o prazo, retorna o melhor resultado parcial disponível.
+    provedores sobrepõe a fila configurada (['groq'] + OCR_HEDGE_BACKENDS).
 
-    Fallback: Se Groq não extrair nada, usa OCR.space (e Tesseract local como último recurso).
+    ja_extraidos: campos achados por lotes anteriores da mesma máscara (OCR antecipado,
+    um lote por vez). Devolve só o que este lote trouxe; se a máscara já está completa,
+    nenhum provedor é chamado.
     """
-    # Mapa de campos por tipo de máscara: (nome, onde_encontrar)
+    if ja_extraidos and all(ja_extraidos.get(c) for c in campos_da_mascara(tipo_mascara)):
+        logger.info("[OCR] Campos da máscara já preenchidos por lotes anteriores — lote pulado")
+        return ResultadoOCR()
+
+    nomes = provedores or (['groq'] + OCR_HEDGE_BACKENDS)
+    prioridade = roteador_ocr.ordenar([n for n in nomes if n in PROVEDORES_OCR])
+    primario, reserva = prioridade[0], prioridade[1:]
+
+    loop = asyncio.get_running_loop()
+    inicio = loop.time()
+    deadline = inicio + OCR_DEADLINE
+
+    tarefas = {asyncio.create_task(_rodar_provedor(primario, images, tipo_mascara, ja_extraidos)): primario}
+    hedge_iniciado = not reserva
+    vencedor = None
+    parciais = []
+
+    try:
+        while tarefas:
+            agora = loop.time()
+            if agora >= deadline:
+                logger.warning(f"[OCR] Deadline de {OCR_DEADLINE:.0f}s atingido — pendentes: {sorted(tarefas.values())}")
+                for nome in tarefas.values():
+                    _registrar_no_roteador(nome, False, agora - inicio, images)
+                break
+            limite = deadline if hedge_iniciado else min(inicio + OCR_HEDGE_DELAY, deadline)
+            concluidas, _ = await asyncio.wait(
+                tarefas, timeout=max(0.0, limite - agora), return_when=asyncio.FIRST_COMPLETED
+            )
+
+            for tarefa in sorted(concluidas, key=lambda t: prioridade.index(tarefas[t])):
+                nome = tarefas.pop(tarefa)
+                try:
+                    resultado = tarefa.result()
+                except Exception as e:
+                    logger.warning(f"[OCR] Backend {nome} falhou: {e}")
+                    continue
+                if _resultado_valido(resultado, ja_extraidos):
+                    logger.info(f"[OCR] Backend {nome} venceu em {loop.time() - inicio:.1f}s → {resultado}")
+                    vencedor = resultado
+                    break
+                if any(resultado.values()):
+                    parciais.append(resultado)
+                logger.info(f"[OCR] Backend {nome} terminou sem SA/GPON válidos ({loop.time() - inicio:.1f}s)")
+            if vencedor is not None:
+                break
+
+            primario_pendente = primario in tarefas.values()
+            if not hedge_iniciado and (not primario_pendente or loop.time() - inicio >= OCR_HEDGE_DELAY):
+                hedge_iniciado = True
+                motivo = f"{primario} sem resultado válido" if not primario_pendente else f"{primario} sem resposta em {OCR_HEDGE_DELAY:.0f}s"
+                logger.warning(f"[OCR] {motivo} — iniciando backends em paralelo: {reserva}")
+                for nome in reserva:
+                    tarefas[asyncio.create_task(_rodar_provedor(nome, images, tipo_mascara, ja_extraidos))] = nome
+    finally:
+        for tarefa in tarefas:
+            tarefa.cancel()
+        if tarefas:
+            await asyncio.gather(*tarefas, return_exceptions=True)
+
+    if vencedor is None:
+        if not parciais:
+            logger.warning("[OCR] Nenhum backend extraiu dados")
+            return ResultadoOCR()
+        # Sem vencedor: usa o parcial mais completo
+        parciais.sort(key=lambda r: len([v for v in r.values() if v]), reverse=True)
+        vencedor = parciais.pop(0)
+
+    # Completa campos vazios do vencedor com o que os outros backends já tinham achado
+    for parcial in parciais:
+        vencedor.mesclar(parcial)
+    return vencedor
+
+def _campos_mascara(tipo_mascara: str = None) -> Tuple[str, List[Tuple[str, str]]]:
+    """(esqueleto JSON, [(campo, onde encontrar)]) pedidos no OCR de cada tipo de máscara."""
     if tipo_mascara == 'Batimento CDOE':
         campos_json = '"atividade":"","estacao":"","cdo":"","porta":"","gpon":""'
         mapa_campos = [
@@ -658,7 +1357,27 @@ async def extrair_dados_completos(images: List[bytes], tipo_mascara: str = None)
             ("atividade",   "aba INFO → 'Atividade'"),
         ]
 
+    return campos_json, mapa_campos
+
+
+def campos_da_mascara(tipo_mascara: str = None) -> List[str]:
+    """Campos que a máscara precisa (os que o OCR tenta preencher)."""
+    return [nome for nome, _ in _campos_mascara(tipo_mascara)[1]]
+
+
+async def _extrair_dados_groq(images: List[bytes], tipo_mascara: str = None, ja_extraidos: dict = None) -> dict:
+    """
+    Extração das máscaras via Groq vision (caminho principal de extrair_dados_completos).
+
+    As imagens são ABAS DIFERENTES do mesmo ticket (INFO, CLIENTE, REDE).
+    Se houver mais de 3 imagens, processa em lotes e faz merge dos resultados.
+    ja_extraidos (lotes anteriores) conta como preenchido para o prompt compacto.
+    """
+    ja_extraidos = ja_extraidos or {}
+    campos_json, mapa_campos = _campos_mascara(tipo_mascara)
     instrucoes_campos = "\n".join([f"  o {nome}: {onde}" for nome, onde in mapa_campos])
+    campos_mascara = [nome for nome, _ in mapa_campos]
+    dicas_mascara = dict(mapa_campos)
 
     system = (
         "Voce e um OCR especializado em extrair dados de prints de sistemas de telecomunicacoes. "
@@ -682,14 +1401,16 @@ async def extrair_dados_completos(images: List[bytes], tipo_mascara: str = None)
             logger.info(f"[OCR][DEBUG] Campo '{k}' normalizado para: {result[k]!r}")
         return result
 
-    def merge_resultados(acumulado: dict, novo: dict) -> dict:
+    def merge_resultados(acumulado: ResultadoOCR, novo: dict, imagens: List[int]) -> ResultadoOCR:
         for k, v in novo.items():
             logger.info(
                 f"[OCR][DEBUG] Merge campo '{k}': atual={acumulado.get(k)!r} novo={v!r}"
             )
             if v and not acumulado.get(k):
-                acumulado[k] = v
+                acumulado.registrar(k, v, 'groq', imagens)
                 logger.info(f"[OCR][DEBUG] Campo '{k}' preenchido no acumulado com: {v!r}")
+            else:
+                acumulado.setdefault(k, v)
         return acumulado
 
     def construir_user_prompt(num_imagens: int, lote_info: str = "") -> str:
@@ -710,19 +1431,27 @@ async def extrair_dados_completos(images: List[bytes], tipo_mascara: str = None)
             f"{{{campos_json}}}"
         )
 
-    # Batching: modelo suporta até 3 imagens, mas plano free (8000 TPM) estoura
-    # com 3 (~8700 tokens) — usar no máximo 2 por lote.
-    MAX_POR_LOTE = 2
-    lotes = [images[i:i+MAX_POR_LOTE] for i in range(0, len(images), MAX_POR_LOTE)]
+    lotes = [images[i:i+GROQ_MAX_POR_LOTE] for i in range(0, len(images), GROQ_MAX_POR_LOTE)]
     logger.info(f"[OCR] extrair_dados_completos: {len(images)} imagens → {len(lotes)} lote(s) (mascara: {tipo_mascara})")
 
-    resultado = {}
+    resultado = ResultadoOCR()
     for idx_batch, lote in enumerate(lotes):
         lote_info = f"LOTE {idx_batch+1}/{len(lotes)}" if len(lotes) > 1 else ""
-        user = construir_user_prompt(len(lote), lote_info)
+        if OCR_PROMPT_COMPACTO:
+            # Lotes seguintes pedem só o que ainda falta; nada faltando = lotes restantes não mudariam o merge
+            faltando = [c for c in campos_mascara if not resultado.get(c) and not ja_extraidos.get(c)]
+            if not faltando:
+                logger.info(f"[OCR] Todos os campos preenchidos — pulando {len(lotes) - idx_batch} lote(s) restante(s)")
+                break
+            system_lote = OCR_SYSTEM_COMPACTO
+            contexto = f"Máscara '{tipo_mascara or 'Geral'}'" + (f" ({lote_info})" if lote_info else "") + ". "
+            user = compilar_prompt(faltando, dicas_mascara, len(lote), contexto=contexto)
+        else:
+            system_lote = system
+            user = construir_user_prompt(len(lote), lote_info)
         logger.info(f"[OCR] Chamando API para lote {idx_batch+1} com {len(lote)} imagens")
         logger.info(f"[OCR] Prompt (primeiros 200 chars): {user[:200]}")
-        response_text = await _call_groq_vision(system, user, lote, json_mode=True)
+        response_text = await _call_groq_vision(system_lote, user, lote, json_mode=True)
         logger.info(f"[OCR] Response recebida (primeiros 200 chars): {response_text[:200] if response_text else 'VAZIA'}")
         try:
             batch_data = json.loads(response_text)
@@ -733,7 +1462,8 @@ async def extrair_dados_completos(images: List[bytes], tipo_mascara: str = None)
         batch_normalizado = normalizar(batch_data)
         batch_preenchidos = [k for k, v in batch_normalizado.items() if v]
         logger.info(f"[OCR] Lote {idx_batch+1}/{len(lotes)}: {len(batch_preenchidos)} campos → {batch_normalizado}")
-        resultado = merge_resultados(resultado, batch_normalizado)
+        primeira = idx_batch * GROQ_MAX_POR_LOTE
+        resultado = merge_resultados(resultado, batch_normalizado, list(range(primeira, primeira + len(lote))))
 
         # Se o PRIMEIRO lote veio vazio ({}), o modelo não está lendo as imagens
         # (comum no plano free: 429 + resposta vazia). Aborta os lotes restantes
@@ -746,16 +1476,7 @@ async def extrair_dados_completos(images: List[bytes], tipo_mascara: str = None)
     logger.info(f"[OCR] Resultado final (merge de {len(lotes)} lote(s)): {len(campos_preenchidos)}/{len(resultado)} campos → {resultado}")
     
     # Normalização final dos campos críticos (preenchimento correto da máscara)
-    resultado = _normalizar_campos_finais(resultado)
-    
-    # Fallback: Se não conseguiu extrair nada com Groq, tenta OCR.space
-    if not campos_preenchidos and len(resultado) == 0:
-        logger.warning("[OCR] Groq não extraiu dados, tentando OCR.space como fallback")
-        resultado = await extrair_dados_ocr_space(images, tipo_mascara)
-        resultado = _normalizar_campos_finais(resultado)
-        logger.info(f"[OCR] Resultado OCR.space: {resultado}")
-    
-    return resultado
+    return _normalizar_campos_finais(resultado)
 
 async def extrair_dados_ocr_space(images: List[bytes], tipo_mascara: str = None) -> dict:
     """
@@ -776,7 +1497,7 @@ async def extrair_dados_ocr_space(images: List[bytes], tipo_mascara: str = None)
         'estacao': r'(?:Estacao|EST|Central)[:\s]*([^\t]+)',
     }
     
-    resultado = {}
+    resultado = ResultadoOCR()
     
     for idx, img_bytes in enumerate(images):
         try:
@@ -811,7 +1532,7 @@ async def extrair_dados_ocr_space(images: List[bytes], tipo_mascara: str = None)
                     # Remover lixo de campo vazio do sistema (ex: "Complementos: null null")
                     valor = re.sub(r'\s*Complementos:\s*null\s*null?', '', valor, flags=re.IGNORECASE).strip()
                 if valor:
-                    resultado[campo] = valor.upper()
+                    resultado.registrar(campo, valor.upper(), 'ocr_space', [idx])
                     logger.info(f"[OCR.space] Campo {campo} encontrado: {valor}")
             
             # Fallback para telefone: se nenhum rótulo "Contato" foi achado nesta imagem,
@@ -819,7 +1540,7 @@ async def extrair_dados_ocr_space(images: List[bytes], tipo_mascara: str = None)
             if not resultado.get('telefone'):
                 m_phone = re.search(r'(?<!\d)(\d{10,11})(?!\d)', text)
                 if m_phone:
-                    resultado['telefone'] = m_phone.group(1)
+                    resultado.registrar('telefone', m_phone.group(1), 'ocr_space', [idx])
                     logger.info(f"[OCR.space] Campo telefone (fallback) encontrado: {m_phone.group(1)}")
         
         except Exception as e:
@@ -835,7 +1556,9 @@ async def extrair_dados_ocr_space(images: List[bytes], tipo_mascara: str = None)
         }
         
         campos_relevantes = campos_por_tipo.get(tipo_mascara, [])
-        resultado = {k: v for k, v in resultado.items() if k in campos_relevantes}
+        for k in [k for k in resultado if k not in campos_relevantes]:
+            del resultado[k]
+            resultado.fontes.pop(k, None)
     
     return resultado
 
@@ -854,6 +1577,8 @@ async def _call_ocr_space(image: bytes) -> str:
     except ImportError:
         logger.warning("[OCR.space] aiohttp não instalado")
         return ""
+    if not uso_ocr.permitido('ocr_space'):
+        return ""
     
     try:
         b64 = base64.b64encode(image).decode('ascii')
@@ -873,12 +1598,14 @@ async def _call_ocr_space(image: bytes) -> str:
         
         logger.info(f"[OCR.space] Enviando requisição para API (tamanho imagem: {len(image)} bytes)")
         
+        t0 = time.monotonic()
         async with aiohttp.ClientSession() as session:
             async with session.post(
                 'https://api.ocr.space/parse/image',
                 data=payload,
                 headers=headers
             ) as response:
+                uso_ocr.registrar('ocr_space', latencia=time.monotonic() - t0, erro_429=response.status == 429)
                 logger.info(f"[OCR.space] Status da resposta: {response.status}")
                 result = await response.json()
                 logger.info(f"[OCR.space] Resposta completa: {result}")
@@ -918,7 +1645,7 @@ async def extrair_dados_tesseract(images: List[bytes], tipo_mascara: str = None)
         import io as _io
     except ImportError:
         logger.warning("[OCR] Tesseract não disponível (pytesseract ou PIL não instalado)")
-        return {}
+        return ResultadoOCR()
     
     # Mapa de regex para cada campo (o texto já chega limpo de cabeçalhos/rodapés).
     regex_map = {
@@ -934,12 +1661,15 @@ async def extrair_dados_tesseract(images: List[bytes], tipo_mascara: str = None)
         'estacao': r'(?:Estacao|EST|Central)[:\s]*([^\t]+)',
     }
     
-    resultado = {}
+    resultado = ResultadoOCR()
     
     for idx, img_bytes in enumerate(images):
         try:
             img = Image.open(_io.BytesIO(img_bytes))
-            text = pytesseract.image_to_string(img, lang='por')
+            # Tesseract é bloqueante: roda no executor para não travar o event loop
+            # (ele corre em paralelo com Groq/OCR.space no hedging)
+            loop = asyncio.get_running_loop()
+            text = await loop.run_in_executor(None, lambda: pytesseract.image_to_string(img, lang='por'))
             # Remover linhas de cabeçalho/rodapé das abas (ex: "INFO DETALHES CLIENTE NOTAS 1"
             # e o rodapé "Atividade Rede Ações") — linhas com 2+ tabs ou com "Ações".
             # Depois junta as linhas com tab, mantendo o padrão label<TAB>valor.
@@ -964,7 +1694,7 @@ async def extrair_dados_tesseract(images: List[bytes], tipo_mascara: str = None)
                     # Remover lixo de campo vazio do sistema (ex: "Complementos: null null")
                     valor = re.sub(r'\s*Complementos:\s*null\s*null?', '', valor, flags=re.IGNORECASE).strip()
                 if valor:
-                    resultado[campo] = valor.upper()
+                    resultado.registrar(campo, valor.upper(), 'tesseract', [idx])
                     logger.info(f"[OCR Tesseract] Campo {campo} encontrado: {valor}")
             
             # Fallback para telefone: se nenhum rótulo "Contato" foi achado nesta imagem,
@@ -972,7 +1702,7 @@ async def extrair_dados_tesseract(images: List[bytes], tipo_mascara: str = None)
             if not resultado.get('telefone'):
                 m_phone = re.search(r'(?<!\d)(\d{10,11})(?!\d)', text)
                 if m_phone:
-                    resultado['telefone'] = m_phone.group(1)
+                    resultado.registrar('telefone', m_phone.group(1), 'tesseract', [idx])
                     logger.info(f"[OCR Tesseract] Campo telefone (fallback) encontrado: {m_phone.group(1)}")
         
         except Exception as e:
@@ -988,6 +1718,8 @@ async def extrair_dados_tesseract(images: List[bytes], tipo_mascara: str = None)
         }
         
         campos_relevantes = campos_por_tipo.get(tipo_mascara, [])
-        resultado = {k: v for k, v in resultado.items() if k in campos_relevantes}
+        for k in [k for k in resultado if k not in campos_relevantes]:
+            del resultado[k]
+            resultado.fontes.pop(k, None)
     
     return resultado
@@ -0,0 +1,99 @@
+"""
+Modo webhook: um único servidor aiohttp no event loop do bot.
+
+Recebe os updates do Telegram em WEBHOOK_PATH e serve /, /health e /metrics na mesma
+porta — substitui o polling + thread Flask do keep_alive quando WEBHOOK_URL está definida.
+"""
+import asyncio
+import hashlib
+import logging
+import signal
+
+from telegram import Update
+from telegram.ext import Application
+
+from keep_alive import dados_health, dados_metrics, update_health_status
+
+logger = logging.getLogger(__name__)
+
+CABECALHO_SEGREDO = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+def segredo_padrao(token: str) -> str:
+    """Segredo estável derivado do token (o Telegram aceita só A-Z, a-z, 0-9, _ e -)."""
+    return hashlib.sha256(f"webhook:{token}".encode()).hexdigest()[:48]
+
+
+def criar_app_web(application: Application, caminho: str, segredo: str):
+    """Aplicação aiohttp com a rota do webhook e os endpoints de saúde/métricas."""
+    from aiohttp import web
+
+    async def receber_update(request):
+        if request.headers.get(CABECALHO_SEGREDO) != segredo:
+            return web.Response(status=403)
+        try:
+            dados = await request.json()
+        except Exception:
+            return web.Response(status=400)
+        # Só enfileira: o Application processa em background e o Telegram recebe 200 na hora
+        await application.update_queue.put(Update.de_json(dados, application.bot))
+        return web.Response(status=200)
+
+    async def home(request):
+        return web.Response(text="✅ Bot Técnico está ativo!")
+
+    async def health(request):
+        return web.json_response(dados_health())
+
+    async def metrics(request):
+        return web.json_response(dados_metrics())
+
+    app_web = web.Application()
+    app_web.router.add_post(caminho, receber_update)
+    app_web.router.add_get('/', home)
+    app_web.router.add_get('/health', health)
+    app_web.router.add_get('/metrics', metrics)
+    return app_web
+
+
+async def rodar_webhook(application: Application, url: str, caminho: str, segredo: str, porta: int):
+    """Inicializa o bot, registra o webhook e serve até SIGINT/SIGTERM."""
+    from aiohttp import web
+
+    runner = web.AppRunner(criar_app_web(application, caminho, segredo), access_log=None)
+    await runner.setup()
+    # O servidor sobe antes do bot para o health check do Render responder desde o início
+    await web.TCPSite(runner, '0.0.0.0', porta).start()
+    logger.info(f"🌐 Servidor webhook iniciado na porta {porta}")
+
+    parar = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, parar.set)
+        except NotImplementedError:
+            pass  # Windows
+
+    try:
+        async with application:
+            # post_init só é chamado automaticamente por run_polling/run_webhook
+            if application.post_init:
+                await application.post_init(application)
+            await application.bot.set_webhook(
+                url=f"{url}{caminho}",
+                secret_token=segredo,
+                allowed_updates=Update.ALL_TYPES,
+                drop_pending_updates=True
+            )
+            await application.start()
+            update_health_status(bot_running=True)
+            logger.info(f"🔗 Webhook registrado em {url}{caminho}")
+
+            await parar.wait()
+
+            logger.info("👋 Encerrando modo webhook...")
+            update_health_status(bot_running=False)
+            # O webhook não é removido: numa troca de instância a nova já o registrou
+            await application.stop()
+    finally:
+        await runner.cleanup()